@@ -0,0 +1,68 @@
+"""Token-budgeted conversation history for GPT calls.
+
+History is selected by an estimated token count instead of a number of
+turns, so a session of short exchanges keeps more context than one with long
+dictated notes, and the prompt stays bounded however long the session runs.
+Messages that fall out of the budget are folded into a rolling summary by
+the caller (sim.session_state, sessions.context).
+
+The estimate is local and dependency-free: roughly four characters per token
+for words, one per punctuation mark, plus a fixed per-message overhead. It
+errs on the high side for English clinical text, which is the safe side for
+a budget.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, Sequence
+
+
+# Role / separator tokens the chat format adds to every message.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated token count of `text`.
+
+    >>> estimate_tokens("Give 1 mg of epinephrine, now.")
+    10
+    >>> estimate_tokens("")
+    0
+    """
+
+    return sum(1 + (len(piece) - 1) // 4 for piece in _PIECES.findall(text or ""))
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get("content") or "")
+
+
+def messages_tokens(messages: Iterable[Dict[str, str]]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def fit_to_budget(
+    messages: Sequence[Dict[str, str]], budget_tokens: int, min_keep: int = 0
+) -> int:
+    """How many of the newest `messages` fit in `budget_tokens`.
+
+    The newest `min_keep` messages are always kept, whatever they cost.
+
+    >>> history = [{"role": "user", "content": "word " * 40}] + [
+    ...     {"role": "user", "content": "ok"}] * 3
+    >>> fit_to_budget(history, budget_tokens=20), fit_to_budget(history, 20, min_keep=4)
+    (3, 4)
+    """
+
+    used = 0
+    kept = 0
+    for message in reversed(messages):
+        used += message_tokens(message)
+        if used > budget_tokens and kept >= min_keep:
+            break
+        kept += 1
+    return kept
+
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+# Upstream calls (Whisper, GPT, ElevenLabs) can legitimately take a while.
+UPSTREAM_TIMEOUT_SECONDS = 60
+
+try:
+    import h2  # noqa: F401
+
+    _HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional extra
+    _HTTP2_AVAILABLE = False
+
+
+def _pool_size() -> int:
+    return int(getattr(settings, "UPSTREAM_HTTP_POOL_SIZE", 100))
+
+
+def _per_host_limit() -> int:
+    return int(getattr(settings, "UPSTREAM_HTTP_PER_HOST_LIMIT", 50))
+
+
+@lru_cache(maxsize=1)
+def get_http_session() -> requests.Session:
+    """Return a process-wide requests.Session with keep-alive pooling.
+
+    Used by the sync views so consecutive upstream calls reuse TLS
+    connections instead of opening a fresh one per request.
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=_pool_size())
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# One AsyncClient (and one set of per-host semaphores) per event loop: httpx
+# clients and asyncio primitives must not be shared across loops, and under
+# WSGI each async view runs on a short-lived loop of its own.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+_host_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the pooled AsyncClient for the running event loop.
+
+    Connections are kept alive between requests and negotiated as HTTP/2
+    when the `h2` package is installed and the upstream supports it.
+    """
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        pool_size = _pool_size()
+        client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(UPSTREAM_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=30,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+@asynccontextmanager
+async def upstream_slot(url: str) -> AsyncIterator[httpx.AsyncClient]:
+    """Bound in-flight requests per upstream host, then hand out the client.
+
+    >>> async def demo():
+    ...     async with upstream_slot("https://api.openai.com/v1/x") as client:
+    ...         return isinstance(client, httpx.AsyncClient)
+    >>> asyncio.run(demo())
+    True
+    """
+
+    loop = asyncio.get_running_loop()
+    semaphores = _host_semaphores.setdefault(loop, {})
+    host = urlsplit(url).netloc
+    semaphore = semaphores.get(host)
+    if semaphore is None:
+        semaphore = semaphores[host] = asyncio.Semaphore(_per_host_limit())
+
+    async with semaphore:
+        yield get_async_http_client()
+
+
+async def apost(url: str, **kwargs: Any) -> httpx.Response:
+    """POST through the shared async client and raise on HTTP errors."""
+
+    async with upstream_slot(url) as client:
+        resp = await client.post(url, **kwargs)
+    resp.raise_for_status()
+    return resp
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    """POST through the shared sync session and raise on HTTP errors.
+
+    Pass `stream=True` to get the response before its body is read; the
+    caller must then close it.
+    """
+
+    kwargs.setdefault("timeout", UPSTREAM_TIMEOUT_SECONDS)
+    resp = get_http_session().post(url, **kwargs)
+    try:
+        resp.raise_for_status()
+    except requests.HTTPError:
+        resp.close()
+        raise
+    return resp
+
+
+async def apost_stream(url: str, **kwargs: Any) -> httpx.Response:
+    """POST through the shared async client without reading the body.
+
+    The per-host slot is held only until the response headers arrive. The
+    caller owns the returned response and must `await resp.aclose()`.
+    """
+
+    async with upstream_slot(url) as client:
+        request = client.build_request("POST", url, **kwargs)
+        resp = await client.send(request, stream=True)
+    if resp.is_error:
+        await resp.aread()
+        await resp.aclose()
+        resp.raise_for_status()
+    return resp
@@ -2,9 +2,10 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
-import requests
+from ai.http_client import apost, post, upstream_slot
+from ai.streaming import IncrementalJSONObjectParser, iter_chat_completion_deltas
 
 
 VOICE_REASONING_SCHEMA = {
@@ -15,6 +16,7 @@ VOICE_REASONING_SCHEMA = {
 }
 
 OPENAI_CHAT_MODEL = os.environ.get("OPENAI_GPT_MODEL", "gpt-4o-mini")
+OPENAI_API_BASE = os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/")
 
 SYSTEM_PROMPT = """
 You are the voice engine for an Emergency Department simulation.
@@ -63,6 +65,53 @@ def build_reasoning_gpt(
       {"role": "user"|"assistant", "content": "..."}
     """
 
+    resp = post(**_reasoning_request(transcript, session_context))
+    return _parse_reasoning_response(resp.json())
+
+
+async def abuild_reasoning_gpt(
+    transcript: str,
+    session_context: List[Dict[str, Any]] | None,
+) -> Dict[str, Any]:
+    """Async variant of `build_reasoning_gpt` using the pooled async client."""
+
+    resp = await apost(**_reasoning_request(transcript, session_context))
+    return _parse_reasoning_response(resp.json())
+
+
+async def astream_reasoning_gpt(
+    transcript: str,
+    session_context: List[Dict[str, Any]] | None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Streaming variant of `abuild_reasoning_gpt`.
+
+    Yields ("text", delta) as assistant_text is written, then ("done", result)
+    where result has the same shape as `build_reasoning_gpt`'s return value.
+    """
+
+    request = _reasoning_request(transcript, session_context)
+    request["json"]["stream"] = True
+
+    parser = IncrementalJSONObjectParser("assistant_text")
+    content_parts: List[str] = []
+
+    async with upstream_slot(request["url"]) as client:
+        async with client.stream("POST", **request) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                for delta in iter_chat_completion_deltas([line]):
+                    content_parts.append(delta)
+                    for kind, value in parser.feed(delta):
+                        if kind == "text":
+                            yield "text", value
+
+    yield "done", _parse_reasoning_content("".join(content_parts))
+
+
+def _reasoning_request(
+    transcript: str,
+    session_context: List[Dict[str, Any]] | None,
+) -> Dict[str, Any]:
     api_key = _get_openai_chat_api_key()
 
     messages: List[Dict[str, str]] = [
@@ -79,23 +128,25 @@ def build_reasoning_gpt(
         }
     )
 
-    resp = requests.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers={
+    return {
+        "url": f"{OPENAI_API_BASE}/chat/completions",
+        "headers": {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         },
-        json={
+        "json": {
             "model": OPENAI_CHAT_MODEL,
             "messages": messages,
             "temperature": 0.3,
         },
-        timeout=60,
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    content = data["choices"][0]["message"]["content"]
+    }
+
+
+def _parse_reasoning_response(data: Dict[str, Any]) -> Dict[str, Any]:
+    return _parse_reasoning_content(data["choices"][0]["message"]["content"])
+
 
+def _parse_reasoning_content(content: str) -> Dict[str, Any]:
     try:
         reasoning = json.loads(content)
     except json.JSONDecodeError as exc:  # pragma: no cover - network dependent
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Parser events: ("text", delta) while the watched string streams in, and
+# ("field", (key, value)) once any top-level value is complete.
+ParserEvent = Tuple[str, Any]
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONObjectParser:
+    """Incrementally parse a single top-level JSON object as it streams in.
+
+    Designed for model output that is *mostly* a JSON object: anything before
+    the first "{" (prose, markdown fences) is ignored. The string value of
+    `text_key` is decoded and emitted character-by-character as it arrives;
+    every other top-level value is emitted once it is syntactically complete.
+
+    >>> p = IncrementalJSONObjectParser("speech_output")
+    >>> events = []
+    >>> for chunk in ['```json\\n{"speech_', 'output": "Hi \\\\"do', 'c\\\\"", "action_triggers": [{"re', 'source": "ekg"}], "hint": null}']:
+    ...     events.extend(p.feed(chunk))
+    >>> [e for e in events if e[0] == "text"]
+    [('text', 'Hi "do'), ('text', 'c"')]
+    >>> [e[1] for e in events if e[0] == "field"]
+    [('speech_output', 'Hi "doc"'), ('action_triggers', [{'resource': 'ekg'}]), ('hint', None)]
+    >>> p.done
+    True
+    """
+
+    def __init__(self, text_key: str) -> None:
+        self.text_key = text_key
+        self.done = False
+        self._started = False
+        # One of: key_or_end, colon, value, string, nested, scalar, after_value.
+        self._state = "key_or_end"
+        self._key_chars: List[str] = []
+        self._in_key = False
+        self._key = ""
+        self._raw: List[str] = []
+        self._escape: Optional[str] = None
+        self._nested_depth = 0
+        self._nested_in_string = False
+        self._nested_escape = False
+
+    def feed(self, chunk: str) -> List[ParserEvent]:
+        events: List[ParserEvent] = []
+        text_out: List[str] = []
+
+        for ch in chunk:
+            if self.done:
+                break
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                continue
+            self._step(ch, events, text_out)
+
+        self._flush_text(events, text_out)
+        return events
+
+    @staticmethod
+    def _flush_text(events: List[ParserEvent], text_out: List[str]) -> None:
+        if text_out:
+            events.append(("text", "".join(text_out)))
+            text_out.clear()
+
+    # -- internal state machine -------------------------------------------------
+
+    def _step(self, ch: str, events: List[ParserEvent], text_out: List[str]) -> None:
+        state = self._state
+
+        if state == "key_or_end":
+            if self._in_key:
+                if self._escape is not None:
+                    self._key_chars.append(ch)
+                    self._escape = None
+                elif ch == "\\":
+                    self._key_chars.append(ch)
+                    self._escape = ""
+                elif ch == '"':
+                    self._key = json.loads('"' + "".join(self._key_chars) + '"')
+                    self._key_chars = []
+                    self._in_key = False
+                    self._state = "colon"
+                else:
+                    self._key_chars.append(ch)
+            elif ch == '"':
+                self._in_key = True
+            elif ch == "}":
+                self.done = True
+            return
+
+        if state == "colon":
+            if ch == ":":
+                self._state = "value"
+            return
+
+        if state == "value":
+            if ch in _WHITESPACE:
+                return
+            self._raw = [ch]
+            if ch == '"':
+                self._state = "string"
+                self._escape = None
+            elif ch in "{[":
+                self._state = "nested"
+                self._nested_depth = 1
+                self._nested_in_string = False
+                self._nested_escape = False
+            else:
+                self._state = "scalar"
+            return
+
+        if state == "string":
+            self._raw.append(ch)
+            streaming = self._key == self.text_key
+            if self._escape is not None:
+                self._escape += ch
+                if self._escape_complete():
+                    if streaming:
+                        text_out.append(json.loads('"\\' + self._escape + '"'))
+                    self._escape = None
+            elif ch == "\\":
+                self._escape = ""
+            elif ch == '"':
+                self._flush_text(events, text_out)
+                self._complete_value(events)
+            elif streaming:
+                text_out.append(ch)
+            return
+
+        if state == "nested":
+            self._raw.append(ch)
+            if self._nested_in_string:
+                if self._nested_escape:
+                    self._nested_escape = False
+                elif ch == "\\":
+                    self._nested_escape = True
+                elif ch == '"':
+                    self._nested_in_string = False
+            elif ch == '"':
+                self._nested_in_string = True
+            elif ch in "{[":
+                self._nested_depth += 1
+            elif ch in "}]":
+                self._nested_depth -= 1
+                if self._nested_depth == 0:
+                    self._complete_value(events)
+            return
+
+        if state == "scalar":
+            if ch in ",}" or ch in _WHITESPACE:
+                self._complete_value(events)
+                self._after_value(ch)
+            else:
+                self._raw.append(ch)
+            return
+
+        if state == "after_value":
+            self._after_value(ch)
+
+    def _after_value(self, ch: str) -> None:
+        if ch == ",":
+            self._state = "key_or_end"
+        elif ch == "}":
+            self.done = True
+        else:
+            self._state = "after_value"
+
+    def _escape_complete(self) -> bool:
+        esc = self._escape or ""
+        if not esc.startswith("u"):
+            return len(esc) == 1
+        if len(esc) < 5:
+            return False
+        # A high surrogate must be decoded together with its low half.
+        if 0xD800 <= int(esc[1:5], 16) <= 0xDBFF:
+            return len(esc) == 11
+        return True
+
+    def _complete_value(self, events: List[ParserEvent]) -> None:
+        raw = "".join(self._raw)
+        self._raw = []
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = raw
+        events.append(("field", (self._key, value)))
+        self._state = "after_value"
+
+
+# Sentence end: terminal punctuation (optionally followed by closing quotes or
+# brackets) and then whitespace. The whitespace is required so "3.5" or an
+# unfinished "..." at the end of a chunk is not treated as a boundary.
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+# Only a whole last word counts: "Dr." is an abbreviation, "My chest." is not.
+_ABBREVIATION_END = re.compile(
+    r"(?:^|[\s(\[\"'])(?:dr|mr|mrs|ms|st|vs|approx|e\.g|i\.e)\.$", re.IGNORECASE
+)
+
+
+class SentenceSplitter:
+    """Split streamed text into sentences as soon as each one is complete.
+
+    Sentences shorter than `min_chars` are held back and merged with the next
+    one, so TTS is not called for fragments like "Okay."
+
+    >>> splitter = SentenceSplitter(min_chars=10)
+    >>> splitter.feed("Okay. Dr. Lee is on the way")
+    []
+    >>> splitter.feed("! Give 2.5 mg now. Then")
+    ['Okay. Dr. Lee is on the way!', 'Give 2.5 mg now.']
+    >>> splitter.flush()
+    ['Then']
+    >>> SentenceSplitter(min_chars=10).feed("My chest hurts. It's the worst. ")
+    ['My chest hurts.', "It's the worst."]
+    """
+
+    def __init__(self, min_chars: int = 20) -> None:
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        sentences: List[str] = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start : match.end()].strip()
+            if len(candidate) < self.min_chars:
+                continue
+            if _ABBREVIATION_END.search(candidate):
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+def iter_chat_completion_deltas(
+    lines: Iterable[bytes | str], usage: Optional[Dict[str, Any]] = None
+) -> Iterator[str]:
+    """Yield content deltas from an OpenAI streaming chat completion body.
+
+    `lines` is the raw SSE body split into lines (e.g. `resp.iter_lines()`).
+    If `usage` is given, it is updated with the `usage` object of the final
+    chunk (sent when the request sets `stream_options.include_usage`).
+
+    >>> usage = {}
+    >>> list(iter_chat_completion_deltas([
+    ...     'data: {"choices": [{"delta": {"content": "Hi"}}]}',
+    ...     'data: {"choices": [], "usage": {"prompt_tokens": 1200}}',
+    ...     "data: [DONE]",
+    ... ], usage=usage)), usage
+    (['Hi'], {'prompt_tokens': 1200})
+    """
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:") :].strip()
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError:
+            continue
+        if usage is not None and chunk.get("usage"):
+            usage.update(chunk["usage"])
+        choices = chunk.get("choices") or []
+        if not choices:
+            continue
+        delta = (choices[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Format one server-sent event with a JSON payload.
+
+    >>> format_sse("speech", {"delta": "Hi"})
+    'event: speech\\ndata: {"delta": "Hi"}\\n\\n'
+    """
+
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
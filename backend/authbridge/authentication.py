@@ -1,21 +1,86 @@
+import hashlib
 import logging
+import time
 from typing import Optional, Tuple
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
 from jose import JWTError, jwt
 from rest_framework import authentication, exceptions
 
+from sim.case_cache import VersionedLRUCache
+
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+# Verified tokens -> claims, and (sub, email) -> user id. Entries are tagged
+# with a SUPABASE_AUTH_CACHE_SECONDS time window, so nothing is trusted for
+# longer than that (and claims never past the token's own `exp`).
+_verified_tokens: VersionedLRUCache[bytes, dict] = VersionedLRUCache(
+    maxsize=getattr(settings, "SUPABASE_AUTH_CACHE_SIZE", 10000),
+)
+_user_ids: VersionedLRUCache[Tuple[str, str], int] = VersionedLRUCache(
+    maxsize=getattr(settings, "SUPABASE_AUTH_CACHE_SIZE", 10000),
+)
+
+
+def _cache_window() -> Optional[int]:
+    seconds = float(getattr(settings, "SUPABASE_AUTH_CACHE_SECONDS", 300))
+    return int(time.time() // seconds) if seconds > 0 else None
+
+
+class CachedUser(SimpleLazyObject):
+    """`request.user` for an identity resolved from the cache.
+
+    `pk`, `id`, `username`, `email`, truthiness (DRF's `IsAuthenticated`
+    checks `bool(request.user)`) and the authentication flags are answered
+    without a query; anything else loads the row on first use. Passing it to
+    the ORM as a model instance loads it too, so filter on `user_id=user.pk`.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id: int, username: str, email: str) -> None:
+        super().__init__(lambda: _load_user(username, email))
+        self.__dict__["_identity"] = (user_id, username, email)
+
+    def __bool__(self) -> bool:
+        return True
+
+    @property
+    def pk(self) -> int:
+        return self.__dict__["_identity"][0]
+
+    id = pk
+
+    @property
+    def username(self) -> str:
+        return self.__dict__["_identity"][1]
+
+    @property
+    def email(self) -> str:
+        return self.__dict__["_identity"][2]
+
+
+def _load_user(username: str, email: str) -> User:
+    # get_or_create: the row may have been deleted since it was cached.
+    return User.objects.get_or_create(username=username, defaults={"email": email})[0]
+
 
 class SupabaseJWTAuthentication(authentication.BaseAuthentication):
     """Supabase JWT authentication for Django REST Framework.
 
     Verifies JWTs issued by Supabase using the JWT secret from settings.
     Creates or retrieves Django users based on the Supabase user ID (sub claim).
+
+    Repeat requests with the same token skip both the signature check and
+    the user query: verified claims and user ids are cached per process
+    (see `_verified_tokens` / `_user_ids`) and the user is returned as a
+    `CachedUser`. The user row is only written when the token's email
+    differs from the stored one.
     """
 
     def authenticate(self, request) -> Optional[Tuple[User, dict]]:
@@ -27,14 +92,41 @@ class SupabaseJWTAuthentication(authentication.BaseAuthentication):
         if not token:
             raise exceptions.AuthenticationFailed("Invalid Authorization header")
 
-        # Verify and decode the JWT
-        payload = self._decode_jwt(token)
+        window = _cache_window()
+        if window is None:
+            payload = self._decode_jwt(token)
+            return self._get_or_create_user(payload), payload
+
+        # Verify and decode the JWT (cached)
+        payload = self._cached_decode(token, window)
 
-        # Get or create user from Supabase sub (user ID)
-        user = self._get_or_create_user(payload)
+        # Resolve the user from Supabase sub (user ID), from the cache if possible
+        sub = payload.get("sub")
+        if not sub:
+            raise exceptions.AuthenticationFailed("Token missing 'sub' claim")
+        email = payload.get("email", "")
+        loaded = []
+
+        def load_user_id() -> int:
+            user = self._get_or_create_user(payload)
+            loaded.append(user)
+            return user.pk
 
+        user_id = _user_ids.get_or_load((sub, email), window, load_user_id)
+        user = loaded[0] if loaded else CachedUser(user_id, sub, email)
         return user, payload
 
+    def _cached_decode(self, token: str, window: int) -> dict:
+        # Keyed by the whole token, not just its signature segment: the
+        # signature only vouches for the header and claims it was made over.
+        key = hashlib.sha256(token.encode()).digest()
+        payload = _verified_tokens.get_or_load(key, window, lambda: self._decode_jwt(token))
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)) and exp <= time.time():
+            # Expired since it was cached: let jose report it.
+            return self._decode_jwt(token)
+        return payload
+
     def _decode_jwt(self, token: str) -> dict:
         """Decode and verify the Supabase JWT."""
         jwt_secret = getattr(settings, "SUPABASE_JWT_SECRET", None)
@@ -4,4 +4,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ersim_backend.settings.dev")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up.
+from sim.live import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Route WebSockets (sim.live) past Django, which only speaks HTTP."""
+
+    if scope["type"] == "websocket":
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,69 @@
+"""Minimal async counterpart of DRF's @api_view for ASGI-native endpoints.
+
+DRF views are sync-only, so the async endpoints are plain Django async views
+wrapped with `async_api_view`, which reproduces the parts of DRF we rely on:
+method checks, Supabase JWT authentication and a parsed `request.data`.
+Error bodies keep DRF's `{"detail": ...}` shape.
+"""
+
+from __future__ import annotations
+
+import json
+from functools import wraps
+from typing import Any, Awaitable, Callable, Iterable
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponseBase, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+
+from authbridge.authentication import SupabaseJWTAuthentication
+
+
+AsyncView = Callable[..., Awaitable[HttpResponseBase]]
+
+
+def _parse_request_data(request: HttpRequest) -> Any:
+    content_type = request.content_type or ""
+    if content_type == "application/json":
+        if not request.body:
+            return {}
+        return json.loads(request.body)
+    return request.POST
+
+
+def async_api_view(methods: Iterable[str]) -> Callable[[AsyncView], AsyncView]:
+    allowed = {m.upper() for m in methods}
+
+    def decorator(view: AsyncView) -> AsyncView:
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponseBase:
+            if request.method not in allowed:
+                return JsonResponse(
+                    {"detail": f'Method "{request.method}" not allowed.'},
+                    status=405,
+                )
+
+            # A cache miss hits the DB, so authenticate off the event loop.
+            try:
+                result = await sync_to_async(SupabaseJWTAuthentication().authenticate)(request)
+            except exceptions.AuthenticationFailed as exc:
+                return JsonResponse({"detail": str(exc.detail)}, status=403)
+            if result is None:
+                return JsonResponse(
+                    {"detail": "Authentication credentials were not provided."},
+                    status=403,
+                )
+            request.user, request.auth = result
+
+            try:
+                request.data = _parse_request_data(request)
+            except (ValueError, UnicodeDecodeError) as exc:
+                return JsonResponse({"detail": f"JSON parse error - {exc}"}, status=400)
+
+            return await view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 import environ
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Third-party
     "corsheaders",
     "rest_framework",
@@ -135,10 +137,124 @@ REST_FRAMEWORK = {
 
 REDIS_URL = env("REDIS_URL", default="redis://localhost:6379/0")
 
+# Per-worker cache of compiled case primers (sim.cases.build_case_primer).
+# Entries are invalidated by the version stamps the import commands bump in
+# Redis; workers re-check those stamps at most every N seconds.
+SIM_PRIMER_CACHE_SIZE = env.int("SIM_PRIMER_CACHE_SIZE", default=512)
+SIM_CASE_VERSION_CHECK_SECONDS = env.float("SIM_CASE_VERSION_CHECK_SECONDS", default=2.0)
+# Per-worker cache of case resource indexes (sim.resources.case_resources),
+# invalidated by the same version stamps.
+SIM_RESOURCE_INDEX_CACHE_SIZE = env.int("SIM_RESOURCE_INDEX_CACHE_SIZE", default=512)
+
+# Per-worker registry of active SimPrompts (sim.prompts). Saving a SimPrompt
+# bumps a Redis counter; workers check it at most every N seconds.
+SIM_PROMPT_VERSION_CHECK_SECONDS = env.float("SIM_PROMPT_VERSION_CHECK_SECONDS", default=2.0)
+
+# Sim session state in Redis (sim.session_state): history, vitals state and
+# served resources per session, expiring SIM_SESSION_TTL_SECONDS after the
+# last turn. History beyond SIM_SESSION_HISTORY_MESSAGES messages or
+# SIM_SESSION_HISTORY_TOKENS estimated tokens (ai.context_window) is folded
+# into a rolling summary by SIM_SESSION_SUMMARIZER (dotted path).
+SIM_SESSION_TTL_SECONDS = env.int("SIM_SESSION_TTL_SECONDS", default=6 * 60 * 60)
+SIM_SESSION_HISTORY_MESSAGES = env.int("SIM_SESSION_HISTORY_MESSAGES", default=20)
+SIM_SESSION_HISTORY_TOKENS = env.int("SIM_SESSION_HISTORY_TOKENS", default=1500)
+SIM_SESSION_SUMMARY_MAX_CHARS = env.int("SIM_SESSION_SUMMARY_MAX_CHARS", default=1500)
+SIM_SESSION_SUMMARIZER = env(
+    "SIM_SESSION_SUMMARIZER", default="sim.session_state.extractive_summary"
+)
+
+# Voice pipeline GPT context (sessions.context): the newest ConversationTurns
+# within VOICE_CONTEXT_TOKENS estimated tokens; older turns are kept as a
+# rolling ConversationSummary built by VOICE_CONTEXT_SUMMARIZER (dotted path).
+VOICE_CONTEXT_TOKENS = env.int("VOICE_CONTEXT_TOKENS", default=1500)
+VOICE_CONTEXT_SUMMARIZER = env(
+    "VOICE_CONTEXT_SUMMARIZER", default="sim.session_state.extractive_summary"
+)
+
+# ConversationTurn appends (sessions.turns): indexes come from a Redis counter
+# per session. With VOICE_TURN_WRITES_DEFERRED the insert happens off the
+# response path, in a background writer batching up to
+# VOICE_TURN_WRITE_BATCH_SIZE rows every VOICE_TURN_WRITE_FLUSH_SECONDS.
+VOICE_TURN_WRITES_DEFERRED = env.bool("VOICE_TURN_WRITES_DEFERRED", default=False)
+VOICE_TURN_WRITE_BATCH_SIZE = env.int("VOICE_TURN_WRITE_BATCH_SIZE", default=100)
+VOICE_TURN_WRITE_FLUSH_SECONDS = env.float("VOICE_TURN_WRITE_FLUSH_SECONDS", default=0.2)
+
+# Server-side vitals engine (sim.vitals). Monitor frames are pushed every
+# Monitor_Vital_Signs_Vitals_Update_Frequency of the case, or every
+# SIM_VITALS_FRAME_SECONDS when the case does not say (clients may ask for a
+# faster ?interval=, down to SIM_VITALS_MIN_FRAME_SECONDS). A state change
+# eases the numbers to the new state over SIM_VITALS_TRANSITION_SECONDS. A
+# vitals stream closes after SIM_VITALS_STREAM_MAX_SECONDS (clients reconnect).
+SIM_VITALS_FRAME_SECONDS = env.float("SIM_VITALS_FRAME_SECONDS", default=1.0)
+SIM_VITALS_MIN_FRAME_SECONDS = env.float("SIM_VITALS_MIN_FRAME_SECONDS", default=0.25)
+SIM_VITALS_TRANSITION_SECONDS = env.float("SIM_VITALS_TRANSITION_SECONDS", default=30.0)
+SIM_VITALS_STREAM_MAX_SECONDS = env.int("SIM_VITALS_STREAM_MAX_SECONDS", default=900)
+
+# Live session WebSockets (sim.live): events waiting to be sent to one socket
+# beyond this many drop the oldest, so a stalled client cannot grow memory.
+SIM_LIVE_QUEUE_SIZE = env.int("SIM_LIVE_QUEUE_SIZE", default=100)
+
+# Opt-in cache of sim GPT responses (sim.response_cache), keyed on case,
+# prompt + case context, the last N history messages and the normalized
+# utterance. Per-case TTLs: SIM_RESPONSE_CACHE_CASE_TTLS="GAST0001=86400,RESP0002=0"
+# (0 disables a case). SIMILARITY > 0 enables the near-duplicate tier.
+SIM_RESPONSE_CACHE_ENABLED = env.bool("SIM_RESPONSE_CACHE_ENABLED", default=False)
+SIM_RESPONSE_CACHE_TTL_SECONDS = env.int("SIM_RESPONSE_CACHE_TTL_SECONDS", default=3600)
+SIM_RESPONSE_CACHE_CASE_TTLS = env.dict(
+    "SIM_RESPONSE_CACHE_CASE_TTLS", cast={"value": int}, default={}
+)
+SIM_RESPONSE_CACHE_HISTORY_MESSAGES = env.int("SIM_RESPONSE_CACHE_HISTORY_MESSAGES", default=4)
+SIM_RESPONSE_CACHE_SIMILARITY = env.float("SIM_RESPONSE_CACHE_SIMILARITY", default=0.0)
+SIM_RESPONSE_CACHE_MAX_BUCKET = env.int("SIM_RESPONSE_CACHE_MAX_BUCKET", default=500)
+
+# Shared upstream HTTP pools (ai.http_client) for OpenAI / ElevenLabs calls.
+# The async client keeps up to UPSTREAM_HTTP_POOL_SIZE keep-alive connections
+# per event loop and never has more than UPSTREAM_HTTP_PER_HOST_LIMIT requests
+# in flight to a single upstream host.
+UPSTREAM_HTTP_POOL_SIZE = env.int("UPSTREAM_HTTP_POOL_SIZE", default=100)
+UPSTREAM_HTTP_PER_HOST_LIMIT = env.int("UPSTREAM_HTTP_PER_HOST_LIMIT", default=50)
+
 # S3 buckets provisioned by Terraform
 ERSIM_ASSETS_BUCKET = env("ERSIM_ASSETS_BUCKET", default="")
 ERSIM_ASSETS_BUCKET_LOGS = env("ERSIM_ASSETS_BUCKET_LOGS", default="")
 
+# Presigned resource URLs (sim.assets) are valid for SIM_PRESIGN_EXPIRES_SECONDS
+# and reused within SIM_PRESIGN_CACHE_SECONDS windows, so each URL handed out
+# stays valid for at least the difference.
+SIM_PRESIGN_EXPIRES_SECONDS = env.int("SIM_PRESIGN_EXPIRES_SECONDS", default=600)
+SIM_PRESIGN_CACHE_SECONDS = env.int("SIM_PRESIGN_CACHE_SECONDS", default=300)
+SIM_PRESIGN_CACHE_SIZE = env.int("SIM_PRESIGN_CACHE_SIZE", default=4096)
+
+# Case imports upsert rows in batches of SIM_IMPORT_BATCH_SIZE inside one
+# transaction (sim.case_import); unchanged rows are skipped by content hash.
+# Rows are streamed, so the batch size also bounds the importer's memory.
+SIM_IMPORT_BATCH_SIZE = env.int("SIM_IMPORT_BATCH_SIZE", default=500)
+
+# Case library (/api/sim/cases/): default page size; clients may ask for up
+# to SIM_CASE_LIBRARY_MAX_PAGE_SIZE with ?limit=.
+SIM_CASE_LIBRARY_PAGE_SIZE = env.int("SIM_CASE_LIBRARY_PAGE_SIZE", default=50)
+SIM_CASE_LIBRARY_MAX_PAGE_SIZE = env.int("SIM_CASE_LIBRARY_MAX_PAGE_SIZE", default=200)
+
+# Media sync for `import_cases_* --fetch-resources` (sim.media_sync): parallel
+# transfers, retries per URL, and the multipart chunk size, which bounds the
+# memory each transfer holds (S3's minimum part size is 5 MB).
+SIM_MEDIA_SYNC_CONCURRENCY = env.int("SIM_MEDIA_SYNC_CONCURRENCY", default=8)
+SIM_MEDIA_SYNC_RETRIES = env.int("SIM_MEDIA_SYNC_RETRIES", default=3)
+SIM_MEDIA_SYNC_CHUNK_MB = env.int("SIM_MEDIA_SYNC_CHUNK_MB", default=8)
+
+# Content-addressed TTS audio cache (voice.tts_cache): per-process memory LRU,
+# then local disk (empty TTS_CACHE_DIR disables it), then S3 under
+# TTS_CACHE_S3_PREFIX in ERSIM_ASSETS_BUCKET.
+TTS_CACHE_MEMORY_BYTES = env.int("TTS_CACHE_MEMORY_BYTES", default=64 * 1024 * 1024)
+TTS_CACHE_DIR = env(
+    "TTS_CACHE_DIR", default=os.path.join(tempfile.gettempdir(), "ersim-tts-cache")
+)
+TTS_CACHE_S3_ENABLED = env.bool("TTS_CACHE_S3_ENABLED", default=True)
+TTS_CACHE_S3_PREFIX = env("TTS_CACHE_S3_PREFIX", default="tts-cache/")
+# Streamed audio is buffered for the cache only up to this size; longer
+# replies are relayed without being cached.
+TTS_CACHE_MAX_ENTRY_BYTES = env.int("TTS_CACHE_MAX_ENTRY_BYTES", default=2 * 1024 * 1024)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = env.list("CORS_ALLOWED_ORIGINS", default=[])
 CORS_ALLOW_CREDENTIALS = True
@@ -158,3 +274,10 @@ CORS_ALLOW_HEADERS = [
 SUPABASE_URL = env("SUPABASE_URL", default="")
 SUPABASE_ANON_KEY = env("SUPABASE_ANON_KEY", default="")
 SUPABASE_JWT_SECRET = env("SUPABASE_JWT_SECRET", default="")
+
+# Per-worker cache of verified Supabase tokens and their user ids
+# (authbridge.authentication), so repeat requests skip the signature check
+# and the user query. Entries live at most SUPABASE_AUTH_CACHE_SECONDS (never
+# past the token's exp); 0 disables the cache.
+SUPABASE_AUTH_CACHE_SECONDS = env.float("SUPABASE_AUTH_CACHE_SECONDS", default=300.0)
+SUPABASE_AUTH_CACHE_SIZE = env.int("SUPABASE_AUTH_CACHE_SIZE", default=10000)
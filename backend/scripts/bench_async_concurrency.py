@@ -0,0 +1,218 @@
+"""Load benchmark: sync vs async Whisper → GPT → ElevenLabs voice turns.
+
+Starts a local stub server that imitates the OpenAI and ElevenLabs endpoints
+(each call sleeps for a fixed upstream latency), points the backend at it via
+OPENAI_API_BASE / ELEVENLABS_API_BASE, and runs the same number of full voice
+turns two ways:
+
+- sync:  the existing functions on a thread pool the size of a sync worker
+         pool (gunicorn --workers 3 by default), one turn per thread;
+- async: the async variants on a single event loop, sharing the pooled
+         httpx client from ai.http_client.
+
+Usage:
+
+    python backend/scripts/bench_async_concurrency.py --turns 300 --latency 0.3
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+REASONING_JSON = json.dumps(
+    {
+        "assistant_text": "Okay, let's get a set of vitals.",
+        "clinical_intent": "command",
+        "vitals_effect": {},
+        "next_step": "Check vitals.",
+    }
+)
+
+
+class StubUpstream:
+    """Tiny keep-alive HTTP/1.1 server answering every POST after `latency`.
+
+    Runs in a child process so it does not compete with the client under
+    test for the GIL.
+    """
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.port = 0
+        self._process: multiprocessing.Process | None = None
+
+    def start(self) -> None:
+        parent, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=self._run, args=(child,), daemon=True)
+        self._process.start()
+        self.port = parent.recv()
+
+    def stop(self) -> None:
+        if self._process is not None:
+            self._process.terminate()
+
+    def _run(self, conn) -> None:
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=4096)
+        )
+        conn.send(server.sockets[0].getsockname()[1])
+        loop.run_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                path = request_line.split()[1].decode()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                await self._read_body(reader, headers)
+
+                await asyncio.sleep(self.latency)
+                body, content_type = self._response_for(path)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    + f"Content-Type: {content_type}\r\n".encode()
+                    + f"Content-Length: {len(body)}\r\n".encode()
+                    + b"Connection: keep-alive\r\n\r\n"
+                    + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: dict) -> None:
+        if "content-length" in headers:
+            await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await reader.readline()).strip(), 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+
+    @staticmethod
+    def _response_for(path: str) -> Tuple[bytes, str]:
+        if path.endswith("/audio/transcriptions"):
+            return json.dumps({"text": "Can I get a set of vitals?"}).encode(), "application/json"
+        if path.endswith("/chat/completions"):
+            body = {"choices": [{"message": {"content": REASONING_JSON}}]}
+            return json.dumps(body).encode(), "application/json"
+        return b"\xff\xfb" + b"\x00" * 16 * 1024, "audio/mpeg"
+
+
+def _audio_file() -> io.BytesIO:
+    audio = io.BytesIO(b"\x00" * 32 * 1024)
+    audio.name = "turn.m4a"
+    return audio
+
+
+def _summarize(label: str, elapsed: float, latencies: List[float]) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:>5}: {len(latencies)} turns in {elapsed:6.2f}s "
+        f"→ {len(latencies) / elapsed:7.1f} turns/s | "
+        f"p50 {statistics.median(latencies) * 1000:7.0f} ms | p95 {p95 * 1000:7.0f} ms"
+    )
+
+
+def run_sync(turns: int, threads: int, timed: Callable) -> None:
+    from ai.reasoning import build_reasoning_gpt
+    from voice.views import synthesize_speech_elevenlabs, transcribe_audio_file
+
+    def one_turn() -> float:
+        start = time.perf_counter()
+        transcript = transcribe_audio_file(_audio_file())["transcript"]
+        result = build_reasoning_gpt(transcript, [])
+        synthesize_speech_elevenlabs(result["assistant_text"])
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(lambda _: one_turn(), range(turns)))
+    timed("sync", time.perf_counter() - start, latencies)
+
+
+def run_async(turns: int, timed: Callable) -> None:
+    from ai.reasoning import abuild_reasoning_gpt
+    from voice.views import asynthesize_speech_elevenlabs, atranscribe_audio_file
+
+    async def one_turn() -> float:
+        start = time.perf_counter()
+        transcript = (await atranscribe_audio_file(_audio_file()))["transcript"]
+        result = await abuild_reasoning_gpt(transcript, [])
+        await asynthesize_speech_elevenlabs(result["assistant_text"])
+        return time.perf_counter() - start
+
+    async def main() -> None:
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one_turn() for _ in range(turns)))
+        timed("async", time.perf_counter() - start, list(latencies))
+
+    asyncio.run(main())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per upstream call.")
+    parser.add_argument(
+        "--sync-threads",
+        type=int,
+        default=3,
+        help="Concurrent sync turns (one per gunicorn sync worker).",
+    )
+    args = parser.parse_args()
+
+    stub = StubUpstream(args.latency)
+    stub.start()
+    base = f"http://127.0.0.1:{stub.port}"
+
+    os.environ["OPENAI_API_BASE"] = f"{base}/v1"
+    os.environ["ELEVENLABS_API_BASE"] = f"{base}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("ELEVENLABS_API_KEY", "bench")
+    # Every turn speaks the same line; keep the TTS cache out of the measurement.
+    os.environ["TTS_CACHE_MEMORY_BYTES"] = "0"
+    os.environ["TTS_CACHE_DIR"] = ""
+    os.environ["TTS_CACHE_S3_ENABLED"] = "false"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ersim_backend.settings.dev")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import django
+
+    django.setup()
+
+    print(f"Stub upstream on {base}, {args.latency * 1000:.0f} ms per call, 3 calls per turn")
+    run_sync(args.turns, args.sync_threads, _summarize)
+    run_async(args.turns, _summarize)
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Microbenchmark: per-request Supabase JWT authentication overhead.
+
+Signs one HS256 token shaped like Supabase's (sub, email, aud, exp) and runs
+what DRF does per request on it repeatedly (`SupabaseJWTAuthentication.
+authenticate`, then the `IsAuthenticated` permission check), two ways:
+
+- uncached: SUPABASE_AUTH_CACHE_SECONDS=0, i.e. signature check plus
+  `get_or_create` on every request (the old behaviour);
+- cached:   the default fast path (verified-token and user-id caches).
+
+Reports the mean time and the number of SQL queries per request. The
+database defaults to a throwaway SQLite file, where queries are far cheaper
+than a networked Postgres round-trip; the query count is the figure that
+carries over.
+
+    python backend/scripts/bench_auth.py --requests 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_async_concurrency import BACKEND_DIR
+
+
+SECRET = "bench-secret"
+
+
+class _Request:
+    def __init__(self, token: str) -> None:
+        self.META = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        self.user = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-auth-"))
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir / 'bench.sqlite3'}")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ersim_backend.settings.dev")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from jose import jwt
+    from rest_framework.permissions import IsAuthenticated
+
+    from authbridge.authentication import SupabaseJWTAuthentication
+
+    settings.DEBUG = False
+    settings.SUPABASE_JWT_SECRET = SECRET
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+    token = jwt.encode(
+        {
+            "sub": "7f9c2c1e-bench-user",
+            "email": "bench@example.org",
+            "aud": "authenticated",
+            "role": "authenticated",
+            "exp": int(time.time()) + 3600,
+        },
+        SECRET,
+        algorithm="HS256",
+    )
+    request = _Request(token)
+    auth = SupabaseJWTAuthentication()
+    permission = IsAuthenticated()
+
+    def handle() -> None:
+        request.user = auth.authenticate(request)[0]
+        if not permission.has_permission(request, None):
+            raise SystemExit("permission check failed")
+
+    def run(label: str, cache_seconds: float) -> float:
+        settings.SUPABASE_AUTH_CACHE_SECONDS = cache_seconds
+        handle()  # warm up (creates the user / fills caches)
+        # Counted separately: capturing queries slows every query down.
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(100):
+                handle()
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            handle()
+        per_request = (time.perf_counter() - start) / args.requests * 1e6
+        print(
+            f"{label:<9} {per_request:8.1f} us/request  "
+            f"{len(queries) / 100:5.2f} queries/request"
+        )
+        return per_request
+
+    before = run("uncached", 0)
+    after = run("cached", 300)
+    print(f"speed-up  {before / after:8.1f}x")
+
+    for path in workdir.iterdir():
+        path.unlink()
+    workdir.rmdir()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Memory/throughput benchmark for the streaming case importers.
+
+Generates a synthetic case sheet (default 50k rows x 400 columns, shaped like
+the real export: case id, status, titles, media URL columns and filler
+columns), then measures:
+
+- buffered: the old approach, the whole export read into one string and
+  every row kept in a list (parse only, no database);
+- import: `import_cases_from_gsheet --csv` (spooled export, rows streamed
+  into batched upserts) into an empty database;
+- re-import: the same file again, where every row is unchanged.
+
+Peak Python memory per phase comes from tracemalloc, which slows the run
+down; pass --no-tracemalloc for throughput numbers alone. The database
+defaults to a throwaway SQLite file; point REDIS_URL at a scratch database
+(the import bumps case versions there).
+
+    python backend/scripts/bench_case_import.py --rows 50000 --cols 400
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from bench_async_concurrency import BACKEND_DIR
+
+
+FIXED_COLUMNS = [
+    "Case_Organization_Case_ID",
+    "Developer_and_QA_Metadata_Conversion_Status",
+    "Case_Organization_Spark_Title",
+    "Case_Organization_Reveal_Title",
+    "Case_Series_Name",
+    "Difficulty_Level",
+    "Resources_and_Media_Assets_Media_URL 1",
+    "Resources_and_Media_Assets_Media_URL 2",
+]
+
+
+def write_synthetic_csv(path: Path, rows: int, cols: int) -> None:
+    """Write `rows` cases with `cols` columns (deterministic content)."""
+
+    filler = [f"Extra_Column_{n:03d}" for n in range(max(0, cols - len(FIXED_COLUMNS)))]
+    with path.open("w", encoding="utf-8", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(FIXED_COLUMNS + filler)
+        for i in range(rows):
+            case_id = f"SYN{i:06d}"
+            writer.writerow(
+                [
+                    case_id,
+                    "converted",
+                    f"Synthetic case {i}",
+                    f"Reveal {i}",
+                    f"Series {i % 40}",
+                    ("easy", "medium", "hard")[i % 3],
+                    f"https://media.example.org/{case_id}/chest_xray.jpg",
+                    f"https://media.example.org/{case_id}/ekg.pdf",
+                ]
+                + [f"{case_id} value {n}" if n % 4 else "" for n in range(len(filler))]
+            )
+
+
+def measure(label: str, fn: Callable[[], int], trace: bool) -> Tuple[float, Optional[float]]:
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    peak_mb = None
+    if trace:
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    peak = f"{peak_mb:8.1f} MB peak" if peak_mb is not None else ""
+    print(f"{label:<10} {rows:>7} rows  {elapsed:7.2f}s  {rows / elapsed:9.0f} rows/s  {peak}")
+    return elapsed, peak_mb
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--cols", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--no-tracemalloc", action="store_true")
+    parser.add_argument(
+        "--keep",
+        action="store_true",
+        help="Keep the generated CSV and SQLite database in the temp directory.",
+    )
+    args = parser.parse_args()
+    trace = not args.no_tracemalloc
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-case-import-"))
+    csv_path = workdir / "cases.csv"
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir / 'bench.sqlite3'}")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ersim_backend.settings.dev")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+
+    # DEBUG keeps the SQL of every query (bulk INSERTs included) in memory,
+    # which would swamp the importer's own footprint.
+    settings.DEBUG = False
+
+    from sim.models import SimCase
+
+    start = time.perf_counter()
+    write_synthetic_csv(csv_path, args.rows, args.cols)
+    size_mb = csv_path.stat().st_size / (1024 * 1024)
+    print(
+        f"Generated {args.rows} rows x {args.cols} columns ({size_mb:.0f} MB) "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+    def buffered() -> int:
+        text = csv_path.read_text(encoding="utf-8-sig")
+        return len(list(csv.DictReader(io.StringIO(text))))
+
+    def streamed() -> int:
+        call_command(
+            "import_cases_from_gsheet",
+            csv=str(csv_path),
+            batch_size=args.batch_size,
+            stdout=io.StringIO(),
+        )
+        return SimCase.objects.count()
+
+    measure("buffered", buffered, trace)
+    measure("import", streamed, trace)
+    measure("re-import", streamed, trace)
+
+    if args.keep:
+        print(f"Kept {workdir}")
+    else:
+        for path in workdir.iterdir():
+            path.unlink()
+        workdir.rmdir()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Replay a recorded classroom session through the sim response cache.
+
+Input is a JSON-lines recording, one turn per line, in the order they
+happened:
+
+    {"session_id": "learner-01", "case_id": "GAST0001", "utterance": "What are his vitals?"}
+
+Each turn goes through `sim.ai_bridge.get_sim_ai_response` with the
+response cache enabled and per-session conversation history, exactly like
+/api/sim/respond/. By default GPT is a local stub (so the run is free and
+only the cache behaviour is measured); pass --live to call OpenAI.
+
+The report is taken from the cache and token-usage counters in Redis
+(before/after diff), so point REDIS_URL at a scratch database. With --live
+it includes how many prompt tokens OpenAI served from its prompt cache
+(see sim.prompt_layout):
+
+    python backend/scripts/replay_sim_session.py classroom.jsonl --similarity 0.9
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from bench_async_concurrency import BACKEND_DIR, StubUpstream
+
+
+SIM_JSON = json.dumps(
+    {
+        "speech_output": "Okay, getting a fresh set of vitals now.",
+        "action_triggers": [],
+        "ui_updates": {},
+        "advance_patient_state": None,
+        "update_vitals": None,
+        "patient_voice": None,
+        "hint": None,
+    }
+)
+
+
+class SimStubUpstream(StubUpstream):
+    @staticmethod
+    def _response_for(path: str) -> Tuple[bytes, str]:
+        body = {"choices": [{"message": {"content": SIM_JSON}}]}
+        return json.dumps(body).encode(), "application/json"
+
+
+def _load_turns(path: Path) -> List[Dict[str, str]]:
+    turns = []
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                turns.append(json.loads(line))
+    return turns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", type=Path, help="JSON-lines recording of the session.")
+    parser.add_argument("--live", action="store_true", help="Call OpenAI instead of the stub.")
+    parser.add_argument("--latency", type=float, default=0.8, help="Stub GPT latency in seconds.")
+    parser.add_argument(
+        "--similarity",
+        type=float,
+        default=0.0,
+        help="SIM_RESPONSE_CACHE_SIMILARITY for the run (0 = exact tier only).",
+    )
+    args = parser.parse_args()
+
+    stub = None
+    if not args.live:
+        stub = SimStubUpstream(args.latency)
+        stub.start()
+        os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{stub.port}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "replay")
+
+    os.environ["SIM_RESPONSE_CACHE_ENABLED"] = "true"
+    os.environ["SIM_RESPONSE_CACHE_SIMILARITY"] = str(args.similarity)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ersim_backend.settings.dev")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import django
+
+    django.setup()
+
+    from sim import prompt_layout, response_cache
+    from sim.ai_bridge import get_sim_ai_response
+    from sim.cases import build_case_primer
+
+    turns = _load_turns(args.recording)
+    histories: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+    before = response_cache.stats()
+    usage_before = prompt_layout.usage_stats()
+
+    start = time.perf_counter()
+    for turn in turns:
+        case_primer = build_case_primer(turn["case_id"])
+        history = histories[turn.get("session_id") or "default"]
+        result = get_sim_ai_response(
+            doctor_utterance=turn["utterance"],
+            case_context=case_primer,
+            available_resources=list(case_primer.get("available_resources", [])),
+            conversation_history=list(history),
+        )
+        history.append({"role": "user", "content": turn["utterance"]})
+        history.append({"role": "assistant", "content": result.get("speech_output", "")})
+    elapsed = time.perf_counter() - start
+
+    after = response_cache.stats()
+    counters = {
+        field: after[field] - before[field]
+        for field in ("exact_hits", "similar_hits", "misses", "bypassed")
+    }
+    report = response_cache.summarize(counters)
+
+    print(f"Replayed {len(turns)} turns from {len(histories)} sessions in {elapsed:.2f}s")
+    print(
+        f"  exact hits {report['exact_hits']}, similar hits {report['similar_hits']}, "
+        f"misses {report['misses']}"
+    )
+    print(
+        f"  hit rate {report['hit_rate']:.1%}, "
+        f"LLM calls avoided {report['llm_calls_avoided']} of {len(turns)}"
+    )
+
+    usage_after = prompt_layout.usage_stats()
+    usage = prompt_layout.summarize_usage(
+        {
+            field: usage_after[field] - usage_before[field]
+            for field in ("calls", "prompt_tokens", "cached_tokens", "completion_tokens")
+        }
+    )
+    if usage["calls"]:
+        print(
+            f"  prompt tokens {usage['prompt_tokens']}, served from the provider's prompt "
+            f"cache {usage['cached_tokens']} ({usage['cached_rate']:.1%})"
+        )
+
+    if stub is not None:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
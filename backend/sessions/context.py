@@ -0,0 +1,131 @@
+"""Token-budgeted GPT context for voice sessions (ConversationTurn rows).
+
+`load_session_context` walks a session's turns newest first, in small
+reverse-ordered LIMIT queries on the (user, session_id, turn_index) unique
+index (CONTEXT_PAGE_SIZE rows, then doubling), and keeps whole turns until
+VOICE_CONTEXT_TOKENS (estimated, see ai.context_window) is spent.
+Only `transcript` and `reasoning_json.assistant_text` are read.
+
+Older turns are represented by a rolling summary stored per session in
+`ConversationSummary`. It remembers the last turn it covers, so each call
+only folds in the turns that have just fallen out of the budget
+(VOICE_CONTEXT_SUMMARIZER, by default the sim's extractive summary).
+"""
+
+from __future__ import annotations
+
+import logging
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models.fields.json import KT
+from django.utils.module_loading import import_string
+
+from ai.context_window import messages_tokens
+from sessions.models import ConversationSummary, ConversationTurn
+
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_PAGE_SIZE = 16
+
+Message = Dict[str, str]
+
+
+@lru_cache(maxsize=1)
+def _summarizer() -> Callable[[str, List[Message]], str]:
+    return import_string(
+        getattr(settings, "VOICE_CONTEXT_SUMMARIZER", "sim.session_state.extractive_summary")
+    )
+
+
+def _turn_messages(transcript: str, assistant_text: Optional[str]) -> List[Message]:
+    messages = [{"role": "user", "content": transcript}]
+    if assistant_text:
+        messages.append({"role": "assistant", "content": assistant_text})
+    return messages
+
+
+def _turn_rows(user, session_id: str):
+    return ConversationTurn.objects.filter(user_id=user.pk, session_id=session_id).annotate(
+        assistant_text=KT("reasoning_json__assistant_text")
+    )
+
+
+def _recent_turns(
+    user, session_id: str, budget_tokens: int
+) -> Tuple[List[List[Message]], Optional[int]]:
+    """Newest-first turns that fit the budget, and the newest turn_index left out."""
+
+    kept: List[List[Message]] = []
+    used = 0
+    before: Optional[int] = None
+    limit = CONTEXT_PAGE_SIZE
+    while True:
+        rows = _turn_rows(user, session_id)
+        if before is not None:
+            rows = rows.filter(turn_index__lt=before)
+        page = list(
+            rows.order_by("-turn_index").values_list(
+                "turn_index", "transcript", "assistant_text"
+            )[:limit]
+        )
+        for turn_index, transcript, assistant_text in page:
+            messages = _turn_messages(transcript, assistant_text)
+            cost = messages_tokens(messages)
+            # The newest turn is always kept, whatever it costs.
+            if kept and used + cost > budget_tokens:
+                return kept, turn_index
+            kept.append(messages)
+            used += cost
+        if len(page) < limit:
+            return kept, None
+        before = page[-1][0]
+        # Long budgets of short turns: fewer, larger pages.
+        limit *= 2
+
+
+def _rolled_summary(user, session_id: str, through_turn_index: int) -> str:
+    """The session summary, extended to cover turns up to `through_turn_index`."""
+
+    row, _ = ConversationSummary.objects.get_or_create(
+        user_id=user.pk, session_id=session_id
+    )
+    if row.through_turn_index >= through_turn_index:
+        return row.summary
+
+    dropped: List[Message] = []
+    for transcript, assistant_text in (
+        _turn_rows(user, session_id)
+        .filter(turn_index__gt=row.through_turn_index, turn_index__lte=through_turn_index)
+        .order_by("turn_index")
+        .values_list("transcript", "assistant_text")
+    ):
+        dropped.extend(_turn_messages(transcript, assistant_text))
+    try:
+        row.summary = _summarizer()(row.summary, dropped)
+    except Exception:  # a broken hook must not fail the turn
+        logger.exception("Voice context summarizer failed; dropping %d messages", len(dropped))
+    row.through_turn_index = through_turn_index
+    row.save(update_fields=["summary", "through_turn_index", "updated_at"])
+    return row.summary
+
+
+def load_session_context(
+    user, session_id: str, budget_tokens: Optional[int] = None
+) -> List[Message]:
+    """Chat-style context for GPT: the rolling summary, then the recent turns."""
+
+    if budget_tokens is None:
+        budget_tokens = int(getattr(settings, "VOICE_CONTEXT_TOKENS", 1500))
+    kept, left_out = _recent_turns(user, session_id, budget_tokens)
+
+    context: List[Message] = []
+    if left_out is not None:
+        summary = _rolled_summary(user, session_id, left_out)
+        if summary:
+            context.append({"role": "system", "content": f"Session summary so far: {summary}"})
+    for messages in reversed(kept):
+        context.extend(messages)
+    return context
@@ -14,6 +14,33 @@ class ConversationTurn(models.Model):
 
     class Meta:
         unique_together = ("user", "session_id", "turn_index")
+        indexes = [
+            # Newest-first reads of a session (context pages, next index).
+            models.Index(
+                fields=["user", "session_id", "-turn_index"], name="conv_turn_session_recent"
+            ),
+        ]
 
     def __str__(self) -> str:  # pragma: no cover - simple repr
         return f"ConversationTurn<{self.user_id}:{self.session_id}:{self.turn_index}>"
+
+
+class ConversationSummary(models.Model):
+    """Rolling summary of the turns that no longer fit a session's context.
+
+    Maintained by `sessions.context.load_session_context`: turns up to
+    `through_turn_index` have been folded into `summary`.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    session_id = models.CharField(max_length=64)
+    through_turn_index = models.IntegerField(default=-1)
+    summary = models.TextField(blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "session_id")
+
+    def __str__(self) -> str:  # pragma: no cover - simple repr
+        return f"ConversationSummary<{self.user_id}:{self.session_id}:{self.through_turn_index}>"
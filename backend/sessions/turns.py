@@ -0,0 +1,231 @@
+"""Race-free turn appends for ConversationTurn.
+
+A session's next `turn_index` comes from a Redis counter,
+`sim:turns:{user_id}:{session_id}`, allocated with one INCR. The first
+append of a session (or the first after the counter expired) seeds it from
+the table's current maximum with SET NX, so concurrent requests for the same
+session always get distinct indexes and the insert is a single query.
+
+Without Redis, indexes are computed from the table and the insert is retried
+when a concurrent request took the same index (the unique constraint on
+(user, session_id, turn_index) decides).
+
+With VOICE_TURN_WRITES_DEFERRED the row is handed to `turn_writer`, a
+per-process background thread that inserts queued turns in batches, so the
+response does not wait on the database. A turn written that way may not be
+visible to a request that arrives within VOICE_TURN_WRITE_FLUSH_SECONDS.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import redis
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import Max
+
+from sessions.models import ConversationTurn
+from sim.state_store import get_redis_client, session_ttl
+
+
+logger = logging.getLogger(__name__)
+
+DB_APPEND_ATTEMPTS = 5
+
+
+def turn_counter_key(user_id: int, session_id: str) -> str:
+    return f"sim:turns:{user_id}:{session_id}"
+
+
+def _last_turn_index(user_id: int, session_id: str) -> int:
+    last = ConversationTurn.objects.filter(user_id=user_id, session_id=session_id).aggregate(
+        last=Max("turn_index")
+    )["last"]
+    return -1 if last is None else last
+
+
+def allocate_turn_index(user_id: int, session_id: str) -> Optional[int]:
+    """Reserve the session's next turn_index; None when Redis is unavailable."""
+
+    key = turn_counter_key(user_id, session_id)
+    try:
+        client = get_redis_client()
+        if not client.exists(key):
+            client.set(key, _last_turn_index(user_id, session_id), nx=True, ex=session_ttl())
+        pipe = client.pipeline(transaction=True)
+        pipe.incr(key)
+        pipe.expire(key, session_ttl())
+        index, _ = pipe.execute()
+    except redis.RedisError:
+        logger.warning("Turn counter unavailable; allocating from the database", exc_info=True)
+        return None
+    return int(index)
+
+
+def forget_turn_counter(user_id: int, session_id: str) -> None:
+    """Drop the counter so the next append reseeds it from the table."""
+
+    try:
+        get_redis_client().delete(turn_counter_key(user_id, session_id))
+    except redis.RedisError:
+        pass
+
+
+def _append_from_db(turn: ConversationTurn) -> int:
+    """Insert `turn` at the table's next index, retrying on a concurrent append."""
+
+    attempts = 0
+    while True:
+        turn.turn_index = _last_turn_index(turn.user_id, turn.session_id) + 1
+        try:
+            with transaction.atomic():
+                turn.save(force_insert=True)
+            return turn.turn_index
+        except IntegrityError:
+            attempts += 1
+            if attempts >= DB_APPEND_ATTEMPTS:
+                raise
+            turn.pk = None
+
+
+def append_turn(
+    user, session_id: str, transcript: str, reasoning: Dict[str, Any]
+) -> int:
+    """Append a turn to the session and return its turn_index."""
+
+    turn = ConversationTurn(
+        user_id=user.pk,
+        session_id=session_id,
+        transcript=transcript,
+        reasoning_json=reasoning,
+    )
+    index = allocate_turn_index(user.pk, session_id)
+    if index is None:
+        return _append_from_db(turn)
+
+    turn.turn_index = index
+    if getattr(settings, "VOICE_TURN_WRITES_DEFERRED", False):
+        turn_writer.submit(turn)
+        return index
+    try:
+        with transaction.atomic():
+            turn.save(force_insert=True)
+    except IntegrityError:
+        # The counter is behind the table (rows written while Redis was down).
+        logger.warning("Turn counter behind for session %s; reseeding", session_id)
+        forget_turn_counter(user.pk, session_id)
+        turn.pk = None
+        return _append_from_db(turn)
+    return index
+
+
+class TurnWriter:
+    """Background thread inserting queued ConversationTurns in batches.
+
+    A batch is whatever arrived within `flush_seconds` of its first turn, up
+    to `batch_size` rows, written with one `bulk_create`. If the batch
+    conflicts, its rows are written one by one and a conflicting row is
+    re-appended at the table's next index.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_seconds: float = 0.2) -> None:
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: "queue.Queue[ConversationTurn]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, turn: ConversationTurn) -> None:
+        self._ensure_started()
+        self._queue.put(turn)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every submitted turn is written; False on timeout."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="turn-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _next_batch(self) -> List[ConversationTurn]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("Turn writer dropped %d turns", len(batch))
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: List[ConversationTurn]) -> None:
+        try:
+            with transaction.atomic():
+                ConversationTurn.objects.bulk_create(batch)
+            return
+        except IntegrityError:
+            pass
+        for turn in batch:
+            turn.pk = None
+            try:
+                with transaction.atomic():
+                    turn.save(force_insert=True)
+            except IntegrityError:
+                requested = turn.turn_index
+                forget_turn_counter(turn.user_id, turn.session_id)
+                turn.pk = None
+                logger.warning(
+                    "Turn %s:%s:%d already taken; written as %d",
+                    turn.user_id,
+                    turn.session_id,
+                    requested,
+                    _append_from_db(turn),
+                )
+            except DatabaseError:
+                logger.exception(
+                    "Turn writer could not write %s:%s:%d",
+                    turn.user_id,
+                    turn.session_id,
+                    turn.turn_index,
+                )
+
+
+turn_writer = TurnWriter(
+    batch_size=int(getattr(settings, "VOICE_TURN_WRITE_BATCH_SIZE", 100)),
+    flush_seconds=float(getattr(settings, "VOICE_TURN_WRITE_FLUSH_SECONDS", 0.2)),
+)
+
+# Graceful worker shutdown: write what is still queued.
+atexit.register(turn_writer.flush, 10.0)
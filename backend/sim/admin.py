@@ -2,14 +2,21 @@ from __future__ import annotations
 
 from django.contrib import admin
 
-from sim.models import SimCase, SimPrompt, SimResource
+from sim.models import (
+    SimCase,
+    SimCasePatient,
+    SimLearningObjective,
+    SimPrompt,
+    SimResource,
+    SimVitalsState,
+)
 
 
 @admin.register(SimPrompt)
 class SimPromptAdmin(admin.ModelAdmin):
-    list_display = ("key", "name", "is_active", "created_at")
-    list_filter = ("key", "is_active")
-    search_fields = ("key", "name", "description")
+    list_display = ("key", "name", "case_id", "cohort", "is_active", "created_at")
+    list_filter = ("key", "is_active", "cohort")
+    search_fields = ("key", "name", "description", "case_id")
     readonly_fields = ("created_at", "updated_at")
 
 
@@ -20,13 +27,36 @@ class SimResourceInline(admin.TabularInline):
     fields = ("resource_id", "resource_type", "original_url", "s3_key", "is_synced")
 
 
+class SimCasePatientInline(admin.StackedInline):
+    model = SimCasePatient
+    extra = 0
+    can_delete = False
+
+
+class SimVitalsStateInline(admin.TabularInline):
+    model = SimVitalsState
+    extra = 0
+    fields = ("position", "state_id", "heart_rate", "systolic_bp", "diastolic_bp", "spo2")
+
+
+class SimLearningObjectiveInline(admin.TabularInline):
+    model = SimLearningObjective
+    extra = 0
+    fields = ("position", "text")
+
+
 @admin.register(SimCase)
 class SimCaseAdmin(admin.ModelAdmin):
     list_display = ("case_id", "spark_title", "reveal_title", "series_name", "difficulty_level")
     list_filter = ("series_name", "difficulty_level")
     search_fields = ("case_id", "spark_title", "reveal_title", "series_name")
     readonly_fields = ("created_at", "updated_at")
-    inlines = [SimResourceInline]
+    inlines = [
+        SimCasePatientInline,
+        SimVitalsStateInline,
+        SimLearningObjectiveInline,
+        SimResourceInline,
+    ]
 
 
 @admin.register(SimResource)
@@ -2,15 +2,16 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
-import requests
+from asgiref.sync import sync_to_async
 
 try:
     # Re-use existing model + key helpers for consistency with voice pipeline.
-    from ai.reasoning import OPENAI_CHAT_MODEL, _get_openai_chat_api_key  # type: ignore[attr-defined]
+    from ai.reasoning import OPENAI_API_BASE, OPENAI_CHAT_MODEL, _get_openai_chat_api_key  # type: ignore[attr-defined]
 except Exception:  # pragma: no cover - guard if internals change
     OPENAI_CHAT_MODEL = os.environ.get("OPENAI_GPT_MODEL", "gpt-4o-mini")
+    OPENAI_API_BASE = os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/")
 
     def _get_openai_chat_api_key() -> str:
         key = os.environ.get("OPENAI_API_KEY")
@@ -18,7 +19,17 @@ except Exception:  # pragma: no cover - guard if internals change
             raise RuntimeError("OPENAI_API_KEY is not configured.")
         return key
 
-from sim.prompts import get_sim_system_prompt
+from ai.http_client import UPSTREAM_TIMEOUT_SECONDS, get_http_session, post, upstream_slot
+from ai.streaming import IncrementalJSONObjectParser, iter_chat_completion_deltas
+from sim import prompt_layout, response_cache
+from sim.prompts import get_active_prompt
+
+
+OPENAI_CHAT_COMPLETIONS_URL = f"{OPENAI_API_BASE}/chat/completions"
+
+# Top-level fields of the sim JSON that the streaming endpoint emits as
+# separate events as soon as the model has finished writing them.
+STREAMED_SIM_FIELDS = ("action_triggers", "update_vitals", "advance_patient_state")
 
 
 def _build_sim_messages(
@@ -26,37 +37,23 @@ def _build_sim_messages(
     case_context: Dict[str, Any],
     available_resources: List[str],
     conversation_history: Optional[List[Dict[str, str]]] = None,
+    cohort: Optional[str] = None,
 ) -> List[Dict[str, str]]:
-    """Build chat messages for the simulation GPT call."""
-
-    system_prompt = get_sim_system_prompt()
-
-    messages: List[Dict[str, str]] = [
-        {"role": "system", "content": system_prompt.strip()},
-        {
-            "role": "system",
-            "content": json.dumps(
-                {
-                    "case_context": case_context,
-                    "available_resources": available_resources,
-                },
-                ensure_ascii=False,
-            ),
-        },
-    ]
+    """Build chat messages for the simulation GPT call.
 
-    if conversation_history:
-        messages.extend(conversation_history)
+    The system prompt is picked for the case and the learner's `cohort`
+    (see sim.prompts); the order of the messages is `sim.prompt_layout`'s.
+    """
 
-    messages.append(
-        {
-            "role": "user",
-            "content": doctor_utterance,
-        }
+    prompt = get_active_prompt(case_id=case_context.get("case_id"), cohort=cohort)
+    return prompt_layout.build_messages(
+        prompt,
+        doctor_utterance=doctor_utterance,
+        case_context=case_context,
+        available_resources=available_resources,
+        conversation_history=conversation_history,
     )
 
-    return messages
-
 
 def _safe_extract_json_block(text: str) -> str:
     """Best-effort extraction of a JSON object from a model string response.
@@ -180,6 +177,8 @@ def get_sim_ai_response(
     case_context: Dict[str, Any],
     available_resources: List[str],
     conversation_history: Optional[List[Dict[str, str]]] = None,
+    use_cache: bool = True,
+    cohort: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Call GPT to get a simulation response with dual outputs.
 
@@ -192,6 +191,9 @@ def get_sim_ai_response(
     to extract and parse a JSON block, and if that fails it falls back to
     returning the raw text as speech_output with no triggers.
 
+    When SIM_RESPONSE_CACHE_ENABLED is set, responses are served from and
+    stored in `sim.response_cache`; pass `use_cache=False` to bypass it.
+
     >>> parsed = _normalize_sim_response(
     ...     {"speech_output": "OK.", "action_triggers": [], "ui_updates": {}},
     ...     ["chest_xray"],
@@ -205,26 +207,246 @@ def get_sim_ai_response(
         case_context=case_context,
         available_resources=available_resources,
         conversation_history=conversation_history,
+        cohort=cohort,
     )
 
-    api_key = _get_openai_chat_api_key()
+    slot = _cache_slot(case_context, messages, use_cache)
+    if slot is not None:
+        cached = response_cache.lookup(slot)
+        if cached is not None:
+            return cached
 
-    resp = requests.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "model": OPENAI_CHAT_MODEL,
-            "messages": messages,
-            "temperature": 0.3,
-        },
-        timeout=60,
+    resp = post(**_chat_completion_request(messages, stream=False))
+    data = resp.json()
+    content = data["choices"][0]["message"]["content"]
+    prompt_layout.record_usage(data.get("usage"))
+
+    result = _parse_sim_content(content, available_resources)
+    if slot is not None and _is_cacheable(result):
+        response_cache.store(slot, result)
+    return result
+
+
+async def aget_sim_ai_response(
+    doctor_utterance: str,
+    case_context: Dict[str, Any],
+    available_resources: List[str],
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    use_cache: bool = True,
+    cohort: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Async variant of `get_sim_ai_response` using the pooled async client."""
+
+    messages = await sync_to_async(_build_sim_messages)(
+        doctor_utterance=doctor_utterance,
+        case_context=case_context,
+        available_resources=available_resources,
+        conversation_history=conversation_history,
+        cohort=cohort,
     )
+
+    slot = _cache_slot(case_context, messages, use_cache)
+    if slot is not None:
+        cached = await sync_to_async(response_cache.lookup, thread_sensitive=False)(slot)
+        if cached is not None:
+            return cached
+
+    request = _chat_completion_request(messages, stream=False)
+    async with upstream_slot(request["url"]) as client:
+        resp = await client.post(**request)
     resp.raise_for_status()
     data = resp.json()
     content = data["choices"][0]["message"]["content"]
+    await sync_to_async(prompt_layout.record_usage, thread_sensitive=False)(data.get("usage"))
+
+    result = _parse_sim_content(content, available_resources)
+    if slot is not None and _is_cacheable(result):
+        await sync_to_async(response_cache.store, thread_sensitive=False)(slot, result)
+    return result
+
+
+def stream_sim_ai_response(
+    doctor_utterance: str,
+    case_context: Dict[str, Any],
+    available_resources: List[str],
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    use_cache: bool = True,
+    cohort: Optional[str] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """Streaming variant of `get_sim_ai_response`.
+
+    Yields `(event, payload)` tuples as the model writes its JSON:
+      - ("speech", str): the next decoded slice of speech_output.
+      - (field, value) for each of STREAMED_SIM_FIELDS once complete;
+        action_triggers are filtered exactly like the non-streaming path.
+      - ("done", dict): the final normalized response, same shape as
+        `get_sim_ai_response`.
+
+    Cache hits replay the same events from the cached response.
+    """
+
+    messages = _build_sim_messages(
+        doctor_utterance=doctor_utterance,
+        case_context=case_context,
+        available_resources=available_resources,
+        conversation_history=conversation_history,
+        cohort=cohort,
+    )
+
+    slot = _cache_slot(case_context, messages, use_cache)
+    if slot is not None:
+        cached = response_cache.lookup(slot)
+        if cached is not None:
+            yield from _replay_cached(cached)
+            return
+
+    stream = _SimStream(available_resources)
+    usage: Dict[str, Any] = {}
+    request = _chat_completion_request(messages, stream=True)
+    with get_http_session().post(
+        **request, stream=True, timeout=UPSTREAM_TIMEOUT_SECONDS
+    ) as resp:
+        resp.raise_for_status()
+        for delta in iter_chat_completion_deltas(resp.iter_lines(), usage=usage):
+            yield from stream.feed(delta)
+    prompt_layout.record_usage(usage)
+
+    result = stream.result()
+    if slot is not None and _is_cacheable(result):
+        response_cache.store(slot, result)
+    yield "done", result
+
+
+async def astream_sim_ai_response(
+    doctor_utterance: str,
+    case_context: Dict[str, Any],
+    available_resources: List[str],
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    use_cache: bool = True,
+    cohort: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Async variant of `stream_sim_ai_response`; yields the same events."""
+
+    messages = await sync_to_async(_build_sim_messages)(
+        doctor_utterance=doctor_utterance,
+        case_context=case_context,
+        available_resources=available_resources,
+        conversation_history=conversation_history,
+        cohort=cohort,
+    )
+
+    slot = _cache_slot(case_context, messages, use_cache)
+    if slot is not None:
+        cached = await sync_to_async(response_cache.lookup, thread_sensitive=False)(slot)
+        if cached is not None:
+            for event in _replay_cached(cached):
+                yield event
+            return
+
+    stream = _SimStream(available_resources)
+    usage: Dict[str, Any] = {}
+    request = _chat_completion_request(messages, stream=True)
+    async with upstream_slot(request["url"]) as client:
+        async with client.stream("POST", **request) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                for delta in iter_chat_completion_deltas([line], usage=usage):
+                    for event in stream.feed(delta):
+                        yield event
+    await sync_to_async(prompt_layout.record_usage, thread_sensitive=False)(usage)
+
+    result = stream.result()
+    if slot is not None and _is_cacheable(result):
+        await sync_to_async(response_cache.store, thread_sensitive=False)(slot, result)
+    yield "done", result
+
+
+def _cache_slot(
+    case_context: Dict[str, Any], messages: List[Dict[str, str]], use_cache: bool
+) -> Optional[response_cache.CacheSlot]:
+    slot = response_cache.cache_slot(case_context.get("case_id"), messages)
+    if slot is not None and not use_cache:
+        response_cache.record("bypassed")
+        return None
+    return slot
+
+
+def _is_cacheable(result: Dict[str, Any]) -> bool:
+    # Only fully normalized responses; the raw-text fallbacks of
+    # `_parse_sim_content` lack these keys and should be retried next time.
+    return "advance_patient_state" in result and bool(result.get("speech_output"))
+
+
+def _replay_cached(result: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """Stream events for a cached response, in the order a live stream has them.
+
+    >>> [e for e, _ in _replay_cached({"speech_output": "Hi.", "action_triggers": []})]
+    ['speech', 'action_triggers', 'update_vitals', 'advance_patient_state', 'done']
+    """
+
+    if result.get("speech_output"):
+        yield "speech", result["speech_output"]
+    for field in STREAMED_SIM_FIELDS:
+        yield field, result.get(field)
+    yield "done", result
+
+
+class _SimStream:
+    """Turns streamed content deltas into sim stream events."""
+
+    def __init__(self, available_resources: List[str]) -> None:
+        self.available_resources = available_resources
+        self.parser = IncrementalJSONObjectParser("speech_output")
+        self.content_parts: List[str] = []
+        self.speech_parts: List[str] = []
+
+    def feed(self, delta: str) -> Iterator[Tuple[str, Any]]:
+        self.content_parts.append(delta)
+        for kind, value in self.parser.feed(delta):
+            if kind == "text":
+                self.speech_parts.append(value)
+                yield "speech", value
+                continue
+
+            key, field_value = value
+            if key not in STREAMED_SIM_FIELDS:
+                continue
+            if key == "action_triggers":
+                field_value = _normalize_sim_response(
+                    {"speech_output": "".join(self.speech_parts), "action_triggers": field_value},
+                    self.available_resources,
+                )["action_triggers"]
+            yield key, field_value
+
+    def result(self) -> Dict[str, Any]:
+        return _parse_sim_content("".join(self.content_parts), self.available_resources)
+
+
+def _chat_completion_request(messages: List[Dict[str, str]], stream: bool) -> Dict[str, Any]:
+    api_key = _get_openai_chat_api_key()
+
+    payload: Dict[str, Any] = {
+        "model": OPENAI_CHAT_MODEL,
+        "messages": messages,
+        "temperature": 0.3,
+    }
+    if stream:
+        payload["stream"] = True
+        # Token usage (incl. cached prompt tokens) arrives in a final chunk.
+        payload["stream_options"] = {"include_usage": True}
+
+    return {
+        "url": OPENAI_CHAT_COMPLETIONS_URL,
+        "headers": {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        },
+        "json": payload,
+    }
+
+
+def _parse_sim_content(content: str, available_resources: List[str]) -> Dict[str, Any]:
+    """Parse the model's message content into a normalized sim response."""
 
     # Robust JSON parsing
     json_text = _safe_extract_json_block(content)
@@ -250,5 +472,3 @@ def get_sim_ai_response(
         }
 
     return _normalize_sim_response(raw, available_resources)
-
-
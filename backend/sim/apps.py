@@ -6,4 +6,5 @@ class SimConfig(AppConfig):
     name = "sim"
     verbose_name = "Simulation"
 
-
+    def ready(self) -> None:
+        from sim import signals  # noqa: F401 (connects the receivers)
@@ -0,0 +1,61 @@
+"""S3 access for case assets: one shared client and a presigned-URL cache.
+
+boto3 clients are thread-safe but expensive to build (credential chain,
+endpoint resolution), so the process keeps a single one.
+
+Presigned URLs are cached per (bucket, s3_key, expiry window). Time is cut
+into windows of SIM_PRESIGN_CACHE_SECONDS; the first request in a window
+signs a URL valid for SIM_PRESIGN_EXPIRES_SECONDS and later requests in the
+same window reuse it. Every URL handed out therefore stays valid for at
+least EXPIRES - CACHE seconds.
+"""
+
+from __future__ import annotations
+
+import time
+from functools import lru_cache
+from typing import Tuple
+
+import boto3
+from django.conf import settings
+
+from sim.case_cache import VersionedLRUCache
+
+
+_presigned_urls: VersionedLRUCache[Tuple[str, str], str] = VersionedLRUCache(
+    maxsize=getattr(settings, "SIM_PRESIGN_CACHE_SIZE", 4096),
+)
+
+
+@lru_cache(maxsize=1)
+def get_s3_client():
+    """Return the process-wide boto3 S3 client."""
+
+    return boto3.client("s3")
+
+
+def _presign_windows() -> Tuple[int, int]:
+    expires_in = int(getattr(settings, "SIM_PRESIGN_EXPIRES_SECONDS", 600))
+    window = int(getattr(settings, "SIM_PRESIGN_CACHE_SECONDS", 300))
+    # A window longer than the expiry would hand out dead URLs.
+    return expires_in, max(0, min(window, expires_in - 60))
+
+
+def presigned_get_url(bucket: str, s3_key: str) -> str:
+    """Return a (possibly cached) presigned `get_object` URL for `s3_key`.
+
+    Raises botocore's ClientError / BotoCoreError like `generate_presigned_url`.
+    """
+
+    expires_in, window = _presign_windows()
+
+    def sign() -> str:
+        return get_s3_client().generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket, "Key": s3_key},
+            ExpiresIn=expires_in,
+        )
+
+    if window <= 0:
+        return sign()
+    return _presigned_urls.get_or_load((bucket, s3_key), int(time.time() // window), sign)
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, List
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpRequest, HttpResponseBase, JsonResponse, StreamingHttpResponse
+from rest_framework import status
+
+from ai.streaming import format_sse
+from ersim_backend.async_api import async_api_view
+from sim.ai_bridge import aget_sim_ai_response, astream_sim_ai_response
+from sim.cases import build_case_primer
+from sim.session_state import load_monitor_state, load_session, record_turn
+from sim.views import (
+    SESSION_FORBIDDEN,
+    SESSION_UNAVAILABLE,
+    _checked_state_changes,
+    _client_ack,
+    _get_session_id_from_payload,
+    _prompt_cohort,
+    _sim_response_payload,
+    _use_response_cache,
+)
+from sim.vitals import monitor_frame
+
+
+logger = logging.getLogger(__name__)
+
+# Redis-only, so they can run on any thread.
+_aload_session = sync_to_async(load_session, thread_sensitive=False)
+_arecord_turn = sync_to_async(record_turn, thread_sensitive=False)
+_aload_monitor_state = sync_to_async(load_monitor_state, thread_sensitive=False)
+
+
+@async_api_view(["POST"])
+async def async_sim_respond_view(request: HttpRequest) -> HttpResponseBase:
+    """POST /api/sim/async/respond/
+
+    ASGI-native twin of /api/sim/respond/ (same input and response). The
+    GPT call goes through the pooled async client, so a worker is not pinned
+    to this request while waiting on the model.
+    """
+
+    payload = request.data
+    case_id = str(payload.get("case_id") or "").strip()
+    utterance = str(payload.get("utterance") or "").strip()
+
+    if not case_id or not utterance:
+        return JsonResponse(
+            {"detail": "Both 'case_id' and 'utterance' are required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    session_id = _get_session_id_from_payload(payload)
+
+    session = await _aload_session(session_id, case_id, request.user.pk)
+    if session.unavailable:
+        return JsonResponse(
+            {"detail": SESSION_UNAVAILABLE}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    if not session.owned_by(request.user.pk):
+        return JsonResponse({"detail": SESSION_FORBIDDEN}, status=status.HTTP_403_FORBIDDEN)
+    case_primer = session.apply_to_primer(await sync_to_async(build_case_primer)(case_id))
+    available_resources: List[str] = list(case_primer.get("available_resources", []))
+
+    conversation_history: List[Dict[str, str]] = session.conversation_history()
+
+    try:
+        sim_result = await aget_sim_ai_response(
+            doctor_utterance=utterance,
+            case_context=case_primer,
+            available_resources=available_resources,
+            conversation_history=conversation_history,
+            use_cache=_use_response_cache(payload),
+            cohort=_prompt_cohort(payload),
+        )
+    except Exception as exc:  # pragma: no cover - network dependent
+        logger.exception("Simulation GPT call failed")
+        return JsonResponse(
+            {"detail": f"Simulation error: {exc}"},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
+
+    sim_result = _checked_state_changes(case_id, case_primer, sim_result)
+    await _arecord_turn(session, case_id, utterance, sim_result, case_primer)
+    return JsonResponse(
+        _sim_response_payload(session_id, case_id, sim_result, session, _client_ack(payload))
+    )
+
+
+@async_api_view(["POST"])
+async def async_sim_respond_stream_view(request: HttpRequest) -> HttpResponseBase:
+    """POST /api/sim/respond/stream/ (alias: /api/sim/async/respond/stream/)
+
+    Same input as /api/sim/respond/, but replies with server-sent events:
+
+      event: meta                   {"session_id", "case_id"}
+      event: speech                 {"delta": "next slice of speech_output"}
+      event: action_triggers        {"action_triggers": [...]}
+      event: update_vitals          {"update_vitals": {...} | null}
+      event: advance_patient_state  {"advance_patient_state": "..." | null}
+      event: done                   same body as /api/sim/respond/
+      event: error                  {"detail": "..."}
+
+    An async generator, so each event is flushed as soon as it is yielded.
+    """
+
+    payload = request.data
+    case_id = str(payload.get("case_id") or "").strip()
+    utterance = str(payload.get("utterance") or "").strip()
+
+    if not case_id or not utterance:
+        return JsonResponse(
+            {"detail": "Both 'case_id' and 'utterance' are required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    session_id = _get_session_id_from_payload(payload)
+
+    session = await _aload_session(session_id, case_id, request.user.pk)
+    if session.unavailable:
+        return JsonResponse(
+            {"detail": SESSION_UNAVAILABLE}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    if not session.owned_by(request.user.pk):
+        return JsonResponse({"detail": SESSION_FORBIDDEN}, status=status.HTTP_403_FORBIDDEN)
+    case_primer = session.apply_to_primer(await sync_to_async(build_case_primer)(case_id))
+    available_resources: List[str] = list(case_primer.get("available_resources", []))
+
+    conversation_history: List[Dict[str, str]] = session.conversation_history()
+
+    async def event_stream() -> AsyncIterator[str]:
+        yield format_sse("meta", {"session_id": session_id, "case_id": case_id})
+        try:
+            async for event, value in astream_sim_ai_response(
+                doctor_utterance=utterance,
+                case_context=case_primer,
+                available_resources=available_resources,
+                conversation_history=conversation_history,
+                use_cache=_use_response_cache(payload),
+                cohort=_prompt_cohort(payload),
+            ):
+                if event == "speech":
+                    yield format_sse("speech", {"delta": value})
+                elif event == "done":
+                    value = _checked_state_changes(case_id, case_primer, value)
+                    await _arecord_turn(session, case_id, utterance, value, case_primer)
+                    yield format_sse(
+                        "done",
+                        _sim_response_payload(
+                            session_id, case_id, value, session, _client_ack(payload)
+                        ),
+                    )
+                else:
+                    value = _checked_state_changes(case_id, case_primer, {event: value})[event]
+                    yield format_sse(event, {event: value})
+        except Exception as exc:  # pragma: no cover - network dependent
+            logger.exception("Simulation GPT stream failed")
+            yield format_sse("error", {"detail": f"Simulation error: {exc}"})
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@async_api_view(["GET"])
+async def async_vitals_stream_view(request: HttpRequest) -> HttpResponseBase:
+    """GET /api/sim/vitals/stream/?session_id=...[&interval=1]
+
+    SSE stream of `vitals` monitor frames, one per frame interval, computed
+    server-side from the session's vitals state; no GPT round-trip. State
+    changes made by a turn show up on the next frame.
+    """
+
+    session_id = str(request.GET.get("session_id") or "").strip()
+    if not session_id:
+        return JsonResponse(
+            {"detail": "'session_id' query param is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        interval = float(request.GET["interval"]) if request.GET.get("interval") else None
+    except ValueError:
+        return JsonResponse(
+            {"detail": "'interval' must be a number of seconds."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    user_id = request.user.pk
+    session = await _aload_monitor_state(session_id)
+    if session.unavailable:
+        return JsonResponse(
+            {"detail": SESSION_UNAVAILABLE}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    if not session.owned_by(user_id):
+        return JsonResponse({"detail": SESSION_FORBIDDEN}, status=status.HTTP_403_FORBIDDEN)
+
+    min_interval = float(getattr(settings, "SIM_VITALS_MIN_FRAME_SECONDS", 0.25))
+    max_seconds = float(getattr(settings, "SIM_VITALS_STREAM_MAX_SECONDS", 900))
+
+    async def event_stream() -> AsyncIterator[str]:
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            # One HMGET per frame; the primer and trajectory come from the
+            # per-worker caches.
+            session = await _aload_monitor_state(session_id)
+            if session.unavailable:
+                # Redis blip: skip this frame rather than end the stream.
+                await asyncio.sleep(1.0)
+                continue
+            if not session.owned_by(user_id):
+                # Claimed by someone else since the stream started.
+                yield format_sse("error", {"detail": SESSION_FORBIDDEN})
+                return
+            frame = await sync_to_async(monitor_frame)(session)
+            if frame is None:
+                yield format_sse("waiting", {"session_id": session_id})
+                delay = 1.0
+            else:
+                yield format_sse("vitals", frame)
+                delay = frame["frame_seconds"]
+            if interval is not None:
+                delay = interval
+            await asyncio.sleep(min(60.0, max(min_interval, delay)))
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
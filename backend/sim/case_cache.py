@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Iterable, Optional, Tuple, TypeVar
+
+import redis
+from django.conf import settings
+
+from sim.state_store import get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+# Hash of {case_id: version}, bumped per case whenever an import writes it.
+CASE_VERSIONS_KEY = "sim:cases:versions"
+# Single counter bumped on every import write, so workers only need one cheap
+# GET to learn whether any case changed since they last looked.
+CASE_GENERATION_KEY = "sim:cases:generation"
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def bump_case_versions(case_ids: Iterable[str]) -> int:
+    """Bump the version stamp of every case in `case_ids`.
+
+    Called by the import commands after they write cases so that every
+    worker drops its compiled data for those cases on the next lookup.
+    Returns the new generation number (0 if there was nothing to bump).
+    """
+
+    ids = sorted({str(cid) for cid in case_ids if cid})
+    if not ids:
+        return 0
+
+    client = get_redis_client()
+    pipe = client.pipeline(transaction=True)
+    for case_id in ids:
+        pipe.hincrby(CASE_VERSIONS_KEY, case_id, 1)
+    pipe.incr(CASE_GENERATION_KEY)
+    results = pipe.execute()
+    return int(results[-1])
+
+
+class CaseVersionWatcher:
+    """Per-process view of the case version stamps stored in Redis.
+
+    The generation counter is polled at most once every `check_interval`
+    seconds; the full version hash is only fetched when it moved. If Redis
+    is unreachable the last known snapshot is kept and the check is retried
+    on the next lookup.
+    """
+
+    def __init__(self, check_interval: float) -> None:
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._versions: Dict[str, int] = {}
+        self._checked_at = 0.0
+
+    def version_for(self, case_id: str) -> int:
+        self._refresh()
+        return self._versions.get(case_id, 0)
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            try:
+                client = get_redis_client()
+                generation = int(client.get(CASE_GENERATION_KEY) or 0)
+                if generation != self._generation:
+                    raw = client.hgetall(CASE_VERSIONS_KEY)
+                    self._versions = {
+                        key.decode() if isinstance(key, bytes) else str(key): int(value)
+                        for key, value in raw.items()
+                    }
+                    self._generation = generation
+            except redis.RedisError:
+                # Keep the last known versions until the next check instead of
+                # paying a connect timeout on every lookup during an outage.
+                logger.warning("Could not read case version stamps from Redis", exc_info=True)
+            self._checked_at = now
+
+
+class VersionedLRUCache(Generic[K, V]):
+    """Bounded, thread-safe LRU whose entries are tagged with a version.
+
+    An entry is only returned while its stored version matches the version
+    the caller expects; otherwise it is rebuilt with `loader`.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[K, Tuple[int, V]]" = OrderedDict()
+
+    def get_or_load(self, key: K, version: int, loader: Callable[[], V]) -> V:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == version:
+                self._data.move_to_end(key)
+                return entry[1]
+
+        value = loader()
+
+        with self._lock:
+            self._data[key] = (version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+case_versions = CaseVersionWatcher(
+    check_interval=getattr(settings, "SIM_CASE_VERSION_CHECK_SECONDS", 2.0),
+)
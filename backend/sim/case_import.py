@@ -0,0 +1,204 @@
+"""Batched upsert of imported cases and their resources.
+
+The import commands parse sheet rows into `CaseRow`s and hand them to
+`import_case_rows`, which writes them in batches of SIM_IMPORT_BATCH_SIZE
+inside a single transaction. Each batch costs a fixed number of queries
+regardless of its size:
+
+1. load the stored `content_hash` of the batch's cases;
+2. upsert the new and changed cases (`bulk_create(update_conflicts=True)`);
+3. rebuild the normalized tables of the written cases (`sim.case_schema`);
+4. load the case pks and existing resources of the batch;
+5. `bulk_create` new resources and `bulk_update` changed ones.
+
+A case whose row hashes to the stored `content_hash` is not written at all,
+so re-importing an unchanged sheet is a read-only no-op.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from sim.case_schema import normalize_cases
+from sim.models import SimCase, SimResource
+
+
+# SimCase fields written from a row (besides case_id and content_hash).
+CASE_FIELDS = ("spark_title", "reveal_title", "series_name", "difficulty_level", "raw_row")
+
+
+class CaseRow(NamedTuple):
+    case_id: str
+    fields: Dict[str, Any]
+    # (resource_id, original_url, resource_type); None leaves resources alone.
+    resources: Optional[List[Tuple[str, str, str]]] = None
+
+
+class ImportResult:
+    def __init__(self) -> None:
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.resources_created = 0
+        self.resources_updated = 0
+        self.case_ids: List[str] = []  # every case seen, in input order
+        self.changed_case_ids: Set[str] = set()  # cases or resources written
+
+
+def content_hash(fields: Dict[str, Any]) -> str:
+    """Stable hash of a case's imported fields (key order does not matter).
+
+    >>> content_hash({"a": 1, "b": [2]}) == content_hash({"b": [2], "a": 1})
+    True
+    """
+
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _batches(rows: Iterable[CaseRow], size: int) -> Iterator[List[CaseRow]]:
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_case_rows(
+    rows: Iterable[CaseRow],
+    batch_size: Optional[int] = None,
+    force: bool = False,
+) -> ImportResult:
+    """Upsert `rows` (consumed lazily) in one transaction; see module docstring.
+
+    With `force`, cases are rewritten even when their content hash matches.
+    A case_id repeated in the input keeps its last row.
+    """
+
+    size = max(1, batch_size or int(getattr(settings, "SIM_IMPORT_BATCH_SIZE", 500)))
+    result = ImportResult()
+    seen: Set[str] = set()
+
+    with transaction.atomic():
+        for batch in _batches(rows, size):
+            deduped: Dict[str, CaseRow] = {}
+            for row in batch:
+                deduped[row.case_id] = row
+            for case_id in deduped:
+                if case_id not in seen:
+                    seen.add(case_id)
+                    result.case_ids.append(case_id)
+            _import_batch(list(deduped.values()), size, force, result)
+
+    return result
+
+
+def _import_batch(batch: List[CaseRow], size: int, force: bool, result: ImportResult) -> None:
+    ids = [row.case_id for row in batch]
+    stored = {
+        case_id: (digest, archived)
+        for case_id, digest, archived in SimCase.objects.filter(case_id__in=ids).values_list(
+            "case_id", "content_hash", "is_archived"
+        )
+    }
+
+    upserts: List[SimCase] = []
+    for row in batch:
+        digest = content_hash(row.fields)
+        # An archived case whose row is back is rewritten to unarchive it.
+        if not force and stored.get(row.case_id) == (digest, False):
+            result.unchanged += 1
+            continue
+        if row.case_id in stored:
+            result.updated += 1
+        else:
+            result.created += 1
+        result.changed_case_ids.add(row.case_id)
+        upserts.append(SimCase(case_id=row.case_id, content_hash=digest, **row.fields))
+
+    if upserts:
+        SimCase.objects.bulk_create(
+            upserts,
+            batch_size=size,
+            update_conflicts=True,
+            unique_fields=["case_id"],
+            update_fields=[*CASE_FIELDS, "content_hash", "is_archived", "updated_at"],
+        )
+        # Upserted objects only get a pk on some backends; look them up.
+        case_pks = dict(
+            SimCase.objects.filter(case_id__in=[case.case_id for case in upserts]).values_list(
+                "case_id", "pk"
+            )
+        )
+        normalize_cases(
+            ((case_pks[case.case_id], case.raw_row) for case in upserts), batch_size=size
+        )
+
+    with_resources = [row for row in batch if row.resources is not None]
+    if with_resources:
+        _import_resources(with_resources, size, result)
+
+
+def _import_resources(batch: List[CaseRow], size: int, result: ImportResult) -> None:
+    case_pks = dict(
+        SimCase.objects.filter(case_id__in=[row.case_id for row in batch]).values_list(
+            "case_id", "pk"
+        )
+    )
+    existing: Dict[Tuple[int, str], SimResource] = {
+        (res.case_id, res.resource_id): res
+        for res in SimResource.objects.filter(case_id__in=case_pks.values()).only(
+            "pk", "case_id", "resource_id", "original_url", "resource_type", "s3_key", "is_synced"
+        )
+    }
+
+    now = timezone.now()
+    to_create: List[SimResource] = []
+    to_update: List[SimResource] = []
+    for row in batch:
+        case_pk = case_pks[row.case_id]
+        # Two URLs can map to the same resource_id; the last one wins.
+        wanted = {resource_id: (url, rtype) for resource_id, url, rtype in row.resources or []}
+        for resource_id, (url, resource_type) in wanted.items():
+            current = existing.get((case_pk, resource_id))
+            if current is None:
+                to_create.append(
+                    SimResource(
+                        case_id=case_pk,
+                        resource_id=resource_id,
+                        original_url=url,
+                        resource_type=resource_type,
+                    )
+                )
+                result.changed_case_ids.add(row.case_id)
+                continue
+            if current.original_url == url and current.resource_type == resource_type:
+                continue
+            if current.original_url != url:
+                # A new source file: the mirrored copy is stale until re-synced.
+                current.s3_key = ""
+                current.is_synced = False
+            current.original_url = url
+            current.resource_type = resource_type
+            current.updated_at = now
+            to_update.append(current)
+            result.changed_case_ids.add(row.case_id)
+
+    if to_create:
+        SimResource.objects.bulk_create(to_create, batch_size=size)
+        result.resources_created += len(to_create)
+    if to_update:
+        SimResource.objects.bulk_update(
+            to_update,
+            ["original_url", "resource_type", "s3_key", "is_synced", "updated_at"],
+            batch_size=size,
+        )
+        result.resources_updated += len(to_update)
@@ -0,0 +1,162 @@
+"""Read side of the case library: `/api/sim/cases/`.
+
+Listing is keyset-paginated on `case_id` (the table's ordering and a unique
+index), so page 100 costs the same as page 1 and concurrent imports never
+shift rows between pages. Each page is a single query returning a compact
+projection, never `raw_row`.
+
+Search uses Postgres full-text search: `SimCase.search_vector` holds the
+titles (weight A) and the patient's presenting complaint and diagnosis
+(weight B, from `SimCasePatient`), is rebuilt by the importer whenever a case
+is written, and has a GIN index. On other databases (local SQLite) search
+falls back to case-insensitive substring matching over the same fields.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connection
+from django.db.models import F, OuterRef, Q, QuerySet, Subquery
+
+from sim.models import SimCase, SimCasePatient
+
+
+SEARCH_CONFIG = "english"
+
+# Fields returned per case (flat `values()` rows, no model instances).
+LIST_FIELDS = {
+    "case_id": "case_id",
+    "spark_title": "spark_title",
+    "reveal_title": "reveal_title",
+    "series_name": "series_name",
+    "difficulty_level": "difficulty_level",
+    "chief_complaint": "patient__chief_complaint",
+    "age_years": "patient__age_years",
+    "sex": "patient__sex",
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CasePage(NamedTuple):
+    results: List[Dict[str, Any]]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(case_id: str) -> str:
+    """Opaque cursor pointing after `case_id`.
+
+    >>> decode_cursor(encode_cursor("ER-001"))
+    'ER-001'
+    >>> decode_cursor("@@@")
+    Traceback (most recent call last):
+    ...
+    sim.case_library.InvalidCursor: @@@
+    """
+
+    return base64.urlsafe_b64encode(case_id.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded.encode("ascii"), altchars=b"-_", validate=True).decode(
+            "utf-8"
+        )
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def _uses_full_text() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def update_search_vectors(case_pks: Sequence[int]) -> None:
+    """Rebuild `search_vector` for these cases in one UPDATE (Postgres only).
+
+    Call after their `SimCasePatient` rows are written.
+    """
+
+    if not case_pks or not _uses_full_text():
+        return
+
+    patient = SimCasePatient.objects.filter(case=OuterRef("pk"))
+
+    def patient_field(name: str) -> Subquery:
+        return Subquery(patient.values(name)[:1])  # SearchVector coalesces NULLs
+
+    SimCase.objects.filter(pk__in=list(case_pks)).update(
+        search_vector=(
+            SearchVector("spark_title", "reveal_title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector(
+                patient_field("chief_complaint"),
+                patient_field("chief_diagnosis"),
+                weight="B",
+                config=SEARCH_CONFIG,
+            )
+        )
+    )
+
+
+def _search(qs: QuerySet, text: str) -> QuerySet:
+    if _uses_full_text():
+        query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+        return qs.filter(search_vector=query)
+
+    match = Q()
+    for field in (
+        "spark_title",
+        "reveal_title",
+        "patient__chief_complaint",
+        "patient__chief_diagnosis",
+    ):
+        match |= Q(**{f"{field}__icontains": text})
+    return qs.filter(match)
+
+
+def list_cases(
+    search: str = "",
+    series: Sequence[str] = (),
+    difficulty: Sequence[str] = (),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    include_archived: bool = False,
+) -> CasePage:
+    """One page of cases ordered by case_id. Raises InvalidCursor."""
+
+    default_limit = int(getattr(settings, "SIM_CASE_LIBRARY_PAGE_SIZE", 50))
+    max_limit = int(getattr(settings, "SIM_CASE_LIBRARY_MAX_PAGE_SIZE", 200))
+    limit = max(1, min(limit or default_limit, max_limit))
+
+    qs = SimCase.objects.all()
+    if not include_archived:
+        qs = qs.filter(is_archived=False)
+    if series:
+        qs = qs.filter(series_name__in=list(series))
+    if difficulty:
+        qs = qs.filter(difficulty_level__in=list(difficulty))
+    if search:
+        qs = _search(qs, search)
+    if cursor:
+        qs = qs.filter(case_id__gt=decode_cursor(cursor))
+
+    # One extra row tells whether there is a next page without a COUNT(*).
+    rows = list(
+        qs.order_by("case_id").values(
+            *(name for name, path in LIST_FIELDS.items() if name == path),
+            **{name: F(path) for name, path in LIST_FIELDS.items() if name != path},
+        )[: limit + 1]
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["case_id"])
+    return CasePage(rows, next_cursor)
@@ -0,0 +1,171 @@
+"""Materialize the normalized case tables from `SimCase.raw_row`.
+
+raw_row keeps every sheet column under its header name, which is fine for
+building a primer but means any filter has to decode JSON for every case.
+`normalize_cases` derives, per case:
+
+- `SimCasePatient`: demographics (age, sex, complaint, diagnosis, ...);
+- `SimVitalsState`: one row per roadmap vitals state, with the common
+  numeric vitals as columns;
+- `SimLearningObjective`: the CME learning objectives, one per line.
+
+(Media already has its own table, `SimResource`.) Rows are rebuilt from
+scratch for each case: one delete and one bulk insert per table per batch,
+plus one UPDATE of the cases' full-text `search_vector` (sim.case_library).
+The importer calls this for every case it writes, so the tables follow
+raw_row; `manage.py normalize_cases` backfills existing databases.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+
+from sim.case_library import update_search_vectors
+from sim.cases import PATIENT_COLUMNS, build_state_roadmap, patient_from_row
+from sim.models import SimCasePatient, SimLearningObjective, SimVitalsState
+
+
+DIAGNOSIS_COLUMN = "Case_Orientation_Chief_Diagnosis"
+CATEGORY_COLUMN = "Case_Organization_Category_System"
+OBJECTIVES_COLUMN = "CME_and_Educational_Content_CME_Learning_Objective"
+
+# SimVitalsState column -> key in the authored vitals JSON.
+VITALS_KEYS = {
+    "heart_rate": "HR",
+    "respiratory_rate": "RR",
+    "temperature": "Temp",
+    "spo2": "SpO2",
+}
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def parse_number(value: Any) -> Optional[float]:
+    """Return the first number in `value`, if any.
+
+    >>> parse_number("38.9 C"), parse_number(118), parse_number("n/a")
+    (38.9, 118.0, None)
+    """
+
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    return float(match.group()) if match else None
+
+
+def parse_age_years(value: Any) -> Optional[int]:
+    """Whole years from a sheet age; infants ("6 months") count as 0.
+
+    >>> parse_age_years("67"), parse_age_years("6 months"), parse_age_years("")
+    (67, 0, None)
+    """
+
+    years = parse_number(value)
+    if years is None or years < 0:
+        return None
+    if re.search(r"month|week|day", str(value), re.IGNORECASE):
+        return 0
+    return min(int(years), 32767)
+
+
+def parse_blood_pressure(value: Any) -> Tuple[Optional[float], Optional[float]]:
+    """Split "92/58" into (systolic, diastolic).
+
+    >>> parse_blood_pressure("92/58"), parse_blood_pressure(None)
+    ((92.0, 58.0), (None, None))
+    """
+
+    if value is None:
+        return None, None
+    systolic, _, diastolic = str(value).partition("/")
+    return parse_number(systolic), parse_number(diastolic)
+
+
+def learning_objectives(value: Any) -> List[str]:
+    """Split the objectives cell into one objective per line, bullets dropped.
+
+    >>> learning_objectives("1. Recognize sepsis\\n- Start fluids early\\n\\n")
+    ['Recognize sepsis', 'Start fluids early']
+    """
+
+    if not value:
+        return []
+    lines = (_BULLET.sub("", line).strip() for line in str(value).splitlines())
+    return [line for line in lines if line]
+
+
+def _text(value: Any, max_length: Optional[int] = None) -> str:
+    text = "" if value is None else str(value).strip()
+    return text[:max_length] if max_length else text
+
+
+def _patient(case_pk: int, raw_row: Dict[str, Any]) -> SimCasePatient:
+    fields = patient_from_row(raw_row)
+    return SimCasePatient(
+        case_id=case_pk,
+        age_text=_text(fields["age"], 64),
+        age_years=parse_age_years(fields["age"]),
+        sex=_text(fields["sex"], 32),
+        chief_complaint=_text(fields["chief_complaint"], 255),
+        chief_diagnosis=_text(raw_row.get(DIAGNOSIS_COLUMN), 255),
+        medical_category=_text(raw_row.get(CATEGORY_COLUMN), 128),
+        **{
+            field: _text(fields[field])
+            for field in PATIENT_COLUMNS
+            if field not in ("age", "sex", "chief_complaint")
+        },
+    )
+
+
+def _vitals_states(case_pk: int, raw_row: Dict[str, Any]) -> List[SimVitalsState]:
+    states = []
+    for position, state in enumerate(build_state_roadmap(raw_row)["states"]):
+        vitals = state["vitals"] if isinstance(state["vitals"], dict) else {}
+        systolic, diastolic = parse_blood_pressure(vitals.get("BP"))
+        states.append(
+            SimVitalsState(
+                case_id=case_pk,
+                state_id=state["id"],
+                position=position,
+                vitals=state["vitals"],
+                systolic_bp=systolic,
+                diastolic_bp=diastolic,
+                **{field: parse_number(vitals.get(key)) for field, key in VITALS_KEYS.items()},
+            )
+        )
+    return states
+
+
+def normalize_cases(cases: Iterable[Tuple[int, Dict[str, Any]]], batch_size: int = 500) -> int:
+    """Rebuild the normalized rows of `(case_pk, raw_row)` pairs; returns the count."""
+
+    pks: List[int] = []
+    patients: List[SimCasePatient] = []
+    states: List[SimVitalsState] = []
+    objectives: List[SimLearningObjective] = []
+    for case_pk, raw_row in cases:
+        raw_row = raw_row or {}
+        pks.append(case_pk)
+        patients.append(_patient(case_pk, raw_row))
+        states.extend(_vitals_states(case_pk, raw_row))
+        objectives.extend(
+            SimLearningObjective(case_id=case_pk, position=position, text=text)
+            for position, text in enumerate(learning_objectives(raw_row.get(OBJECTIVES_COLUMN)))
+        )
+    if not pks:
+        return 0
+
+    with transaction.atomic():
+        for model in (SimCasePatient, SimVitalsState, SimLearningObjective):
+            model.objects.filter(case_id__in=pks).delete()
+        SimCasePatient.objects.bulk_create(patients, batch_size=batch_size)
+        SimVitalsState.objects.bulk_create(states, batch_size=batch_size)
+        SimLearningObjective.objects.bulk_create(objectives, batch_size=batch_size)
+        update_search_vectors(pks)
+    return len(pks)
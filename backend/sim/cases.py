@@ -1,9 +1,67 @@
 from __future__ import annotations
 
 import json
+import re
 from typing import Any, Dict, List
 
+from django.conf import settings
+
+from sim.case_cache import VersionedLRUCache, case_versions
 from sim.models import SimCase
+from sim.resources import case_resources
+
+
+# Compiled primers, one per case, shared by every request in this worker.
+_primer_cache: VersionedLRUCache[str, Dict[str, Any]] = VersionedLRUCache(
+    maxsize=getattr(settings, "SIM_PRIMER_CACHE_SIZE", 512),
+)
+
+
+# Scripted lines the patient / nurse speak verbatim (RN_Script, Patient_Script).
+SCRIPT_COLUMN_PATTERN = re.compile(r"^Staff_and_AI_Interaction_Config_\w*Script\w*$")
+_SPEAKER_LABEL = re.compile(r"^[A-Z][A-Za-z ]{0,19}:\s+")
+_QUOTES = "\"'“”‘’"
+
+
+def case_script_lines(raw_row: Dict[str, Any]) -> List[str]:
+    """Return the distinct scripted lines of a case, as they would be spoken.
+
+    Each non-empty line of a *Script* cell is one utterance; speaker labels
+    ("RN: ") and wrapping quotes are dropped.
+
+    >>> case_script_lines({
+    ...     "Staff_and_AI_Interaction_Config_RN_Script": "RN: 'He is getting worse, doctor.'",
+    ...     "Staff_and_AI_Interaction_Config_Patient_Script": "I feel hot... and dizzy.'\\n\\n",
+    ...     "Case_Orientation_Chief_Diagnosis": "Sepsis",
+    ... })
+    ['He is getting worse, doctor.', 'I feel hot... and dizzy.']
+    """
+
+    lines: List[str] = []
+    for column, value in raw_row.items():
+        if not SCRIPT_COLUMN_PATTERN.match(column) or not value:
+            continue
+        for line in str(value).splitlines():
+            line = _SPEAKER_LABEL.sub("", line.strip()).strip(_QUOTES).strip()
+            if line and line not in lines:
+                lines.append(line)
+    return lines
+
+
+# Primer patient fields -> sheet columns (also used for SimCasePatient).
+PATIENT_COLUMNS = {
+    "age": "Patient_Demographics_and_Clinical_Data_Age",
+    "sex": "Patient_Demographics_and_Clinical_Data_Gender",
+    "chief_complaint": "Patient_Demographics_and_Clinical_Data_Presenting_Complaint",
+    "past_medical_history": "Patient_Demographics_and_Clinical_Data_Past_Medical_History",
+    "current_medications": "Patient_Demographics_and_Clinical_Data_Current_Medications",
+    "allergies": "Patient_Demographics_and_Clinical_Data_Allergies",
+    "social_history": "Patient_Demographics_and_Clinical_Data_Social_History",
+}
+
+
+def patient_from_row(raw_row: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: raw_row.get(column) for field, column in PATIENT_COLUMNS.items()}
 
 
 def _parse_vitals_json(raw: str | Dict[str, Any] | None) -> Dict[str, Any] | None:
@@ -17,7 +75,7 @@ def _parse_vitals_json(raw: str | Dict[str, Any] | None) -> Dict[str, Any] | Non
         return None
 
 
-def _build_state_roadmap(raw_row: Dict[str, Any]) -> Dict[str, Any]:
+def build_state_roadmap(raw_row: Dict[str, Any]) -> Dict[str, Any]:
     """Build a compact vitals roadmap from the SimCase raw_row.
 
     Uses the existing Monitor_Vital_Signs_* columns as the source of truth.
@@ -62,14 +120,43 @@ def _build_state_roadmap(raw_row: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+def _freeze(value: Any) -> Any:
+    """Turn lists into tuples (recursively) so compiled primers can be shared."""
+
+    if isinstance(value, dict):
+        return {k: _freeze(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
 def build_case_primer(case_id: str) -> Dict[str, Any]:
-    """Return patient + stage + available_resources + vitals roadmap for this case."""
+    """Return patient + stage + available_resources + vitals roadmap for this case.
+
+    Primers are compiled once per case version and kept in a per-worker LRU,
+    so repeated turns skip both the DB query and the vitals JSON parsing.
+    The returned dict is a fresh top-level copy, but nested values are shared
+    between callers and must be treated as read-only.
+    """
+
+    version = case_versions.version_for(case_id)
+    compiled = _primer_cache.get_or_load(
+        case_id, version, lambda: _freeze(_compile_case_primer(case_id))
+    )
+    return dict(compiled)
 
+
+def _compile_case_primer(case_id: str) -> Dict[str, Any]:
     try:
-        sim_case = SimCase.objects.get(case_id=case_id)
-        raw = sim_case.raw_row or {}
+        # Archived cases (pruned from their sheet) are treated as missing.
+        raw = (
+            SimCase.objects.values_list("raw_row", flat=True).get(
+                case_id=case_id, is_archived=False
+            )
+            or {}
+        )
     except SimCase.DoesNotExist:
-        # Fallback stub if case is not yet imported
+        # Fallback stub if case is not yet imported (or archived)
         patient = {
             "age": 67,
             "sex": "male",
@@ -80,7 +167,7 @@ def build_case_primer(case_id: str) -> Dict[str, Any]:
                 "Former smoker",
             ],
         }
-        available_resources: List[str] = ["chest_xray", "ekg", "basic_labs"]
+        available_resources: List[str] = sorted(case_resources(case_id))
         return {
             "case_id": case_id,
             "patient": patient,
@@ -92,28 +179,12 @@ def build_case_primer(case_id: str) -> Dict[str, Any]:
             },
         }
 
-    patient = {
-        "age": raw.get("Patient_Demographics_and_Clinical_Data_Age"),
-        "sex": raw.get("Patient_Demographics_and_Clinical_Data_Gender"),
-        "chief_complaint": raw.get(
-            "Patient_Demographics_and_Clinical_Data_Presenting_Complaint"
-        ),
-        "past_medical_history": raw.get(
-            "Patient_Demographics_and_Clinical_Data_Past_Medical_History"
-        ),
-        "current_medications": raw.get(
-            "Patient_Demographics_and_Clinical_Data_Current_Medications"
-        ),
-        "allergies": raw.get("Patient_Demographics_and_Clinical_Data_Allergies"),
-        "social_history": raw.get(
-            "Patient_Demographics_and_Clinical_Data_Social_History"
-        ),
-    }
+    patient = patient_from_row(raw)
 
-    # For now, available_resources can be refined later to reflect actual SimResource IDs.
-    available_resources: List[str] = []
+    # Synced SimResource IDs; the same index trigger-resource serves from.
+    available_resources: List[str] = sorted(case_resources(case_id))
 
-    state_roadmap = _build_state_roadmap(raw)
+    state_roadmap = build_state_roadmap(raw)
 
     return {
         "case_id": case_id,
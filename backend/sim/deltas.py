@@ -0,0 +1,228 @@
+"""Compact encodings for sim payloads: state deltas and binary vitals frames.
+
+Turn replies (opt-in, see `/api/sim/respond/`'s `ack`)
+------------------------------------------------------
+The slowly-changing part of a turn reply is folded into a per-session
+*client state*:
+
+    {"stage": ..., "vitals": {"state_id", "qualitative_change", "reason"},
+     "ui": {...every ui_updates key seen so far...}}
+
+stored with a version number in the session hash (`client_state`,
+`client_version`; written by `record_turn`). A client that sends back the
+version it last applied as `ack` gets a JSON merge patch (RFC 7386) against
+that version instead of the full objects; any other `ack` (e.g. after a
+reconnect) gets the full state again.
+
+Vitals frames (WebSocket `?encoding=binary`)
+--------------------------------------------
+A fixed little-endian layout, `FRAME_FORMAT` (42 bytes instead of ~300 of
+JSON):
+
+    B   format version (FRAME_VERSION)
+    B   flags (bit 0: transition in progress)
+    I   frame sequence number
+    d   unix time, seconds
+    H   state index into the `schema` message's `state_ids`
+    H   transition progress x 10000
+    6h  values x VALUE_SCALE, in `sim.vitals.CHANNELS` order
+    6h  per-frame deltas x DELTA_SCALE
+
+Channels without a value carry MISSING (-32768).
+"""
+
+from __future__ import annotations
+
+import math
+import struct
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from sim.vitals import CHANNELS
+
+
+FRAME_VERSION = 1
+FRAME_FORMAT = "<BBIdHH6h6h"
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+VALUE_SCALE = 10
+DELTA_SCALE = 100
+MISSING = -32768
+
+_INT16_MAX = 32767
+
+
+# -- client state and merge patches ------------------------------------------
+
+
+INITIAL_CLIENT_STATE: Dict[str, Any] = {"stage": None, "vitals": None, "ui": {}}
+
+
+def next_client_state(
+    previous: Optional[Dict[str, Any]], sim_result: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Client state after a (validated) turn.
+
+    >>> state = next_client_state(None, {"ui_updates": {"note": "Fluids started"}})
+    >>> state
+    {'stage': None, 'vitals': None, 'ui': {'note': 'Fluids started'}}
+    >>> next_client_state(state, {"advance_patient_state": "stage_2", "ui_updates": {}})["stage"]
+    'stage_2'
+    """
+
+    state = dict(previous or INITIAL_CLIENT_STATE)
+    if sim_result.get("advance_patient_state"):
+        state["stage"] = sim_result["advance_patient_state"]
+    update_vitals = sim_result.get("update_vitals")
+    if isinstance(update_vitals, dict) and update_vitals.get("next_state_id"):
+        state["vitals"] = {
+            "state_id": update_vitals["next_state_id"],
+            "qualitative_change": update_vitals.get("qualitative_change"),
+            "reason": update_vitals.get("reason"),
+        }
+    ui_updates = sim_result.get("ui_updates")
+    if isinstance(ui_updates, dict) and ui_updates:
+        state["ui"] = {**(state.get("ui") or {}), **ui_updates}
+    return state
+
+
+def merge_patch(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON merge patch (RFC 7386) turning `old` into `new`.
+
+    >>> merge_patch({"a": 1, "b": {"c": 2, "d": 3}, "e": 4}, {"a": 1, "b": {"c": 5, "d": 3}})
+    {'b': {'c': 5}, 'e': None}
+    """
+
+    patch: Dict[str, Any] = {}
+    for key in old.keys() - new.keys():
+        patch[key] = None
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = merge_patch(old[key], value)
+            if nested:
+                patch[key] = nested
+        elif old[key] != value:
+            patch[key] = value
+    return dict(sorted(patch.items()))
+
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """Reference client-side application of `merge_patch`.
+
+    >>> old = {"a": 1, "b": {"c": 2, "d": 3}, "e": 4}
+    >>> new = {"a": 1, "b": {"c": 5, "d": 3}}
+    >>> apply_merge_patch(old, merge_patch(old, new)) == new
+    True
+    """
+
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+# -- binary vitals frames ----------------------------------------------------
+
+
+def _scaled(value: Optional[float], scale: int) -> int:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return MISSING
+    return max(-_INT16_MAX, min(_INT16_MAX, round(value * scale)))
+
+
+def _unscaled(value: int, scale: int) -> Optional[float]:
+    return None if value == MISSING else value / scale
+
+
+Row = Tuple[Optional[float], ...]
+
+
+def frame_values(frame: Dict[str, Any]) -> Tuple[Row, Row]:
+    """(values, deltas) of a `sim.vitals.build_frame` frame, in CHANNELS order."""
+
+    vitals = dict(frame["vitals"])
+    systolic = diastolic = None
+    if vitals.get("bp"):
+        sbp, _, dbp = vitals["bp"].partition("/")
+        systolic, diastolic = float(sbp), float(dbp)
+    vitals.update(sbp=systolic, dbp=diastolic)
+    deltas = frame.get("deltas") or {}
+    return (
+        tuple(vitals.get(channel) for channel in CHANNELS),
+        tuple(deltas.get(channel) for channel in CHANNELS),
+    )
+
+
+def encode_frame(frame: Dict[str, Any], state_ids: Sequence[str], sequence: int) -> bytes:
+    """Pack a vitals frame into FRAME_SIZE bytes (see module docstring)."""
+
+    values, deltas = frame_values(frame)
+    try:
+        state_index = list(state_ids).index(frame["state_id"])
+    except ValueError:
+        state_index = 0xFFFF
+    progress = float(frame.get("progress", 1.0))
+    return struct.pack(
+        FRAME_FORMAT,
+        FRAME_VERSION,
+        1 if progress < 1.0 else 0,
+        sequence & 0xFFFFFFFF,
+        float(frame.get("at", 0.0)),
+        state_index,
+        round(progress * 10000),
+        *(_scaled(v, VALUE_SCALE) for v in values),
+        *(_scaled(d, DELTA_SCALE) for d in deltas),
+    )
+
+
+def decode_frame(data: bytes, state_ids: Sequence[str]) -> Dict[str, Any]:
+    """Reference decoder for `encode_frame`.
+
+    >>> frame = {"state_id": "B", "vitals": {"hr": 120.0, "rr": None, "temp": 37.4,
+    ...          "spo2": 93.0, "bp": "105/70"}, "deltas": {"hr": 1.25}, "progress": 0.5,
+    ...          "at": 1700000000.25}
+    >>> packed = encode_frame(frame, ["A", "B"], sequence=7)
+    >>> len(packed) == FRAME_SIZE == 42
+    True
+    >>> decoded = decode_frame(packed, ["A", "B"])
+    >>> decoded["state_id"], decoded["sequence"], decoded["progress"], decoded["at"]
+    ('B', 7, 0.5, 1700000000.25)
+    >>> decoded["vitals"]
+    {'hr': 120.0, 'sbp': 105.0, 'dbp': 70.0, 'rr': None, 'temp': 37.4, 'spo2': 93.0}
+    >>> decoded["deltas"]["hr"]
+    1.25
+    """
+
+    fields = struct.unpack(FRAME_FORMAT, data)
+    version, flags, sequence, at, state_index, progress = fields[:6]
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported vitals frame version {version}")
+    values, deltas = fields[6:12], fields[12:18]
+    return {
+        "sequence": sequence,
+        "at": at,
+        "state_id": state_ids[state_index] if state_index < len(state_ids) else None,
+        "in_transition": bool(flags & 1),
+        "progress": progress / 10000,
+        "vitals": {c: _unscaled(v, VALUE_SCALE) for c, v in zip(CHANNELS, values)},
+        "deltas": {c: _unscaled(d, DELTA_SCALE) for c, d in zip(CHANNELS, deltas)},
+    }
+
+
+def frame_schema(state_ids: Sequence[str]) -> Dict[str, Any]:
+    """What a binary client needs to decode frames (sent once, as JSON)."""
+
+    return {
+        "version": FRAME_VERSION,
+        "format": FRAME_FORMAT,
+        "channels": list(CHANNELS),
+        "state_ids": list(state_ids),
+        "value_scale": VALUE_SCALE,
+        "delta_scale": DELTA_SCALE,
+        "missing": MISSING,
+    }
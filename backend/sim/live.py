@@ -0,0 +1,362 @@
+"""Live sim events over WebSocket, fanned out through Redis pub/sub.
+
+One WebSocket per learner and session:
+
+    ws(s)://<host>/ws/sim/sessions/<session_id>/?token=<supabase jwt>
+
+(the token may also come as an `Authorization: Bearer` header). Only the
+session's owner (see sim.session_state) may connect; anyone else is closed
+with 4403. The server
+pushes JSON text frames `{"type": ..., "data": ...}`:
+
+- `vitals`: a monitor frame (see sim.vitals), every frame interval and
+  right after each state change. With `?encoding=binary` frames are sent as
+  42-byte binary messages instead (layout in sim.deltas), announced by a
+  JSON `schema` event;
+- `state`: `update_vitals` applied by a turn (`from`, `to`, `reason`, ...);
+- `stage`: `advance_patient_state` applied by a turn;
+- `resource_ready`: a resource unlocked by a turn's `action_triggers`;
+- `hint`: a hint from the sim.
+
+Clients may send `{"type": "ping"}` and get `{"type": "pong"}` back.
+
+Any worker publishes to `sim:live:{session_id}` (a pub/sub channel, not a
+key); `record_turn` does it in the same pipeline that persists the turn.
+Each worker process holds a single Redis subscription (`LiveHub`) shared by
+all of its sockets, so connections scale with workers, not Redis
+connections.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import re
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
+
+import redis
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import exceptions
+
+from authbridge.authentication import SupabaseJWTAuthentication
+from sim.deltas import encode_frame, frame_schema
+from sim.state_store import claim_session, get_redis_client
+from sim.vitals import build_frame, session_trajectory
+
+
+logger = logging.getLogger(__name__)
+
+LIVE_CHANNEL_PREFIX = "sim:live:"
+
+SOCKET_PATH = re.compile(r"^/ws/sim/sessions/(?P<session_id>[^/]+)/?$")
+
+# WebSocket close codes (4000-4999 are application-defined).
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+CLOSE_INTERNAL_ERROR = 1011
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+def live_channel(session_id: str) -> str:
+    return f"{LIVE_CHANNEL_PREFIX}{session_id}"
+
+
+def encode_event(event: str, data: Dict[str, Any]) -> str:
+    return json.dumps({"type": event, "data": data}, ensure_ascii=False)
+
+
+def turn_events(sim_result: Dict[str, Any], previous_state_id: str) -> List[Event]:
+    """Live events announcing what a (validated) sim turn changed.
+
+    >>> events = turn_events({
+    ...     "update_vitals": {"next_state_id": "State1_Vitals", "reason": "Hypotension"},
+    ...     "action_triggers": [{"type": "resource_request", "resource": "ekg"}],
+    ...     "hint": None,
+    ... }, "Initial_Vitals")
+    >>> [name for name, _ in events]
+    ['state', 'resource_ready']
+    >>> events[0][1]["from"], events[0][1]["to"], events[1][1]
+    ('Initial_Vitals', 'State1_Vitals', {'resource_id': 'ekg'})
+    """
+
+    events: List[Event] = []
+    update_vitals = sim_result.get("update_vitals")
+    if isinstance(update_vitals, dict) and update_vitals.get("next_state_id"):
+        events.append(
+            (
+                "state",
+                {
+                    "from": previous_state_id,
+                    "to": str(update_vitals["next_state_id"]),
+                    "qualitative_change": update_vitals.get("qualitative_change"),
+                    "reason": update_vitals.get("reason"),
+                },
+            )
+        )
+    if sim_result.get("advance_patient_state"):
+        events.append(("stage", {"stage": str(sim_result["advance_patient_state"])}))
+    for trigger in sim_result.get("action_triggers") or []:
+        if isinstance(trigger, dict) and trigger.get("resource"):
+            events.append(("resource_ready", {"resource_id": str(trigger["resource"])}))
+    if sim_result.get("hint"):
+        events.append(("hint", {"hint": str(sim_result["hint"])}))
+    return events
+
+
+def publish_event(session_id: str, event: str, data: Dict[str, Any]) -> None:
+    """Publish one event to a session's sockets, on whichever worker they are."""
+
+    try:
+        get_redis_client().publish(live_channel(session_id), encode_event(event, data))
+    except redis.RedisError:
+        logger.warning("Could not publish %s to sim session %s", event, session_id, exc_info=True)
+
+
+class LiveHub:
+    """One Redis subscription per process, dispatching to local sockets."""
+
+    def __init__(self) -> None:
+        self._queues: Dict[str, Set[asyncio.Queue]] = {}
+        self._client: Optional[aioredis.Redis] = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, session_id: str) -> asyncio.Queue:
+        maxsize = int(getattr(settings, "SIM_LIVE_QUEUE_SIZE", 100))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        channel = live_channel(session_id)
+        async with self._lock:
+            if self._pubsub is None:
+                self._client = aioredis.from_url(settings.REDIS_URL)
+                self._pubsub = self._client.pubsub()
+            if session_id not in self._queues:
+                await self._pubsub.subscribe(channel)
+            self._queues.setdefault(session_id, set()).add(queue)
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+        return queue
+
+    async def unsubscribe(self, session_id: str, queue: asyncio.Queue) -> None:
+        async with self._lock:
+            queues = self._queues.get(session_id)
+            if queues is None:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._queues[session_id]
+                try:
+                    await self._pubsub.unsubscribe(live_channel(session_id))
+                except (redis.RedisError, OSError):
+                    logger.warning("Could not unsubscribe sim session %s", session_id)
+
+    async def _close(self) -> None:
+        # Idle: drop the connection, so the hub holds nothing bound to its loop.
+        pubsub, client = self._pubsub, self._client
+        self._pubsub = self._client = None
+        try:
+            await pubsub.aclose()
+            await client.aclose()
+        except (redis.RedisError, OSError):
+            logger.warning("Could not close the live pub/sub connection", exc_info=True)
+
+    async def _read(self) -> None:
+        while True:
+            # Checked under the lock `subscribe` holds while deciding whether
+            # to start a reader, so a socket that subscribes as the last one
+            # leaves never ends up without one.
+            async with self._lock:
+                if not self._queues:
+                    self._reader = None
+                    await self._close()
+                    return
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except (redis.RedisError, OSError):
+                # redis-py reconnects and resubscribes on the next call.
+                logger.warning("Live pub/sub connection lost; retrying", exc_info=True)
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            session_id = message["channel"].decode()[len(LIVE_CHANNEL_PREFIX) :]
+            for queue in list(self._queues.get(session_id, ())):
+                if queue.full():
+                    # A slow client loses its oldest event, not the newest.
+                    queue.get_nowait()
+                queue.put_nowait(message["data"].decode())
+
+
+# Hubs hold loop-bound connections: one per event loop, dropped with it.
+_hubs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LiveHub]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _hub() -> LiveHub:
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = LiveHub()
+    return hub
+
+
+def _query_param(scope: Dict[str, Any], name: str) -> str:
+    return (parse_qs(scope.get("query_string", b"").decode()).get(name) or [""])[0]
+
+
+def _socket_token(scope: Dict[str, Any]) -> str:
+    token = _query_param(scope, "token")
+    if token:
+        return token
+    for name, value in scope.get("headers") or []:
+        if name == b"authorization" and value.startswith(b"Bearer "):
+            return value[len(b"Bearer ") :].decode()
+    return ""
+
+
+class _TokenRequest:
+    """The bits of a request SupabaseJWTAuthentication reads."""
+
+    def __init__(self, token: str) -> None:
+        self.META = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+
+def _authenticate(token: str):
+    result = SupabaseJWTAuthentication().authenticate(_TokenRequest(token))
+    return result[0] if result else None
+
+
+async def websocket_application(scope: Dict[str, Any], receive, send) -> None:
+    """ASGI app for `/ws/sim/sessions/<session_id>/` (see module docstring)."""
+
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+
+    match = SOCKET_PATH.match(scope.get("path", ""))
+    if match is None:
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+
+    token = _socket_token(scope)
+    user = None
+    if token:
+        try:
+            user = await sync_to_async(_authenticate)(token)
+        except exceptions.AuthenticationFailed:
+            user = None
+    if user is None:
+        await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+        return
+
+    session_id = match.group("session_id")
+    # Only the session's owner may listen; a socket opened before the first
+    # turn claims the session, like the first turn would.
+    try:
+        allowed = await sync_to_async(claim_session, thread_sensitive=False)(session_id, user.pk)
+    except redis.RedisError:
+        logger.warning("Could not check the owner of sim session %s", session_id, exc_info=True)
+        await send({"type": "websocket.close", "code": CLOSE_INTERNAL_ERROR})
+        return
+    if not allowed:
+        await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+        return
+
+    binary = _query_param(scope, "encoding") == "binary"
+    await send({"type": "websocket.accept"})
+    hub = _hub()
+    queue = await hub.subscribe(session_id)
+    pump = asyncio.create_task(_pump(session_id, queue, send, binary))
+    try:
+        await _listen(receive, send)
+    finally:
+        pump.cancel()
+        await asyncio.gather(pump, return_exceptions=True)
+        await hub.unsubscribe(session_id, queue)
+
+
+async def _listen(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        if message["type"] != "websocket.receive":
+            continue
+        try:
+            payload = json.loads(message.get("text") or "{}")
+        except ValueError:
+            continue
+        if isinstance(payload, dict) and payload.get("type") == "ping":
+            await send({"type": "websocket.send", "text": encode_event("pong", {})})
+
+
+def _session_frame(session: Any) -> Optional[Tuple[Dict[str, Any], Tuple[str, ...]]]:
+    found = session_trajectory(session)
+    if found is None:
+        return None
+    trajectory, state_id = found
+    frame = build_frame(trajectory, state_id, session.vitals_from, session.vitals_changed_at)
+    return (frame, trajectory.state_ids) if frame is not None else None
+
+
+async def _frame(session_id: str) -> Optional[Tuple[Dict[str, Any], Tuple[str, ...]]]:
+    # Imported here: sim.session_state publishes through this module.
+    from sim.session_state import load_monitor_state
+
+    session = await sync_to_async(load_monitor_state, thread_sensitive=False)(session_id)
+    return await sync_to_async(_session_frame)(session)
+
+
+async def _pump(session_id: str, queue: asyncio.Queue, send, binary: bool = False) -> None:
+    """Forward published events and emit vitals frames on schedule.
+
+    With `binary`, frames go out as `sim.deltas` binary messages, preceded by
+    a JSON `schema` event whenever the state list they index changes.
+    """
+
+    default_interval = float(getattr(settings, "SIM_VITALS_FRAME_SECONDS", 1.0))
+    min_interval = float(getattr(settings, "SIM_VITALS_MIN_FRAME_SECONDS", 0.25))
+    next_frame = 0.0
+    sequence = 0
+    schema_state_ids: Optional[Tuple[str, ...]] = None
+    while True:
+        timeout = max(0.0, next_frame - time.monotonic())
+        try:
+            text = await asyncio.wait_for(queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            text = None
+
+        if text is not None:
+            await send({"type": "websocket.send", "text": text})
+            if json.loads(text).get("type") != "state":
+                continue
+            # A state change: show its first frame right away.
+
+        found = await _frame(session_id)
+        interval = default_interval
+        if found is not None:
+            frame, state_ids = found
+            if not binary:
+                await send({"type": "websocket.send", "text": encode_event("vitals", frame)})
+            else:
+                if state_ids != schema_state_ids:
+                    schema = {**frame_schema(state_ids), "frame_seconds": frame["frame_seconds"]}
+                    await send({"type": "websocket.send", "text": encode_event("schema", schema)})
+                    schema_state_ids = state_ids
+                sequence += 1
+                await send(
+                    {"type": "websocket.send", "bytes": encode_frame(frame, state_ids, sequence)}
+                )
+            interval = frame["frame_seconds"]
+        next_frame = time.monotonic() + max(min_interval, interval)
@@ -5,16 +5,16 @@ import mimetypes
 import os
 import re
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 from urllib.parse import urlparse
 
-import boto3
-import requests
-from botocore.exceptions import BotoCoreError, ClientError
+import redis
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandParser
 
-from sim.models import SimCase, SimResource
+from sim.case_cache import bump_case_versions
+from sim.case_import import CaseRow, import_case_rows
+from sim.media_sync import MediaJob, MediaSyncEngine, pending_media_jobs
 
 
 # Header names are kept EXACTLY as in the source sheet so the mapping remains
@@ -96,26 +96,6 @@ def _generate_resource_id(url: str, index: int) -> str:
     return f"resource_{index}"
 
 
-def _get_file_extension(url: str, content_type: Optional[str] = None) -> str:
-    """Get file extension from URL or content type."""
-    parsed = urlparse(url)
-    path = parsed.path.lower()
-
-    # Try to get from URL path
-    if "." in os.path.basename(path):
-        ext = os.path.splitext(path)[1]
-        if ext:
-            return ext
-
-    # Try from content type
-    if content_type:
-        ext = mimetypes.guess_extension(content_type.split(";")[0].strip())
-        if ext:
-            return ext
-
-    return ""
-
-
 def _extract_media_urls(row: Dict[str, Any]) -> List[tuple]:
     """Extract all media URLs from a CSV row.
 
@@ -157,6 +137,33 @@ class Command(BaseCommand):
             help="Download external media URLs and upload to S3.",
         )
 
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Parallel media transfers (default: SIM_MEDIA_SYNC_CONCURRENCY).",
+        )
+
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=None,
+            help="Retries per media URL (default: SIM_MEDIA_SYNC_RETRIES).",
+        )
+
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Cases written per bulk query (default: SIM_IMPORT_BATCH_SIZE).",
+        )
+
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rewrite every case, even rows whose content hash is unchanged.",
+        )
+
     def handle(self, *args, **options) -> None:
         csv_path = Path(options["csv_path"])
         dry_run: bool = bool(options["dry_run"])
@@ -168,7 +175,6 @@ class Command(BaseCommand):
 
         # Get S3 bucket if fetching resources
         bucket_name = ""
-        s3_client = None
         if fetch_resources and not dry_run:
             bucket_name = getattr(settings, "ERSIM_ASSETS_BUCKET", "") or os.environ.get(
                 "ERSIM_ASSETS_BUCKET", ""
@@ -178,14 +184,11 @@ class Command(BaseCommand):
                     self.style.ERROR("ERSIM_ASSETS_BUCKET not configured. Cannot fetch resources.")
                 )
                 return
-            s3_client = boto3.client("s3")
 
-        created = 0
-        updated = 0
-        skipped = 0
-        resources_created = 0
-        resources_synced = 0
+        self.skipped = 0
 
+        # Rows are read, parsed and written one batch at a time, so memory
+        # stays flat however large the file is.
         with csv_path.open("r", encoding="utf-8-sig", newline="") as f:
             reader = csv.DictReader(f)
             headers = reader.fieldnames or []
@@ -196,109 +199,105 @@ class Command(BaseCommand):
                 )
             )
 
-            for idx, row in enumerate(reader, start=2):  # data rows start at line 2
-                case_id = str(row.get(CASE_ID_COL) or "").strip()
-
-                if not case_id:
-                    skipped += 1
-                    continue
-
-                if not _is_row_ready(row):
-                    skipped += 1
-                    continue
-
-                spark_title = str(row.get(SPARK_TITLE_COL) or "").strip()
-                reveal_title = str(row.get(REVEAL_TITLE_COL) or "").strip()
-                series_name = str(row.get(SERIES_NAME_COL) or "").strip()
-                difficulty = str(row.get(DIFFICULTY_COL) or "").strip()
-
-                defaults = {
-                    "spark_title": spark_title,
-                    "reveal_title": reveal_title,
-                    "series_name": series_name,
-                    "difficulty_level": difficulty,
-                    "raw_row": row,
-                }
-
-                if dry_run:
-                    self.stdout.write(
-                        f"[DRY-RUN] Would import case {case_id!r} "
-                        f"(spark_title={spark_title!r})"
-                    )
-
-                    # Show resources that would be created
-                    media_urls = _extract_media_urls(row)
-                    for url_idx, url in media_urls:
-                        resource_id = _generate_resource_id(url, url_idx)
-                        self.stdout.write(f"  -> Resource: {resource_id} from {url[:80]}...")
-                    continue
-
-                obj, was_created = SimCase.objects.update_or_create(
-                    case_id=case_id,
-                    defaults=defaults,
+            rows = self._case_rows(reader, with_resources=fetch_resources or dry_run)
+            if dry_run:
+                self._print_dry_run(rows)
+                return
+
+            result = import_case_rows(rows, batch_size=options["batch_size"], force=options["force"])
+
+        changed_case_ids = set(result.changed_case_ids)
+
+        sync_report = None
+        if fetch_resources:
+            sync_report = self._sync_media(bucket_name, result.case_ids, options)
+            changed_case_ids |= sync_report.synced_case_ids
+
+        try:
+            bump_case_versions(changed_case_ids)
+        except redis.RedisError as e:
+            self.stderr.write(
+                self.style.WARNING(
+                    f"Failed to bump case versions; workers may serve stale primers: {e}"
                 )
-                if was_created:
-                    created += 1
-                else:
-                    updated += 1
-
-                # Process resources if requested
-                if fetch_resources:
-                    media_urls = _extract_media_urls(row)
-                    for url_idx, url in media_urls:
-                        resource_id = _generate_resource_id(url, url_idx)
-                        resource_type = _infer_resource_type(url)
-
-                        resource, res_created = SimResource.objects.update_or_create(
-                            case=obj,
-                            resource_id=resource_id,
-                            defaults={
-                                "original_url": url,
-                                "resource_type": resource_type,
-                            },
-                        )
-                        if res_created:
-                            resources_created += 1
-
-                        # Try to fetch and upload if not already synced
-                        if not resource.is_synced and s3_client:
-                            try:
-                                resp = requests.get(url, timeout=30, stream=True)
-                                resp.raise_for_status()
-
-                                content_type = resp.headers.get("Content-Type", "")
-                                ext = _get_file_extension(url, content_type)
-
-                                s3_key = f"cases/{case_id}/{resource_id}{ext}"
-
-                                s3_client.put_object(
-                                    Bucket=bucket_name,
-                                    Key=s3_key,
-                                    Body=resp.content,
-                                    ContentType=content_type or "application/octet-stream",
-                                )
-
-                                resource.s3_key = s3_key
-                                resource.is_synced = True
-                                resource.save(update_fields=["s3_key", "is_synced", "updated_at"])
-                                resources_synced += 1
-
-                                self.stdout.write(
-                                    self.style.SUCCESS(f"  Synced {resource_id} -> s3://{bucket_name}/{s3_key}")
-                                )
-                            except (requests.RequestException, BotoCoreError, ClientError) as e:
-                                self.stderr.write(
-                                    self.style.WARNING(f"  Failed to sync {resource_id}: {e}")
-                                )
-
-        if dry_run:
+            )
+
+        msg = (
+            f"Import complete. Created {result.created}, updated {result.updated}, "
+            f"unchanged {result.unchanged}, skipped {self.skipped} cases."
+        )
+        if fetch_resources:
+            msg += (
+                f" Resources: {result.resources_created} created, "
+                f"{result.resources_updated} updated."
+            )
+        self.stdout.write(self.style.SUCCESS(msg))
+        if sync_report is not None:
+            style = self.style.WARNING if sync_report.interrupted else self.style.SUCCESS
+            prefix = "Media sync interrupted (rerun to resume)" if sync_report.interrupted else "Media sync"
+            self.stdout.write(style(f"{prefix}: {sync_report.summary()}"))
+
+    def _case_rows(self, reader: "csv.DictReader[str]", with_resources: bool) -> Iterator[CaseRow]:
+        """Yield a CaseRow per importable row, lazily; counts the rest in `self.skipped`."""
+
+        for row in reader:
+            case_id = str(row.get(CASE_ID_COL) or "").strip()
+
+            if not case_id:
+                self.skipped += 1
+                continue
+
+            if not _is_row_ready(row):
+                self.skipped += 1
+                continue
+
+            defaults = {
+                "spark_title": str(row.get(SPARK_TITLE_COL) or "").strip(),
+                "reveal_title": str(row.get(REVEAL_TITLE_COL) or "").strip(),
+                "series_name": str(row.get(SERIES_NAME_COL) or "").strip(),
+                "difficulty_level": str(row.get(DIFFICULTY_COL) or "").strip(),
+                "raw_row": row,
+            }
+
+            resources = None
+            if with_resources:
+                resources = [
+                    (_generate_resource_id(url, url_idx), url, _infer_resource_type(url))
+                    for url_idx, url in _extract_media_urls(row)
+                ]
+            yield CaseRow(case_id, defaults, resources)
+
+    def _print_dry_run(self, rows: Iterable[CaseRow]) -> None:
+        for case_row in rows:
             self.stdout.write(
-                self.style.SUCCESS(
-                    f"Dry-run complete. Skipped {skipped} rows (not ready or no case_id)."
-                )
+                f"[DRY-RUN] Would import case {case_row.case_id!r} "
+                f"(spark_title={case_row.fields['spark_title']!r})"
+            )
+            for resource_id, url, _ in case_row.resources or []:
+                self.stdout.write(f"  -> Resource: {resource_id} from {url[:80]}...")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Dry-run complete. Skipped {self.skipped} rows (not ready or no case_id)."
             )
-        else:
-            msg = f"Import complete. Created {created}, updated {updated}, skipped {skipped} cases."
-            if fetch_resources:
-                msg += f" Resources: {resources_created} created, {resources_synced} synced to S3."
-            self.stdout.write(self.style.SUCCESS(msg))
+        )
+
+    def _sync_media(self, bucket_name: str, case_ids: List[str], options: Dict[str, Any]):
+        """Mirror every unsynced resource of the imported cases into S3."""
+
+        jobs = pending_media_jobs(case_ids)
+        self.stdout.write(f"Syncing {len(jobs)} unsynced resources to s3://{bucket_name}/ ...")
+
+        def on_progress(url: str, url_jobs: List[MediaJob], error: Optional[str]) -> None:
+            names = ", ".join(f"{job.case_id}/{job.resource_id}" for job in url_jobs)
+            if error:
+                self.stderr.write(self.style.WARNING(f"  Failed to sync {names}: {error}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"  Synced {names}"))
+
+        engine = MediaSyncEngine(
+            bucket_name,
+            concurrency=options.get("concurrency"),
+            retries=options.get("retries"),
+            on_progress=on_progress,
+        )
+        return engine.run(jobs)
@@ -1,20 +1,33 @@
 from __future__ import annotations
 
 import csv
-import io
 import mimetypes
 import os
 import re
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 from urllib.parse import urlparse
 
-import boto3
 import requests
-from botocore.exceptions import BotoCoreError, ClientError
+import redis
 from django.conf import settings
-from django.core.management.base import BaseCommand, CommandParser
-
-from sim.models import SimCase, SimResource
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import DatabaseError
+
+from sim.case_cache import bump_case_versions
+from sim.case_import import CaseRow, import_case_rows
+from sim.media_sync import MediaJob, MediaSyncEngine, pending_media_jobs
+from sim.sheet_sync import (
+    PRUNE_MODES,
+    Export,
+    csv_source_id,
+    fetch_sheet_export,
+    load_source_state,
+    prune_cases,
+    read_csv_export,
+    save_source_state,
+    sheet_source_id,
+)
 
 
 # Header names are kept EXACTLY as in the source sheet so the mapping remains
@@ -45,14 +58,6 @@ def _extract_sheet_id(url_or_id: str) -> str:
     return url_or_id
 
 
-def _fetch_sheet_as_csv(sheet_id: str, gid: str = "0") -> str:
-    """Fetch a Google Sheet as CSV content."""
-    export_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}"
-    resp = requests.get(export_url, timeout=60, allow_redirects=True)
-    resp.raise_for_status()
-    return resp.text
-
-
 def _is_row_ready(row: Dict[str, Any]) -> bool:
     """Decide if a CSV row should be imported as a case."""
     status = str(row.get(CONVERSION_STATUS_COL) or "").strip().lower()
@@ -113,24 +118,6 @@ def _generate_resource_id(url: str, index: int) -> str:
     return f"resource_{index}"
 
 
-def _get_file_extension(url: str, content_type: Optional[str] = None) -> str:
-    """Get file extension from URL or content type."""
-    parsed = urlparse(url)
-    path = parsed.path.lower()
-
-    if "." in os.path.basename(path):
-        ext = os.path.splitext(path)[1]
-        if ext:
-            return ext
-
-    if content_type:
-        ext = mimetypes.guess_extension(content_type.split(";")[0].strip())
-        if ext:
-            return ext
-
-    return ""
-
-
 def _extract_media_urls(row: Dict[str, Any]) -> List[tuple]:
     """Extract all media URLs from a CSV row."""
     urls = []
@@ -153,9 +140,17 @@ class Command(BaseCommand):
         parser.add_argument(
             "sheet_url",
             type=str,
+            nargs="?",
             help="Google Sheet URL or ID (e.g., https://docs.google.com/spreadsheets/d/SHEET_ID/...)",
         )
 
+        parser.add_argument(
+            "--csv",
+            type=str,
+            metavar="PATH",
+            help="Read this local CSV (e.g. a test fixture) instead of the sheet.",
+        )
+
         parser.add_argument(
             "--gid",
             type=str,
@@ -175,25 +170,94 @@ class Command(BaseCommand):
             help="Download external media URLs and upload to S3.",
         )
 
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Parallel media transfers (default: SIM_MEDIA_SYNC_CONCURRENCY).",
+        )
+
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=None,
+            help="Retries per media URL (default: SIM_MEDIA_SYNC_RETRIES).",
+        )
+
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Cases written per bulk query (default: SIM_IMPORT_BATCH_SIZE).",
+        )
+
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rewrite every case, even rows whose content hash is unchanged.",
+        )
+
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=(
+                "Skip the import when the export is unchanged since the last sync, and "
+                "archive/delete cases that disappeared from this sheet tab (see --prune)."
+            ),
+        )
+
+        parser.add_argument(
+            "--prune",
+            choices=PRUNE_MODES,
+            default="archive",
+            help="With --incremental: what to do with cases no longer in the sheet (default: archive).",
+        )
+
+        parser.add_argument(
+            "--watch",
+            type=int,
+            metavar="SECONDS",
+            help="Keep running, syncing incrementally every SECONDS (implies --incremental).",
+        )
+
     def handle(self, *args, **options) -> None:
-        sheet_url = options["sheet_url"]
+        if not options["sheet_url"] and not options["csv"]:
+            raise CommandError("Pass a sheet URL/ID or --csv PATH.")
+
+        interval = options["watch"]
+        if not interval:
+            self._sync_once(options)
+            return
+
+        options["incremental"] = True
+        self.stdout.write(f"Syncing every {interval}s; Ctrl-C to stop.")
+        try:
+            while True:
+                try:
+                    self._sync_once(options)
+                except (requests.RequestException, redis.RedisError, DatabaseError) as e:
+                    # A transient failure must not end the periodic job.
+                    self.stderr.write(self.style.ERROR(f"Sync failed: {e}"))
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
+
+    def _sync_once(self, options: Dict[str, Any]) -> None:
         gid = options["gid"]
         dry_run: bool = bool(options["dry_run"])
         fetch_resources: bool = bool(options["fetch_resources"])
+        incremental: bool = bool(options["incremental"]) and not dry_run
 
-        # Extract sheet ID
-        sheet_id = _extract_sheet_id(sheet_url)
-        self.stdout.write(f"Fetching Google Sheet: {sheet_id} (gid={gid})")
-
-        try:
-            csv_content = _fetch_sheet_as_csv(sheet_id, gid)
-        except requests.RequestException as e:
-            self.stderr.write(self.style.ERROR(f"Failed to fetch sheet: {e}"))
-            return
+        if options["csv"]:
+            source_id = csv_source_id(options["csv"])
+            self.stdout.write(f"Reading CSV: {options['csv']}")
+        else:
+            sheet_id = _extract_sheet_id(options["sheet_url"])
+            source_id = sheet_source_id(sheet_id, gid)
+            self.stdout.write(f"Fetching Google Sheet: {sheet_id} (gid={gid})")
 
         # Get S3 bucket if fetching resources
         bucket_name = ""
-        s3_client = None
         if fetch_resources and not dry_run:
             bucket_name = getattr(settings, "ERSIM_ASSETS_BUCKET", "") or os.environ.get(
                 "ERSIM_ASSETS_BUCKET", ""
@@ -203,126 +267,172 @@ class Command(BaseCommand):
                     self.style.ERROR("ERSIM_ASSETS_BUCKET not configured. Cannot fetch resources.")
                 )
                 return
-            s3_client = boto3.client("s3")
 
-        created = 0
-        updated = 0
-        skipped = 0
-        resources_created = 0
-        resources_synced = 0
+        state = None
+        if incremental:
+            try:
+                state = load_source_state(source_id)
+            except redis.RedisError as e:
+                self.stderr.write(self.style.WARNING(f"No sync state ({e}); doing a full diff."))
 
-        # Parse CSV from string
-        reader = csv.DictReader(io.StringIO(csv_content))
-        headers = reader.fieldnames or []
-        self.stdout.write(
-            self.style.NOTICE(
-                f"Found {len(headers)} columns: {', '.join(headers[:10])}"
-                + ("..." if len(headers) > 10 else "")
+        # --force re-imports everything, so the export is never "unchanged".
+        validators = None if options["force"] else state
+        try:
+            if options["csv"]:
+                export = read_csv_export(options["csv"], validators)
+            else:
+                export = fetch_sheet_export(sheet_id, gid, validators)
+        except (requests.RequestException, OSError) as e:
+            self.stderr.write(self.style.ERROR(f"Failed to fetch sheet: {e}"))
+            return
+
+        if export.body is None:
+            self.stdout.write(self.style.SUCCESS("Sheet unchanged since the last sync; nothing to do."))
+            self._save_state(source_id, export, state.case_ids if state else ())
+            return
+
+        self.skipped = 0
+
+        # The export is streamed from its spool file one batch at a time, so
+        # memory stays flat however large the sheet is.
+        try:
+            reader = export.reader()
+            headers = reader.fieldnames or []
+            self.stdout.write(
+                self.style.NOTICE(
+                    f"Found {len(headers)} columns: {', '.join(headers[:10])}"
+                    + ("..." if len(headers) > 10 else "")
+                )
+            )
+
+            rows = self._case_rows(reader, with_resources=fetch_resources or dry_run)
+            if dry_run:
+                self._print_dry_run(rows)
+                return
+
+            result = import_case_rows(rows, batch_size=options["batch_size"], force=options["force"])
+        finally:
+            export.close()
+
+        changed_case_ids = set(result.changed_case_ids)
+
+        pruned: List[str] = []
+        save_state = incremental
+        if incremental and state is not None:
+            gone = set(state.case_ids) - set(result.case_ids)
+            if gone and not result.case_ids:
+                # An empty export is far more likely a broken download or a
+                # permissions page than a sheet whose cases were all removed.
+                self.stderr.write(
+                    self.style.WARNING(f"Export has no cases; not pruning {len(gone)} cases.")
+                )
+                save_state = False
+            else:
+                pruned = prune_cases(gone, options["prune"])
+                changed_case_ids.update(pruned)
+
+        sync_report = None
+        if fetch_resources:
+            sync_report = self._sync_media(bucket_name, result.case_ids, options)
+            changed_case_ids |= sync_report.synced_case_ids
+
+        try:
+            bump_case_versions(changed_case_ids)
+        except redis.RedisError as e:
+            self.stderr.write(
+                self.style.WARNING(
+                    f"Failed to bump case versions; workers may serve stale primers: {e}"
+                )
             )
+
+        msg = (
+            f"Import complete. Created {result.created}, updated {result.updated}, "
+            f"unchanged {result.unchanged}, skipped {self.skipped} cases."
         )
+        if fetch_resources:
+            msg += (
+                f" Resources: {result.resources_created} created, "
+                f"{result.resources_updated} updated."
+            )
+        if pruned:
+            msg += f" {options['prune'].capitalize()}d {len(pruned)} cases no longer in the sheet."
+        self.stdout.write(self.style.SUCCESS(msg))
+        if save_state:
+            self._save_state(source_id, export, result.case_ids)
+        if sync_report is not None:
+            style = self.style.WARNING if sync_report.interrupted else self.style.SUCCESS
+            prefix = "Media sync interrupted (rerun to resume)" if sync_report.interrupted else "Media sync"
+            self.stdout.write(style(f"{prefix}: {sync_report.summary()}"))
+
+    def _save_state(self, source_id: str, export: Export, case_ids) -> None:
+        try:
+            save_source_state(source_id, export, case_ids)
+        except redis.RedisError as e:
+            self.stderr.write(
+                self.style.WARNING(f"Could not save sync state; the next run does a full diff: {e}")
+            )
+
+    def _case_rows(self, reader: "csv.DictReader[str]", with_resources: bool) -> Iterator[CaseRow]:
+        """Yield a CaseRow per importable row, lazily; counts the rest in `self.skipped`."""
 
-        for idx, row in enumerate(reader, start=2):
+        for row in reader:
             case_id = str(row.get(CASE_ID_COL) or "").strip()
 
             if not case_id:
-                skipped += 1
+                self.skipped += 1
                 continue
 
             if not _is_row_ready(row):
-                skipped += 1
+                self.skipped += 1
                 continue
 
-            spark_title = str(row.get(SPARK_TITLE_COL) or "").strip()
-            reveal_title = str(row.get(REVEAL_TITLE_COL) or "").strip()
-            series_name = str(row.get(SERIES_NAME_COL) or "").strip()
-            difficulty = str(row.get(DIFFICULTY_COL) or "").strip()
-
             defaults = {
-                "spark_title": spark_title,
-                "reveal_title": reveal_title,
-                "series_name": series_name,
-                "difficulty_level": difficulty,
+                "spark_title": str(row.get(SPARK_TITLE_COL) or "").strip(),
+                "reveal_title": str(row.get(REVEAL_TITLE_COL) or "").strip(),
+                "series_name": str(row.get(SERIES_NAME_COL) or "").strip(),
+                "difficulty_level": str(row.get(DIFFICULTY_COL) or "").strip(),
                 "raw_row": row,
             }
 
-            if dry_run:
-                self.stdout.write(
-                    f"[DRY-RUN] Would import case {case_id!r} "
-                    f"(spark_title={spark_title!r})"
-                )
-
-                media_urls = _extract_media_urls(row)
-                for url_idx, url in media_urls:
-                    resource_id = _generate_resource_id(url, url_idx)
-                    self.stdout.write(f"  -> Resource: {resource_id} from {url[:80]}...")
-                continue
+            resources = None
+            if with_resources:
+                resources = [
+                    (_generate_resource_id(url, url_idx), url, _infer_resource_type(url))
+                    for url_idx, url in _extract_media_urls(row)
+                ]
+            yield CaseRow(case_id, defaults, resources)
 
-            obj, was_created = SimCase.objects.update_or_create(
-                case_id=case_id,
-                defaults=defaults,
-            )
-            if was_created:
-                created += 1
-            else:
-                updated += 1
-
-            # Process resources if requested
-            if fetch_resources:
-                media_urls = _extract_media_urls(row)
-                for url_idx, url in media_urls:
-                    resource_id = _generate_resource_id(url, url_idx)
-                    resource_type = _infer_resource_type(url)
-
-                    resource, res_created = SimResource.objects.update_or_create(
-                        case=obj,
-                        resource_id=resource_id,
-                        defaults={
-                            "original_url": url,
-                            "resource_type": resource_type,
-                        },
-                    )
-                    if res_created:
-                        resources_created += 1
-
-                    # Try to fetch and upload if not already synced
-                    if not resource.is_synced and s3_client:
-                        try:
-                            resp = requests.get(url, timeout=30, stream=True)
-                            resp.raise_for_status()
-
-                            content_type = resp.headers.get("Content-Type", "")
-                            ext = _get_file_extension(url, content_type)
-
-                            s3_key = f"cases/{case_id}/{resource_id}{ext}"
-
-                            s3_client.put_object(
-                                Bucket=bucket_name,
-                                Key=s3_key,
-                                Body=resp.content,
-                                ContentType=content_type or "application/octet-stream",
-                            )
-
-                            resource.s3_key = s3_key
-                            resource.is_synced = True
-                            resource.save(update_fields=["s3_key", "is_synced", "updated_at"])
-                            resources_synced += 1
-
-                            self.stdout.write(
-                                self.style.SUCCESS(f"  Synced {resource_id} -> s3://{bucket_name}/{s3_key}")
-                            )
-                        except (requests.RequestException, BotoCoreError, ClientError) as e:
-                            self.stderr.write(
-                                self.style.WARNING(f"  Failed to sync {resource_id}: {e}")
-                            )
-
-        if dry_run:
+    def _print_dry_run(self, rows: Iterable[CaseRow]) -> None:
+        for case_row in rows:
             self.stdout.write(
-                self.style.SUCCESS(
-                    f"Dry-run complete. Skipped {skipped} rows (not ready or no case_id)."
-                )
+                f"[DRY-RUN] Would import case {case_row.case_id!r} "
+                f"(spark_title={case_row.fields['spark_title']!r})"
             )
-        else:
-            msg = f"Import complete. Created {created}, updated {updated}, skipped {skipped} cases."
-            if fetch_resources:
-                msg += f" Resources: {resources_created} created, {resources_synced} synced to S3."
-            self.stdout.write(self.style.SUCCESS(msg))
+            for resource_id, url, _ in case_row.resources or []:
+                self.stdout.write(f"  -> Resource: {resource_id} from {url[:80]}...")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Dry-run complete. Skipped {self.skipped} rows (not ready or no case_id)."
+            )
+        )
+
+    def _sync_media(self, bucket_name: str, case_ids: List[str], options: Dict[str, Any]):
+        """Mirror every unsynced resource of the imported cases into S3."""
+
+        jobs = pending_media_jobs(case_ids)
+        self.stdout.write(f"Syncing {len(jobs)} unsynced resources to s3://{bucket_name}/ ...")
+
+        def on_progress(url: str, url_jobs: List[MediaJob], error: Optional[str]) -> None:
+            names = ", ".join(f"{job.case_id}/{job.resource_id}" for job in url_jobs)
+            if error:
+                self.stderr.write(self.style.WARNING(f"  Failed to sync {names}: {error}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"  Synced {names}"))
+
+        engine = MediaSyncEngine(
+            bucket_name,
+            concurrency=options.get("concurrency"),
+            retries=options.get("retries"),
+            on_progress=on_progress,
+        )
+        return engine.run(jobs)
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from sim.case_schema import normalize_cases
+from sim.models import SimCase
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the normalized case tables (patient, vitals states, learning "
+        "objectives) and the full-text search vector from SimCase.raw_row. Imports "
+        "keep them current; run this once to backfill cases imported before they "
+        "existed."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "case_ids",
+            nargs="*",
+            help="Only these case_ids (default: every case).",
+        )
+
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Cases loaded and rewritten per batch (default: 500).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        batch_size = max(1, options["batch_size"])
+        qs = SimCase.objects.order_by("pk")
+        if options["case_ids"]:
+            qs = qs.filter(case_id__in=options["case_ids"])
+
+        # Keyset batches: memory stays flat and each batch is one short query.
+        total = 0
+        last_pk = 0
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk).values_list("pk", "raw_row")[:batch_size])
+            if not batch:
+                break
+            total += normalize_cases(batch, batch_size=batch_size)
+            last_pk = batch[-1][0]
+            self.stdout.write(f"Normalized {total} cases...")
+
+        self.stdout.write(self.style.SUCCESS(f"Normalized {total} cases."))
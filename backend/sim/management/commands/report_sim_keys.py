@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import redis
+from django.core.management.base import BaseCommand, CommandParser
+
+from sim.state_store import sweep_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how many sim:* Redis keys exist and how much memory they use, per key "
+        "family, including stale keys that should expire but have no TTL. Safe to run "
+        "periodically (cron) against production."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--expire-stale",
+            type=int,
+            metavar="SECONDS",
+            help="Give stale keys this TTL while scanning (e.g. 3600).",
+        )
+
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="SCAN COUNT and pipeline size (default: 500).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        expire_stale = options["expire_stale"]
+
+        try:
+            report = sweep_report(expire_stale=expire_stale, batch_size=options["batch_size"])
+        except redis.RedisError as e:
+            self.stderr.write(self.style.ERROR(f"Could not scan Redis: {e}"))
+            return
+
+        self.stdout.write(
+            f"{'family':<22}{'keys':>10}{'bytes':>14}{'stale keys':>12}{'stale bytes':>14}"
+        )
+        totals = {"keys": 0, "bytes": 0, "stale_keys": 0, "stale_bytes": 0}
+        for family, row in sorted(report.items()):
+            self.stdout.write(
+                f"{family:<22}{row['keys']:>10}{row['bytes']:>14}"
+                f"{row['stale_keys']:>12}{row['stale_bytes']:>14}"
+            )
+            for field in totals:
+                totals[field] += row[field]
+        self.stdout.write(
+            f"{'total':<22}{totals['keys']:>10}{totals['bytes']:>14}"
+            f"{totals['stale_keys']:>12}{totals['stale_bytes']:>14}"
+        )
+
+        if expire_stale and totals["stale_keys"]:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Set a {expire_stale}s TTL on {totals['stale_keys']} stale keys."
+                )
+            )
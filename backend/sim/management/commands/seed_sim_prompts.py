@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from sim.models import SimPrompt
+from sim.prompts import PROMPT_VARIANTS, SIM_SYSTEM_PROMPT_KEY, variant_prompt
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the built-in sim prompt variants (default prompt plus the coaching "
+        "or minimal-intervention additions) as inactive SimPrompts, ready to be "
+        "activated and scoped to a case or cohort in the admin. Existing entries "
+        "are left alone."
+    )
+
+    def handle(self, *args, **options) -> None:
+        for variant in PROMPT_VARIANTS:
+            name = f"Built-in: {variant}"
+            _, created = SimPrompt.objects.get_or_create(
+                key=SIM_SYSTEM_PROMPT_KEY,
+                name=name,
+                defaults={
+                    "description": f"The default sim prompt plus the '{variant}' variant.",
+                    "system_prompt": variant_prompt(variant),
+                    "is_active": False,
+                },
+            )
+            self.stdout.write(f"{'Created' if created else 'Kept'} {name!r}")
@@ -0,0 +1,321 @@
+"""Concurrent, resumable mirroring of case media into S3.
+
+Used by the import commands' `--fetch-resources`. Each unsynced SimResource
+becomes a `MediaJob`; jobs are grouped by URL so a file shared by several
+cases is downloaded and uploaded once and every resource points at the same
+S3 key.
+
+Downloads are streamed straight into `upload_fileobj`, which switches to an
+S3 multipart upload above one chunk, so a worker never holds more than
+SIM_MEDIA_SYNC_CHUNK_MB of a file in memory. Failed transfers are retried
+with exponential backoff (plus jitter); client errors other than 429 are not
+retried.
+
+Progress lives in the database: each finished URL marks its resources
+`is_synced` immediately, and URLs already synced for any resource are reused
+without a transfer. An interrupted run therefore resumes where it stopped
+when the command is run again.
+"""
+
+from __future__ import annotations
+
+import logging
+import mimetypes
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import BinaryIO, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import requests
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.utils import timezone
+
+from sim.assets import get_s3_client
+from sim.models import SimResource
+
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# (connect, read) timeouts for media downloads.
+DOWNLOAD_TIMEOUT = (10, 60)
+
+
+class MediaJob(NamedTuple):
+    resource_pk: int
+    case_id: str
+    resource_id: str
+    url: str
+
+
+class MediaSyncReport:
+    """Outcome and throughput of one `MediaSyncEngine.run`."""
+
+    def __init__(self) -> None:
+        self.transferred = 0  # unique URLs downloaded and uploaded
+        self.synced = 0  # resources marked synced (including reused ones)
+        self.reused = 0  # resources pointed at an already-uploaded URL
+        self.failed = 0  # resources left unsynced
+        self.synced_case_ids: Set[str] = set()
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.interrupted = False
+
+    @property
+    def files_per_second(self) -> float:
+        return self.transferred / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / MB / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.synced} resources synced ({self.transferred} files transferred, "
+            f"{self.reused} reused), {self.failed} failed; {self.bytes / MB:.1f} MB in "
+            f"{self.elapsed:.1f}s = {self.files_per_second:.2f} files/s, "
+            f"{self.mb_per_second:.2f} MB/s"
+        )
+
+
+def file_extension(url: str, content_type: Optional[str] = None) -> str:
+    """Get file extension from URL or content type.
+
+    >>> file_extension("https://x.org/a/scan.JPG?size=2")
+    '.jpg'
+    >>> file_extension("https://x.org/view/123", "application/pdf")
+    '.pdf'
+    """
+
+    path = urlparse(url).path.lower()
+    if "." in os.path.basename(path):
+        ext = os.path.splitext(path)[1]
+        if ext:
+            return ext
+
+    if content_type:
+        ext = mimetypes.guess_extension(content_type.split(";")[0].strip())
+        if ext:
+            return ext
+
+    return ""
+
+
+def pending_media_jobs(case_ids: Optional[Iterable[str]] = None) -> List[MediaJob]:
+    """Return a job for every unsynced resource with a URL (optionally per case)."""
+
+    qs = SimResource.objects.filter(is_synced=False).exclude(original_url="")
+    fields = ("pk", "case__case_id", "resource_id", "original_url")
+    if case_ids is None:
+        return [MediaJob(*values) for values in qs.order_by("pk").values_list(*fields)]
+
+    # Chunked so that a very large import stays under the database's limit
+    # on query parameters.
+    ids = list(case_ids)
+    jobs: List[MediaJob] = []
+    for start in range(0, len(ids), 1000):
+        chunk = qs.filter(case__case_id__in=ids[start : start + 1000])
+        jobs.extend(MediaJob(*values) for values in chunk.order_by("pk").values_list(*fields))
+    return jobs
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        code = exc.response.status_code
+        return code == 429 or code >= 500
+    return True
+
+
+class _CountingReader:
+    """File-like wrapper that counts the bytes read through it."""
+
+    def __init__(self, raw: BinaryIO) -> None:
+        self._raw = raw
+        self.count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        self.count += len(data)
+        return data
+
+
+class MediaSyncEngine:
+    def __init__(
+        self,
+        bucket: str,
+        concurrency: Optional[int] = None,
+        retries: Optional[int] = None,
+        backoff: float = 1.0,
+        chunk_mb: Optional[int] = None,
+        client=None,
+        on_progress: Optional[Callable[[str, List[MediaJob], Optional[str]], None]] = None,
+    ) -> None:
+        """`on_progress(url, jobs, error)` is called from the calling thread
+        after each URL finishes (`error` is None on success)."""
+
+        self.bucket = bucket
+        self.concurrency = max(
+            1, concurrency or int(getattr(settings, "SIM_MEDIA_SYNC_CONCURRENCY", 8))
+        )
+        self.retries = max(
+            0, retries if retries is not None else int(getattr(settings, "SIM_MEDIA_SYNC_RETRIES", 3))
+        )
+        self.backoff = backoff
+        chunk_size = max(5, chunk_mb or int(getattr(settings, "SIM_MEDIA_SYNC_CHUNK_MB", 8))) * MB
+        # One upload thread per transfer: the pool already provides the
+        # parallelism, and this caps memory at ~concurrency * chunk_size.
+        self._transfer_config = TransferConfig(
+            multipart_threshold=chunk_size,
+            multipart_chunksize=chunk_size,
+            use_threads=False,
+        )
+        self._client = client or get_s3_client()
+        self._on_progress = on_progress
+        self._local = threading.local()
+
+    # -- public ------------------------------------------------------------
+
+    def run(self, jobs: Iterable[MediaJob]) -> MediaSyncReport:
+        """Sync `jobs`, checkpointing each URL in the database as it finishes.
+
+        Safe to interrupt (Ctrl-C): queued transfers are cancelled, running
+        ones finish and are recorded, and the report is marked `interrupted`.
+        """
+
+        report = MediaSyncReport()
+        start = time.perf_counter()
+
+        by_url: Dict[str, List[MediaJob]] = {}
+        for job in jobs:
+            by_url.setdefault(job.url, []).append(job)
+
+        for url, s3_key in self._already_synced(by_url).items():
+            url_jobs = by_url.pop(url)
+            self._checkpoint(url_jobs, s3_key)
+            report.synced += len(url_jobs)
+            report.reused += len(url_jobs)
+            report.synced_case_ids.update(job.case_id for job in url_jobs)
+            self._progress(url, url_jobs, None)
+
+        executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="media-sync"
+        )
+        futures: Dict[Future, str] = {}
+        queue = deque(by_url)
+        try:
+            while queue or futures:
+                # Keep only a bounded number of URLs queued ahead of the workers.
+                while queue and len(futures) < self.concurrency * 2:
+                    url = queue.popleft()
+                    first = by_url[url][0]
+                    futures[executor.submit(self._transfer, url, first)] = url
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(futures.pop(future), by_url, future, report)
+        except KeyboardInterrupt:
+            report.interrupted = True
+            for future in futures:
+                future.cancel()
+            for future in [f for f in futures if not f.cancelled()]:
+                wait([future])
+                self._finish(futures[future], by_url, future, report)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            report.elapsed = time.perf_counter() - start
+
+        return report
+
+    # -- internals ---------------------------------------------------------
+
+    @staticmethod
+    def _already_synced(by_url: Dict[str, List[MediaJob]]) -> Dict[str, str]:
+        """URLs some resource (from this or an earlier run) already mirrored."""
+
+        if not by_url:
+            return {}
+        rows = (
+            SimResource.objects.filter(original_url__in=list(by_url), is_synced=True)
+            .exclude(s3_key="")
+            .values_list("original_url", "s3_key")
+        )
+        return dict(rows)
+
+    @staticmethod
+    def _checkpoint(jobs: List[MediaJob], s3_key: str) -> None:
+        SimResource.objects.filter(pk__in=[job.resource_pk for job in jobs]).update(
+            s3_key=s3_key, is_synced=True, updated_at=timezone.now()
+        )
+
+    def _finish(
+        self,
+        url: str,
+        by_url: Dict[str, List[MediaJob]],
+        future: Future,
+        report: MediaSyncReport,
+    ) -> None:
+        url_jobs = by_url[url]
+        try:
+            s3_key, size = future.result()
+        except (requests.RequestException, BotoCoreError, ClientError, OSError) as exc:
+            report.failed += len(url_jobs)
+            self._progress(url, url_jobs, str(exc))
+            return
+
+        self._checkpoint(url_jobs, s3_key)
+        report.transferred += 1
+        report.synced += len(url_jobs)
+        report.reused += len(url_jobs) - 1
+        report.bytes += size
+        report.synced_case_ids.update(job.case_id for job in url_jobs)
+        self._progress(url, url_jobs, None)
+
+    def _progress(self, url: str, jobs: List[MediaJob], error: Optional[str]) -> None:
+        if self._on_progress is not None:
+            self._on_progress(url, jobs, error)
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _transfer(self, url: str, job: MediaJob) -> Tuple[str, int]:
+        """Stream `url` into S3 (with retries); return `(s3_key, bytes)`."""
+
+        for attempt in range(self.retries + 1):
+            try:
+                return self._transfer_once(url, job)
+            except (requests.RequestException, BotoCoreError, ClientError, OSError) as exc:
+                if attempt == self.retries or not _is_retryable(exc):
+                    raise
+                delay = self.backoff * (2**attempt) * (0.5 + random.random())
+                logger.info(
+                    "Media sync of %s failed (%s); retry %d/%d in %.1fs",
+                    url, exc, attempt + 1, self.retries, delay,
+                )
+                time.sleep(delay)
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def _transfer_once(self, url: str, job: MediaJob) -> Tuple[str, int]:
+        with self._session().get(url, timeout=DOWNLOAD_TIMEOUT, stream=True) as resp:
+            resp.raise_for_status()
+            content_type = resp.headers.get("Content-Type", "")
+            s3_key = f"cases/{job.case_id}/{job.resource_id}{file_extension(url, content_type)}"
+
+            resp.raw.decode_content = True
+            body = _CountingReader(resp.raw)
+            self._client.upload_fileobj(
+                body,
+                self.bucket,
+                s3_key,
+                ExtraArgs={"ContentType": content_type or "application/octet-stream"},
+                Config=self._transfer_config,
+            )
+        return s3_key, body.count
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 
@@ -7,8 +9,11 @@ class SimPrompt(models.Model):
     """Store system prompts / configurations for the sim AI.
 
     This lets us experiment with different prompt wordings and behaviors
-    without redeploying code. Only one prompt per `key` should typically
-    be marked as active at a time.
+    without redeploying code. Only one prompt per `key` and scope should
+    typically be marked as active at a time.
+
+    A prompt can be scoped to one case and/or one learner cohort; the most
+    specific active prompt wins (see sim.prompts.PromptRegistry).
     """
 
     key = models.CharField(
@@ -19,6 +24,18 @@ class SimPrompt(models.Model):
     description = models.TextField(blank=True)
     system_prompt = models.TextField()
     is_active = models.BooleanField(default=True)
+    case_id = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="Only use for this case_id (blank: every case).",
+    )
+    cohort = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="Only use for this learner cohort (blank: every cohort).",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -50,11 +67,29 @@ class SimCase(models.Model):
     # The full original row: {header: value} with exact header names.
     raw_row = models.JSONField()
 
+    # sha256 of the imported fields; lets re-imports skip unchanged rows.
+    content_hash = models.CharField(max_length=64, blank=True)
+
+    # Set when the case's row disappears from its source sheet (incremental
+    # sync); cleared if the row comes back.
+    is_archived = models.BooleanField(default=False)
+
+    # Full-text document of the titles, complaint and diagnosis, maintained
+    # by the importer (sim.case_library.update_search_vectors). Postgres only.
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["case_id"]
+        indexes = [
+            models.Index(fields=["series_name"], name="sim_case_series_idx"),
+            models.Index(fields=["difficulty_level"], name="sim_case_difficulty_idx"),
+            # jsonb_ops: serves raw_row__contains / __has_key / __has_any_keys.
+            GinIndex(fields=["raw_row"], name="sim_case_raw_row_gin"),
+            GinIndex(fields=["search_vector"], name="sim_case_search_gin"),
+        ]
 
     def __str__(self) -> str:  # pragma: no cover - simple repr
         return f"SimCase<{self.case_id}>"
@@ -99,6 +134,104 @@ class SimResource(models.Model):
     class Meta:
         ordering = ["case", "resource_id"]
         unique_together = [["case", "resource_id"]]
+        indexes = [
+            # Media sync reuses files already mirrored for the same URL.
+            models.Index(fields=["original_url"], name="sim_resource_url_idx"),
+            models.Index(fields=["resource_type"], name="sim_resource_type_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"SimResource<{self.case.case_id}:{self.resource_id}>"
+
+
+# Normalized views of raw_row, rebuilt by the importer (sim.case_schema)
+# whenever a case's row changes. raw_row stays the source of truth; these
+# tables exist so library and dashboard queries hit indexes, not JSON.
+
+
+class SimCasePatient(models.Model):
+    """Patient demographics of a case."""
+
+    case = models.OneToOneField(
+        SimCase,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="patient",
+    )
+
+    # Age as written in the sheet ("67", "6 months") and, when it parses,
+    # in whole years.
+    age_text = models.CharField(max_length=64, blank=True)
+    age_years = models.PositiveSmallIntegerField(null=True, blank=True)
+    sex = models.CharField(max_length=32, blank=True)
+    chief_complaint = models.CharField(max_length=255, blank=True)
+    chief_diagnosis = models.CharField(max_length=255, blank=True)
+    medical_category = models.CharField(max_length=128, blank=True)
+    past_medical_history = models.TextField(blank=True)
+    current_medications = models.TextField(blank=True)
+    allergies = models.TextField(blank=True)
+    social_history = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["chief_complaint"], name="sim_patient_complaint_idx"),
+            models.Index(fields=["chief_diagnosis"], name="sim_patient_diagnosis_idx"),
+            models.Index(fields=["medical_category"], name="sim_patient_category_idx"),
+            models.Index(fields=["sex", "age_years"], name="sim_patient_sex_age_idx"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - simple repr
+        return f"SimCasePatient<{self.case_id}>"
+
+
+class SimVitalsState(models.Model):
+    """One vitals state of a case's roadmap (Initial_Vitals, State1_Vitals, ...)."""
+
+    case = models.ForeignKey(
+        SimCase,
+        on_delete=models.CASCADE,
+        related_name="vitals_states",
+    )
+    state_id = models.CharField(max_length=32)
+    position = models.PositiveSmallIntegerField()
+
+    # The state's vitals as authored, e.g. {"HR": 118, "BP": "92/58", ...}.
+    vitals = models.JSONField()
+
+    # Common numeric vitals pulled out of `vitals` (null when absent).
+    heart_rate = models.FloatField(null=True, blank=True)
+    systolic_bp = models.FloatField(null=True, blank=True)
+    diastolic_bp = models.FloatField(null=True, blank=True)
+    respiratory_rate = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+    spo2 = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["case", "position"]
+        unique_together = [["case", "state_id"]]
+        indexes = [
+            models.Index(fields=["state_id", "spo2"], name="sim_vitals_state_spo2_idx"),
+            models.Index(fields=["state_id", "heart_rate"], name="sim_vitals_state_hr_idx"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - simple repr
+        return f"SimVitalsState<{self.case_id}:{self.state_id}>"
+
+
+class SimLearningObjective(models.Model):
+    """One learning objective of a case, in sheet order."""
+
+    case = models.ForeignKey(
+        SimCase,
+        on_delete=models.CASCADE,
+        related_name="learning_objectives",
+    )
+    position = models.PositiveSmallIntegerField()
+    text = models.TextField()
+
+    class Meta:
+        ordering = ["case", "position"]
+        unique_together = [["case", "position"]]
+
+    def __str__(self) -> str:  # pragma: no cover - simple repr
+        return f"SimLearningObjective<{self.case_id}:{self.position}>"
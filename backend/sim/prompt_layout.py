@@ -0,0 +1,210 @@
+"""Message layout for the sim GPT call, arranged for provider prompt caching.
+
+OpenAI caches prompt prefixes: when a request starts with the same bytes as a
+recent one (1024 tokens or more), that part is served from cache, faster and
+at a discount, and reported as `usage.prompt_tokens_details.cached_tokens`.
+Messages are therefore ordered from most to least stable:
+
+1. the system prompt (sim.prompts);
+2. the case context: canonical JSON (sorted keys, no whitespace, empty
+   fields dropped) without anything session-specific;
+3. the session summary and history (append-only within a session);
+4. the session position: current vitals state and stage;
+5. the clinician's utterance.
+
+1 and 2 are byte-identical for every turn and learner of a case, and are
+serialized once per (case version, prompt version) in each worker. Token
+usage, cached tokens included, is added up in `sim:llm:usage`.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+
+from sim.case_cache import VersionedLRUCache, case_versions
+from sim.prompts import ActivePrompt
+from sim.state_store import get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+LLM_USAGE_KEY = "sim:llm:usage"
+
+Message = Dict[str, str]
+
+_prefixes: VersionedLRUCache[Tuple[str, str, Tuple[str, ...]], str] = VersionedLRUCache(
+    maxsize=getattr(settings, "SIM_PRIMER_CACHE_SIZE", 512),
+)
+
+
+def compact_context(value: Any) -> Any:
+    """Drop null / empty entries (recursively) from the case context.
+
+    The context goes out on every call, and sheet rows leave many columns
+    blank.
+
+    >>> compact_context({"a": None, "b": "", "c": [], "d": {"e": None}, "f": 0, "g": ["x", None]})
+    {'f': 0, 'g': ['x']}
+    """
+
+    if isinstance(value, dict):
+        items = ((k, compact_context(v)) for k, v in value.items())
+        return {k: v for k, v in items if v not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        items = (compact_context(v) for v in value)
+        return [v for v in items if v not in (None, "", [], {})]
+    return value
+
+
+def _canonical_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def stable_case_context(case_context: Dict[str, Any]) -> Dict[str, Any]:
+    """The case context without the fields `SessionState.apply_to_primer` sets.
+
+    >>> stable_case_context({"case_id": "C1", "current_stage": "stage_2",
+    ...     "state_roadmap": {"current_state_id": "State1_Vitals", "states": []}})
+    {'case_id': 'C1', 'state_roadmap': {'states': []}}
+    """
+
+    stable = {k: v for k, v in case_context.items() if k != "current_stage"}
+    roadmap = stable.get("state_roadmap")
+    if isinstance(roadmap, dict):
+        stable["state_roadmap"] = {k: v for k, v in roadmap.items() if k != "current_state_id"}
+    return stable
+
+
+def _serialize_context(case_context: Dict[str, Any], available_resources: List[str]) -> str:
+    return _canonical_json(
+        {
+            "case_context": compact_context(stable_case_context(case_context)),
+            "available_resources": available_resources,
+        }
+    )
+
+
+def case_prefix(
+    prompt: ActivePrompt, case_context: Dict[str, Any], available_resources: List[str]
+) -> List[Message]:
+    """The two leading system messages, memoized per case and prompt version."""
+
+    case_id = str(case_context.get("case_id") or "")
+    if case_id:
+        serialized = _prefixes.get_or_load(
+            (case_id, prompt.version, tuple(available_resources)),
+            case_versions.version_for(case_id),
+            lambda: _serialize_context(case_context, available_resources),
+        )
+    else:
+        serialized = _serialize_context(case_context, available_resources)
+    return [
+        {"role": "system", "content": prompt.text.strip()},
+        {"role": "system", "content": serialized},
+    ]
+
+
+def session_position(case_context: Dict[str, Any]) -> Message:
+    """Where this session stands in the case (the part of the primer that varies).
+
+    >>> session_position({"initial_stage": "Initial_Vitals",
+    ...     "state_roadmap": {"current_state_id": "State1_Vitals"}})["content"]
+    '{"current_stage":"Initial_Vitals","current_state_id":"State1_Vitals"}'
+    """
+
+    roadmap = case_context.get("state_roadmap") or {}
+    return {
+        "role": "system",
+        "content": _canonical_json(
+            {
+                "current_state_id": roadmap.get("current_state_id"),
+                "current_stage": case_context.get("current_stage")
+                or case_context.get("initial_stage"),
+            }
+        ),
+    }
+
+
+def build_messages(
+    prompt: ActivePrompt,
+    doctor_utterance: str,
+    case_context: Dict[str, Any],
+    available_resources: List[str],
+    conversation_history: Optional[List[Message]] = None,
+) -> List[Message]:
+    """Chat messages in cache-friendly order (see module docstring).
+
+    The layout is fixed, which `sim.response_cache` relies on: two prefix
+    messages, the history, the session position, the utterance.
+    """
+
+    messages = case_prefix(prompt, case_context, available_resources)
+    messages.extend(conversation_history or [])
+    messages.append(session_position(case_context))
+    messages.append({"role": "user", "content": doctor_utterance})
+    return messages
+
+
+def usage_counters(usage: Dict[str, Any]) -> Dict[str, int]:
+    """Counters to add up from an OpenAI `usage` object.
+
+    >>> usage_counters({"prompt_tokens": 2006, "completion_tokens": 300,
+    ...     "prompt_tokens_details": {"cached_tokens": 1920}})
+    {'calls': 1, 'prompt_tokens': 2006, 'cached_tokens': 1920, 'completion_tokens': 300}
+    """
+
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "calls": 1,
+        "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+        "cached_tokens": int(details.get("cached_tokens") or 0),
+        "completion_tokens": int(usage.get("completion_tokens") or 0),
+    }
+
+
+def record_usage(usage: Optional[Dict[str, Any]]) -> None:
+    """Add one call's token usage to `sim:llm:usage`."""
+
+    if not usage:
+        return
+    counters = usage_counters(usage)
+    logger.debug(
+        "Sim GPT call: %d prompt tokens (%d cached), %d completion tokens",
+        counters["prompt_tokens"],
+        counters["cached_tokens"],
+        counters["completion_tokens"],
+    )
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        for field, amount in counters.items():
+            pipe.hincrby(LLM_USAGE_KEY, field, amount)
+        pipe.execute()
+    except redis.RedisError:
+        logger.debug("Could not record sim GPT usage", exc_info=True)
+
+
+def usage_stats() -> Dict[str, Any]:
+    """Token counters so far plus the share of prompt tokens served from cache."""
+
+    raw = get_redis_client().hgetall(LLM_USAGE_KEY)
+    return summarize_usage({k.decode(): int(v) for k, v in raw.items()})
+
+
+def summarize_usage(counters: Dict[str, int]) -> Dict[str, Any]:
+    """
+    >>> summarize_usage({"calls": 2, "prompt_tokens": 4000, "cached_tokens": 3000})["cached_rate"]
+    0.75
+    """
+
+    out: Dict[str, Any] = {
+        field: counters.get(field, 0)
+        for field in ("calls", "prompt_tokens", "cached_tokens", "completion_tokens")
+    }
+    prompt_tokens = out["prompt_tokens"]
+    out["cached_rate"] = round(out["cached_tokens"] / prompt_tokens, 4) if prompt_tokens else 0.0
+    return out
@@ -1,10 +1,39 @@
+"""System prompts for the sim AI and the per-process prompt registry.
+
+Active `SimPrompt` rows are loaded once into each worker (`PromptRegistry`)
+and reused for every turn. Saving or deleting a SimPrompt bumps a version
+counter in Redis (`sim:prompts:version`, see `sim.signals`); workers check it
+at most every SIM_PROMPT_VERSION_CHECK_SECONDS and reload all active prompts
+when it moved, so a prompt switch reaches every worker within that interval
+without a query per turn.
+
+A prompt is picked per turn by key, case and learner cohort: the newest
+active prompt scoped to both the case and the cohort, then to the case, then
+to the cohort, then unscoped, and DEFAULT_SIM_SYSTEM_PROMPT when there is
+none. `ActivePrompt.version` identifies the text that was picked, for cache
+keys.
+"""
+
 from __future__ import annotations
 
-from typing import Optional
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
 
-from django.db.models import Q
+import redis
+from django.conf import settings
+from django.db import DatabaseError
 
 from sim.models import SimPrompt
+from sim.state_store import get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_VERSION_KEY = "sim:prompts:version"
+
+SIM_SYSTEM_PROMPT_KEY = "sim_ai_system_prompt"
 
 
 # Default system prompt used if no active SimPrompt is configured in the DB.
@@ -143,8 +172,9 @@ Global behavioral rules:
 """.strip()
 
 
-# Optional alternate prompt variants that can be copied into SimPrompt entries
-# via the Django admin for experimentation.
+# Alternate prompt variants, written as additions to the default prompt.
+# `manage.py seed_sim_prompts` stores each (default + variant) as an inactive
+# SimPrompt that can be activated and scoped from the Django admin.
 
 COACHING_FOCUSED_SIM_PROMPT = """
 You are a simulation AI facilitator with a slightly more coaching-forward style.
@@ -185,26 +215,180 @@ experience for advanced learners.
 """.strip()
 
 
-def get_sim_system_prompt(key: str = "sim_ai_system_prompt") -> str:
-    """Return the active system prompt for the sim AI.
+PROMPT_VARIANTS: Dict[str, str] = {
+    "coaching": COACHING_FOCUSED_SIM_PROMPT,
+    "minimal": MINIMAL_INTERVENTION_SIM_PROMPT,
+}
+
+
+def variant_prompt(variant: str) -> str:
+    """Full system prompt for one of PROMPT_VARIANTS."""
+
+    return f"{DEFAULT_SIM_SYSTEM_PROMPT}\n\n{PROMPT_VARIANTS[variant]}"
+
+
+class ActivePrompt(NamedTuple):
+    text: str
+    # SimPrompt pk, or None for DEFAULT_SIM_SYSTEM_PROMPT.
+    prompt_id: Optional[int]
+    # Registry version the prompt was read at.
+    registry_version: int
+
+    @property
+    def version(self) -> str:
+        """Stable id of this prompt text, e.g. "12@7" or "default".
+
+        Editing a prompt bumps the registry version, so the id changes with
+        the text.
+        """
+
+        if self.prompt_id is None:
+            return "default"
+        return f"{self.prompt_id}@{self.registry_version}"
+
 
-    We first look up an active SimPrompt with the given key; if none exists,
-    we return DEFAULT_SIM_SYSTEM_PROMPT.
+class _Candidate(NamedTuple):
+    prompt_id: int
+    case_id: str
+    cohort: str
+    text: str
+
+
+class PromptRegistry:
+    """Per-process snapshot of the active SimPrompts, keyed by `key`.
+
+    Like `sim.case_cache.CaseVersionWatcher`, the Redis counter is polled at
+    most once every `check_interval` seconds and the prompts are only
+    reloaded when it moved. If Redis is unreachable the current snapshot is
+    kept, unless this process changed a prompt since it was loaded
+    (`invalidate`) or nothing is loaded yet: then it is read straight from
+    the database.
     """
 
-    try:
-        prompt: Optional[SimPrompt] = (
-            SimPrompt.objects.filter(Q(key=key) & Q(is_active=True))
-            .order_by("-created_at")
-            .first()
+    def __init__(self, check_interval: float) -> None:
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._prompts: Dict[str, List[_Candidate]] = {}
+        self._checked_at = 0.0
+        # Set by `invalidate`: the snapshot is known to be out of date.
+        self._stale = False
+
+    @property
+    def version(self) -> int:
+        self._refresh()
+        return self._version or 0
+
+    def select(
+        self,
+        key: str = SIM_SYSTEM_PROMPT_KEY,
+        case_id: Optional[str] = None,
+        cohort: Optional[str] = None,
+    ) -> ActivePrompt:
+        self._refresh()
+        case_id, cohort = case_id or "", cohort or ""
+        best: Optional[_Candidate] = None
+        best_rank = -1
+        # Candidates are newest first, so ties keep the newest.
+        for candidate in self._prompts.get(key, ()):
+            if candidate.case_id and candidate.case_id != case_id:
+                continue
+            if candidate.cohort and candidate.cohort != cohort:
+                continue
+            rank = 2 * bool(candidate.case_id) + bool(candidate.cohort)
+            if rank > best_rank:
+                best, best_rank = candidate, rank
+        if best is None:
+            return ActivePrompt(DEFAULT_SIM_SYSTEM_PROMPT, None, self._version or 0)
+        return ActivePrompt(best.text, best.prompt_id, self._version or 0)
+
+    def invalidate(self) -> None:
+        """Force a reload on the next lookup in this process."""
+
+        self._stale = True
+        self._checked_at = 0.0
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            try:
+                version = int(get_redis_client().get(PROMPTS_VERSION_KEY) or 0)
+            except redis.RedisError:
+                logger.warning("Could not read the prompt version from Redis", exc_info=True)
+                if self._version is not None and not self._stale:
+                    self._checked_at = now
+                    return
+                version = self._version or 0
+            if self._stale or version != self._version:
+                # Cleared before the query, so an `invalidate` racing with it
+                # still forces the next reload.
+                stale, self._stale = self._stale, False
+                try:
+                    self._prompts = self._load()
+                except DatabaseError:
+                    # In migrations or unusual startup states, the table might
+                    # not exist yet.
+                    logger.warning("Could not load sim prompts", exc_info=True)
+                    self._stale = self._stale or stale
+                    return
+                self._version = version
+            self._checked_at = now
+
+    @staticmethod
+    def _load() -> Dict[str, List[_Candidate]]:
+        prompts: Dict[str, List[_Candidate]] = {}
+        rows = (
+            SimPrompt.objects.filter(is_active=True)
+            .order_by("-created_at", "-pk")
+            .values_list("pk", "key", "case_id", "cohort", "system_prompt")
         )
-    except Exception:
-        # In migrations or unusual startup states, the table might not exist yet.
-        prompt = None
+        for pk, key, case_id, cohort, text in rows:
+            if text.strip():
+                prompts.setdefault(key, []).append(
+                    _Candidate(pk, case_id.strip(), cohort.strip(), text)
+                )
+        return prompts
+
+
+prompt_registry = PromptRegistry(
+    check_interval=getattr(settings, "SIM_PROMPT_VERSION_CHECK_SECONDS", 2.0),
+)
+
 
-    if prompt and prompt.system_prompt.strip():
-        return prompt.system_prompt
+def bump_prompt_version() -> None:
+    """Make every worker reload its prompts (called on SimPrompt changes)."""
 
-    return DEFAULT_SIM_SYSTEM_PROMPT
+    prompt_registry.invalidate()
+    try:
+        get_redis_client().incr(PROMPTS_VERSION_KEY)
+    except redis.RedisError:
+        logger.warning("Could not bump the prompt version in Redis", exc_info=True)
+
+
+def get_active_prompt(
+    key: str = SIM_SYSTEM_PROMPT_KEY,
+    case_id: Optional[str] = None,
+    cohort: Optional[str] = None,
+) -> ActivePrompt:
+    """Return the prompt to use for this case and cohort (see module docstring)."""
+
+    return prompt_registry.select(key, case_id=case_id, cohort=cohort)
 
 
+def get_sim_system_prompt(
+    key: str = SIM_SYSTEM_PROMPT_KEY,
+    case_id: Optional[str] = None,
+    cohort: Optional[str] = None,
+) -> str:
+    """Return the active system prompt text for the sim AI.
+
+    The newest active SimPrompt with the given key that fits the case and
+    cohort, or DEFAULT_SIM_SYSTEM_PROMPT if none exists.
+    """
+
+    return get_active_prompt(key, case_id=case_id, cohort=cohort).text
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
-from typing import Dict
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
 
+from django.conf import settings
 
-S3_RESOURCE_MAP: Dict[str, str] = {
-    # Example mapping for an initial shortness-of-breath case.
-    "chest_xray": "case_12/chest_xray.png",
-    "basic_labs": "case_12/labs_basic.pdf",
-    "ekg": "case_12/ekg.png",
-}
+from sim.case_cache import VersionedLRUCache, case_versions
+from sim.models import SimResource
+
+
+# resource_id -> (s3_key, resource_type) for the synced resources of one case.
+CaseResources = Mapping[str, Tuple[str, str]]
+
+# Per-worker index, one entry per case. Entries are tagged with the case
+# version stamp, which the import commands bump whenever they write a case or
+# its resources, so an import only reloads the cases it touched.
+_resource_index: VersionedLRUCache[str, CaseResources] = VersionedLRUCache(
+    maxsize=getattr(settings, "SIM_RESOURCE_INDEX_CACHE_SIZE", 512),
+)
 
 
 def infer_resource_type(s3_key: str) -> str:
@@ -24,3 +33,30 @@ def infer_resource_type(s3_key: str) -> str:
     return "binary"
 
 
+def case_resources(case_id: str) -> CaseResources:
+    """Return the (read-only) resource index of a case; one query per version."""
+
+    version = case_versions.version_for(case_id)
+    return _resource_index.get_or_load(case_id, version, lambda: _load_case_resources(case_id))
+
+
+def resolve_resource(case_id: str, resource_id: str) -> Optional[Tuple[str, str]]:
+    """Return `(s3_key, resource_type)` if the case has that synced resource."""
+
+    return case_resources(case_id).get(resource_id)
+
+
+def _load_case_resources(case_id: str) -> CaseResources:
+    rows = (
+        SimResource.objects.filter(
+            case__case_id=case_id, case__is_archived=False, is_synced=True
+        )
+        .exclude(s3_key="")
+        .values_list("resource_id", "s3_key", "resource_type")
+    )
+    index = {}
+    for resource_id, s3_key, resource_type in rows:
+        if not resource_type or resource_type == "unknown":
+            resource_type = infer_resource_type(s3_key)
+        index[resource_id] = (s3_key, resource_type)
+    return MappingProxyType(index)
@@ -0,0 +1,232 @@
+"""Opt-in cache of simulation GPT responses (SIM_RESPONSE_CACHE_ENABLED).
+
+Learners running the same case ask near-identical questions ("what are his
+vitals?", "can I get an ECG"). A response is cached under
+
+    (case_id, prompt fingerprint, recent-history fingerprint, utterance)
+
+where the prompt fingerprint hashes the system messages (the active
+SimPrompt text, the compiled case context and the session position; see
+sim.prompt_layout), so editing either one starts a fresh cache without
+explicit invalidation. Two tiers:
+
+- exact:   one Redis string per key, hit when the normalized utterance
+           matches exactly;
+- similar: optional (SIM_RESPONSE_CACHE_SIMILARITY > 0). Each (case,
+           prompt, history) bucket keeps a Redis hash of normalized
+           utterance -> exact key, scanned locally with a character-trigram
+           cosine. Candidates must carry the same numbers and negations, so
+           "give 1 mg epi" never matches "give 2 mg epi".
+
+Entries expire after the case's TTL (SIM_RESPONSE_CACHE_CASE_TTLS, falling
+back to SIM_RESPONSE_CACHE_TTL_SECONDS; a TTL of 0 disables a case).
+Counters in Redis report the hit rate and the LLM calls avoided.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+
+from sim.state_store import get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_PREFIX = "sim:respcache"
+RESPONSE_CACHE_STATS_KEY = f"{RESPONSE_CACHE_PREFIX}:stats"
+
+_FILLER_WORDS = frozenset({"um", "uh", "erm", "hmm", "please", "ok", "okay", "so", "hey", "alright"})
+_NEGATIONS = frozenset({"no", "not", "dont", "don't", "without", "stop", "hold", "never"})
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def normalize_utterance(text: str) -> str:
+    """Canonical form of a clinician utterance for cache lookups.
+
+    >>> normalize_utterance("  Um, what are his VITALS?? ")
+    'what are his vitals'
+    >>> normalize_utterance("Okay — can I get an ECG, please.")
+    'can i get an ecg'
+    """
+
+    text = unicodedata.normalize("NFKC", text).lower().replace("’", "'")
+    words = [w.strip("'") for w in _WORD.findall(text)]
+    return " ".join(w for w in words if w and w not in _FILLER_WORDS)
+
+
+def _trigrams(normalized: str) -> Counter:
+    padded = f"  {normalized} "
+    return Counter(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def _guard_tokens(normalized: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    words = normalized.split()
+    numbers = tuple(sorted(w for w in words if any(c.isdigit() for c in w)))
+    negations = tuple(sorted(w for w in words if w in _NEGATIONS))
+    return numbers, negations
+
+
+def similarity(a: str, b: str) -> float:
+    """Trigram cosine of two normalized utterances; 0.0 if their numbers or
+    negations differ.
+
+    >>> similarity("what are his vitals", "what are the vitals") > 0.7
+    True
+    >>> similarity("give 1 mg of epi", "give 2 mg of epi")
+    0.0
+    >>> similarity("give fluids", "do not give fluids")
+    0.0
+    """
+
+    if _guard_tokens(a) != _guard_tokens(b):
+        return 0.0
+    va, vb = _trigrams(a), _trigrams(b)
+    dot = sum(count * vb[gram] for gram, count in va.items())
+    norm = math.sqrt(sum(c * c for c in va.values())) * math.sqrt(sum(c * c for c in vb.values()))
+    return dot / norm if norm else 0.0
+
+
+def _digest(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def case_ttl(case_id: str) -> int:
+    per_case: Dict[str, int] = getattr(settings, "SIM_RESPONSE_CACHE_CASE_TTLS", {}) or {}
+    if case_id in per_case:
+        return int(per_case[case_id])
+    return int(getattr(settings, "SIM_RESPONSE_CACHE_TTL_SECONDS", 3600))
+
+
+class CacheSlot:
+    """Where one (case, prompt, history, utterance) response lives in Redis."""
+
+    def __init__(self, case_id: str, messages: List[Dict[str, str]]) -> None:
+        history_size = int(getattr(settings, "SIM_RESPONSE_CACHE_HISTORY_MESSAGES", 4))
+        # sim.prompt_layout: prefix (2), history..., session position, utterance.
+        system = messages[:2] + messages[-2:-1]
+        history = messages[2:-2][-history_size:] if history_size > 0 else []
+
+        self.case_id = case_id
+        self.ttl = case_ttl(case_id)
+        self.utterance = normalize_utterance(messages[-1]["content"])
+        self.bucket = (
+            f"{RESPONSE_CACHE_PREFIX}:{case_id}:{_digest(system)}:"
+            f"{_digest([[m['role'], normalize_utterance(m['content'])] for m in history])}"
+        )
+        self.key = f"{self.bucket}:{_digest(self.utterance)}"
+
+    @property
+    def index_key(self) -> str:
+        return f"{self.bucket}:index"
+
+
+def cache_slot(case_id: Optional[str], messages: List[Dict[str, str]]) -> Optional[CacheSlot]:
+    """Return the slot for this call, or None if caching does not apply."""
+
+    if not getattr(settings, "SIM_RESPONSE_CACHE_ENABLED", False) or not case_id:
+        return None
+    slot = CacheSlot(str(case_id), messages)
+    if slot.ttl <= 0 or not slot.utterance:
+        return None
+    return slot
+
+
+def lookup(slot: CacheSlot) -> Optional[Dict[str, Any]]:
+    """Return the cached response for `slot` (exact, then similar) or None."""
+
+    try:
+        client = get_redis_client()
+        raw = client.get(slot.key)
+        tier = "exact"
+        if raw is None:
+            tier = "similar"
+            raw = _lookup_similar(client, slot)
+    except redis.RedisError:
+        logger.warning("Sim response cache lookup failed", exc_info=True)
+        return None
+
+    if raw is None:
+        record("misses")
+        return None
+    record(f"{tier}_hits")
+    return json.loads(raw)
+
+
+def _lookup_similar(client: "redis.Redis", slot: CacheSlot) -> Optional[bytes]:
+    threshold = float(getattr(settings, "SIM_RESPONSE_CACHE_SIMILARITY", 0.0))
+    if threshold <= 0:
+        return None
+
+    best_key, best_score = None, threshold
+    for utterance, key in client.hgetall(slot.index_key).items():
+        score = similarity(slot.utterance, utterance.decode("utf-8"))
+        if score >= best_score:
+            best_key, best_score = key, score
+    if best_key is None:
+        return None
+    return client.get(best_key)
+
+
+def store(slot: CacheSlot, response: Dict[str, Any]) -> None:
+    """Cache `response` for the slot's TTL and index it for similar lookups."""
+
+    max_bucket = int(getattr(settings, "SIM_RESPONSE_CACHE_MAX_BUCKET", 500))
+    try:
+        client = get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        pipe.set(slot.key, json.dumps(response, ensure_ascii=False), ex=slot.ttl)
+        if client.hlen(slot.index_key) < max_bucket:
+            pipe.hset(slot.index_key, slot.utterance, slot.key)
+            pipe.expire(slot.index_key, slot.ttl)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning("Sim response cache store failed", exc_info=True)
+
+
+def record(counter: str) -> None:
+    """Bump one of exact_hits / similar_hits / misses / bypassed."""
+
+    try:
+        get_redis_client().hincrby(RESPONSE_CACHE_STATS_KEY, counter, 1)
+    except redis.RedisError:
+        logger.debug("Could not record sim response cache stats", exc_info=True)
+
+
+def stats() -> Dict[str, Any]:
+    """Return counters plus hit_rate and llm_calls_avoided.
+
+    Cache hits are exactly the LLM calls avoided; bypassed calls are not
+    counted as lookups.
+    """
+
+    raw = get_redis_client().hgetall(RESPONSE_CACHE_STATS_KEY)
+    counters = {k.decode(): int(v) for k, v in raw.items()}
+    return summarize(counters)
+
+
+def summarize(counters: Dict[str, int]) -> Dict[str, Any]:
+    """
+    >>> summarize({"exact_hits": 3, "similar_hits": 1, "misses": 4})["hit_rate"]
+    0.5
+    """
+
+    out: Dict[str, Any] = {
+        field: counters.get(field, 0)
+        for field in ("exact_hits", "similar_hits", "misses", "bypassed")
+    }
+    hits = out["exact_hits"] + out["similar_hits"]
+    lookups = hits + out["misses"]
+    out["llm_calls_avoided"] = hits
+    out["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+    return out
@@ -0,0 +1,362 @@
+"""Per-session simulation state in Redis.
+
+Each sim session lives in two keys that share one TTL
+(SIM_SESSION_TTL_SECONDS, refreshed on every turn):
+
+- `sim:session:{id}` (hash): case_id, the `owner` (pk of the user who
+  started the session), the current vitals `state_id`, the
+  current `stage`, the applied `update_vitals` log (JSON), the monitor values
+  when the state last changed (`vitals_from`, `vitals_changed_at`; see
+  sim.vitals), the versioned `client_state` for delta replies
+  (`client_state`, `client_version`; see sim.deltas), the rolling
+  history `summary`, the turn count, and one `resource:{name}` field per
+  resource served (see sim.state_store);
+- `sim:session:{id}:history` (list): the newest chat messages, oldest
+  first: at most SIM_SESSION_HISTORY_MESSAGES of them and
+  SIM_SESSION_HISTORY_TOKENS estimated tokens (ai.context_window).
+
+A turn costs two round-trips, one pipeline each: `load_session` (HSETNX
+owner + EXPIRE + HGETALL + LRANGE) before the GPT call and `record_turn`
+after it. They cannot be merged, since what `record_turn` writes depends on
+the model's reply. A session id reused for another case starts over:
+`load_session` clears it (one more round-trip, only on that switch). If
+Redis is down, the loaded state is `unavailable` and the views answer 503
+rather than run a turn they cannot check the owner of. When the history
+overflows, the messages about to be trimmed are folded into `summary` by
+the SIM_SESSION_SUMMARIZER hook before they are dropped.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+import redis
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from ai.context_window import fit_to_budget
+from sim.deltas import INITIAL_CLIENT_STATE, next_client_state
+from sim.live import encode_event, live_channel, turn_events
+from sim.state_store import (
+    RESOURCE_FIELD_PREFIX,
+    SESSION_OWNER_FIELD,
+    get_redis_client,
+    owner_matches,
+    session_history_key,
+    session_key,
+    session_ttl,
+)
+from sim.vitals import case_trajectory, values_at
+
+
+logger = logging.getLogger(__name__)
+
+# Only the most recent vitals changes are kept; older ones are history.
+VITALS_LOG_SIZE = 20
+
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+
+def extractive_summary(summary: str, dropped: List[Dict[str, str]]) -> str:
+    """Default SIM_SESSION_SUMMARIZER: append the dropped clinician lines.
+
+    Cheap and deterministic; swap in an LLM summarizer via the setting.
+
+    >>> extractive_summary("", [
+    ...     {"role": "user", "content": "Give oxygen."},
+    ...     {"role": "assistant", "content": "Oxygen is on."},
+    ... ])
+    'Earlier the clinician said: Give oxygen.'
+    >>> extractive_summary(
+    ...     "Earlier the clinician said: Give oxygen.",
+    ...     [{"role": "user", "content": "Start fluids."}],
+    ... )
+    'Earlier the clinician said: Give oxygen. | Start fluids.'
+    """
+
+    max_chars = int(getattr(settings, "SIM_SESSION_SUMMARY_MAX_CHARS", 1500))
+    said = [m["content"].strip() for m in dropped if m.get("role") == "user" and m.get("content")]
+    if not said:
+        return summary
+    if summary:
+        summary = f"{summary} | {' | '.join(said)}"
+    else:
+        summary = f"Earlier the clinician said: {' | '.join(said)}"
+    # Keep the newest part when over budget.
+    return summary if len(summary) <= max_chars else "…" + summary[-(max_chars - 1) :]
+
+
+@lru_cache(maxsize=1)
+def _summarizer() -> Summarizer:
+    return import_string(
+        getattr(settings, "SIM_SESSION_SUMMARIZER", "sim.session_state.extractive_summary")
+    )
+
+
+class SessionState:
+    """Snapshot of one session as loaded at the start of a turn."""
+
+    def __init__(
+        self,
+        session_id: str,
+        case_id: str = "",
+        owner: str = "",
+        state_id: str = "",
+        stage: str = "",
+        summary: str = "",
+        turn_count: int = 0,
+        history: Optional[List[Dict[str, str]]] = None,
+        vitals_log: Optional[List[Dict[str, Any]]] = None,
+        served_resources: Optional[Set[str]] = None,
+        vitals_from: Optional[List[float]] = None,
+        vitals_changed_at: float = 0.0,
+        client_state: Optional[Dict[str, Any]] = None,
+        client_version: int = 0,
+        unavailable: bool = False,
+    ) -> None:
+        self.session_id = session_id
+        self.case_id = case_id
+        self.owner = owner
+        self.state_id = state_id
+        self.stage = stage
+        self.summary = summary
+        self.turn_count = turn_count
+        self.history = history or []
+        self.vitals_log = vitals_log or []
+        self.served_resources = served_resources or set()
+        self.vitals_from = vitals_from
+        self.vitals_changed_at = vitals_changed_at
+        self.client_state = client_state or dict(INITIAL_CLIENT_STATE)
+        self.client_version = client_version
+        # Redis could not be read: nothing is known, not even the owner.
+        self.unavailable = unavailable
+
+    @property
+    def is_new(self) -> bool:
+        return self.turn_count == 0
+
+    def owned_by(self, user_id: object) -> bool:
+        return not self.unavailable and owner_matches(self.owner, user_id)
+
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """Chat messages to send to GPT: the rolling summary, then history."""
+
+        messages: List[Dict[str, str]] = []
+        if self.summary:
+            messages.append(
+                {"role": "system", "content": f"Session summary so far: {self.summary}"}
+            )
+        messages.extend(self.history)
+        return messages
+
+    def apply_to_primer(self, case_primer: Dict[str, Any]) -> Dict[str, Any]:
+        """Return a copy of `case_primer` positioned at this session's state.
+
+        Compiled primers are shared between requests, so nested values are
+        copied rather than modified.
+        """
+
+        if not self.state_id and not self.stage:
+            return case_primer
+        primer = dict(case_primer)
+        if self.state_id:
+            primer["state_roadmap"] = {
+                **(case_primer.get("state_roadmap") or {}),
+                "current_state_id": self.state_id,
+            }
+        if self.stage:
+            primer["current_stage"] = self.stage
+        return primer
+
+
+def load_session(
+    session_id: str, case_id: str = "", user_id: Optional[object] = None
+) -> SessionState:
+    """Fetch a session's state in one round-trip (empty if new).
+
+    With `user_id`, an unclaimed session is claimed for that user in the
+    same round-trip; check `owned_by` before using the result. A session
+    that was running a different case than `case_id` is cleared (state,
+    history, summary, served resources) and returned empty. If Redis cannot
+    be read the result is `unavailable` (and owned by no one).
+    """
+
+    key, history_key = session_key(session_id), session_history_key(session_id)
+    try:
+        client = get_redis_client()
+        pipe = client.pipeline(transaction=True)
+        if user_id is not None:
+            pipe.hsetnx(key, SESSION_OWNER_FIELD, str(user_id))
+            pipe.expire(key, session_ttl())
+        pipe.hgetall(key)
+        pipe.lrange(history_key, 0, -1)
+        *_, fields, raw_history = pipe.execute()
+
+        data = {k.decode(): v.decode() for k, v in fields.items()}
+        owner = data.get(SESSION_OWNER_FIELD, "")
+        if user_id is not None and not owner_matches(owner, user_id):
+            return SessionState(session_id, case_id=data.get("case_id", ""), owner=owner)
+        if case_id and data.get("case_id") and data["case_id"] != case_id:
+            logger.info(
+                "Sim session %s switched from case %s to %s; starting over",
+                session_id,
+                data["case_id"],
+                case_id,
+            )
+            pipe = client.pipeline(transaction=True)
+            pipe.delete(key, history_key)
+            if owner:
+                pipe.hset(key, SESSION_OWNER_FIELD, owner)
+                pipe.expire(key, session_ttl())
+            pipe.execute()
+            return SessionState(session_id, owner=owner)
+    except redis.RedisError:
+        logger.warning("Could not load sim session %s", session_id, exc_info=True)
+        return SessionState(session_id, unavailable=True)
+
+    return SessionState(
+        session_id,
+        case_id=data.get("case_id", ""),
+        owner=owner,
+        state_id=data.get("state_id", ""),
+        stage=data.get("stage", ""),
+        summary=data.get("summary", ""),
+        turn_count=int(data.get("turns", 0)),
+        history=[json.loads(m) for m in raw_history],
+        vitals_log=json.loads(data.get("vitals_log") or "[]"),
+        vitals_from=_load_vitals_from(data.get("vitals_from")),
+        vitals_changed_at=float(data.get("vitals_changed_at") or 0),
+        client_state=json.loads(data["client_state"]) if data.get("client_state") else None,
+        client_version=int(data.get("client_version") or 0),
+        served_resources={
+            k[len(RESOURCE_FIELD_PREFIX) :] for k in data if k.startswith(RESOURCE_FIELD_PREFIX)
+        },
+    )
+
+
+def load_monitor_state(session_id: str) -> SessionState:
+    """Just the fields the vitals monitor needs, in one HMGET."""
+
+    fields = ("case_id", SESSION_OWNER_FIELD, "state_id", "vitals_from", "vitals_changed_at")
+    try:
+        values = get_redis_client().hmget(session_key(session_id), fields)
+    except redis.RedisError:
+        logger.warning("Could not load vitals of sim session %s", session_id, exc_info=True)
+        return SessionState(session_id, unavailable=True)
+
+    data = {k: v.decode() for k, v in zip(fields, values) if v is not None}
+    return SessionState(
+        session_id,
+        case_id=data.get("case_id", ""),
+        owner=data.get(SESSION_OWNER_FIELD, ""),
+        state_id=data.get("state_id", ""),
+        vitals_from=_load_vitals_from(data.get("vitals_from")),
+        vitals_changed_at=float(data.get("vitals_changed_at") or 0),
+    )
+
+
+def _load_vitals_from(raw: Optional[str]) -> Optional[List[float]]:
+    # JSON has no NaN; unknown channels are stored as null.
+    if not raw:
+        return None
+    return [math.nan if v is None else float(v) for v in json.loads(raw)]
+
+
+def _dump_vitals_from(values: Sequence[float]) -> str:
+    return json.dumps([None if math.isnan(v) else round(v, 2) for v in values])
+
+
+def record_turn(
+    state: SessionState,
+    case_id: str,
+    utterance: str,
+    sim_result: Dict[str, Any],
+    case_primer: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Persist one completed turn and publish its live events, in a single
+    pipelined round-trip.
+
+    `state` is the snapshot returned by `load_session` for this turn; it is
+    used to know which history messages fall off the end (and need
+    summarizing) without reading them back from Redis.
+    """
+
+    session_id = state.session_id
+    new_messages = [{"role": "user", "content": utterance}]
+    speech = str(sim_result.get("speech_output") or "")
+    if speech:
+        new_messages.append({"role": "assistant", "content": speech})
+
+    mapping: Dict[str, Any] = {"case_id": case_id}
+    if state.is_new and case_primer is not None:
+        roadmap = case_primer.get("state_roadmap") or {}
+        mapping["state_id"] = roadmap.get("current_state_id") or ""
+        mapping["stage"] = case_primer.get("initial_stage") or ""
+
+    update_vitals = sim_result.get("update_vitals")
+    if isinstance(update_vitals, dict) and update_vitals.get("next_state_id"):
+        next_state_id = str(update_vitals["next_state_id"])
+        if next_state_id != state.state_id:
+            # Start the transition from whatever the monitor shows right now
+            # (without a primer there is nothing to ease from: snap).
+            now = time.time()
+            current = None
+            if case_primer is not None:
+                current_state_id = state.state_id or str(
+                    (case_primer.get("state_roadmap") or {}).get("current_state_id") or ""
+                )
+                current = values_at(
+                    case_trajectory(case_id, case_primer),
+                    current_state_id,
+                    state.vitals_from,
+                    state.vitals_changed_at,
+                    now,
+                )
+            mapping["vitals_from"] = _dump_vitals_from(current) if current is not None else ""
+            mapping["vitals_changed_at"] = f"{now:.3f}"
+        mapping["state_id"] = next_state_id
+        vitals_log = (state.vitals_log + [update_vitals])[-VITALS_LOG_SIZE:]
+        mapping["vitals_log"] = json.dumps(vitals_log, ensure_ascii=False)
+    if sim_result.get("advance_patient_state"):
+        mapping["stage"] = str(sim_result["advance_patient_state"])
+
+    mapping["client_state"] = json.dumps(
+        next_client_state(state.client_state, sim_result), ensure_ascii=False
+    )
+    mapping["client_version"] = state.client_version + 1
+
+    # Keep the newest messages that fit both SIM_SESSION_HISTORY_MESSAGES and
+    # SIM_SESSION_HISTORY_TOKENS (always this turn's); fold the rest into the summary.
+    history = state.history + new_messages
+    max_messages = max(2, int(getattr(settings, "SIM_SESSION_HISTORY_MESSAGES", 20)))
+    budget = int(getattr(settings, "SIM_SESSION_HISTORY_TOKENS", 1500))
+    keep = min(max_messages, fit_to_budget(history, budget, min_keep=len(new_messages)))
+    overflow = len(history) - keep
+    if overflow > 0:
+        dropped = history[:overflow]
+        try:
+            mapping["summary"] = _summarizer()(state.summary, dropped)
+        except Exception:  # a broken hook must not lose the turn
+            logger.exception("Session summarizer failed; dropping %d messages unsummarized", overflow)
+
+    ttl = session_ttl()
+    key, history_key = session_key(session_id), session_history_key(session_id)
+    try:
+        pipe = get_redis_client().pipeline(transaction=True)
+        pipe.hset(key, mapping=mapping)
+        pipe.hincrby(key, "turns", 1)
+        pipe.rpush(history_key, *(json.dumps(m, ensure_ascii=False) for m in new_messages))
+        pipe.ltrim(history_key, -keep, -1)
+        pipe.expire(key, ttl)
+        pipe.expire(history_key, ttl)
+        # Tell the session's live sockets (sim.live), wherever they are.
+        for event, data in turn_events(sim_result, state.state_id):
+            pipe.publish(live_channel(session_id), encode_event(event, data))
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning("Could not record turn for sim session %s", session_id, exc_info=True)
@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from sim.models import SimPrompt
+from sim.prompts import bump_prompt_version
+
+
+@receiver([post_save, post_delete], sender=SimPrompt, dispatch_uid="sim_prompt_version")
+def _prompt_changed(sender, **kwargs) -> None:
+    # After commit, so workers that reload right away see the new rows.
+    transaction.on_commit(bump_prompt_version)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import re
+import time
 from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import redis
 from django.conf import settings
@@ -13,24 +16,195 @@ def get_redis_client() -> "redis.Redis":
     return redis.from_url(settings.REDIS_URL)
 
 
-def _resource_key(session_id: str, resource: str) -> str:
-    return f"sim:{session_id}:resource:{resource}"
+# Served resources are fields of the session hash (see sim.session_state).
+RESOURCE_FIELD_PREFIX = "resource:"
+# The pk of the user who started the session; nobody else may use it.
+SESSION_OWNER_FIELD = "owner"
+
+
+def session_key(session_id: str) -> str:
+    return f"sim:session:{session_id}"
+
+
+def session_history_key(session_id: str) -> str:
+    return f"sim:session:{session_id}:history"
+
+
+def session_ttl() -> int:
+    return int(getattr(settings, "SIM_SESSION_TTL_SECONDS", 6 * 60 * 60))
+
+
+def session_identity(session_id: str) -> Tuple[str, str]:
+    """(case_id, owner) of a session, "" for whatever is not recorded yet."""
+
+    case_id, owner = get_redis_client().hmget(
+        session_key(session_id), ("case_id", SESSION_OWNER_FIELD)
+    )
+    return (case_id.decode() if case_id else "", owner.decode() if owner else "")
+
+
+def claim_session(session_id: str, user_id: object) -> bool:
+    """Claim an unclaimed session for `user_id`; whether `user_id` owns it.
+
+    One round-trip (HSETNX + EXPIRE + HGET), as in `load_session`.
+    """
+
+    key = session_key(session_id)
+    pipe = get_redis_client().pipeline(transaction=True)
+    pipe.hsetnx(key, SESSION_OWNER_FIELD, str(user_id))
+    pipe.expire(key, session_ttl())
+    pipe.hget(key, SESSION_OWNER_FIELD)
+    owner = pipe.execute()[-1]
+    return owner_matches(owner.decode() if owner else "", user_id)
+
+
+def owner_matches(owner: str, user_id: object) -> bool:
+    """Whether `user_id` may use a session owned by `owner` ("" = unclaimed).
+
+    >>> owner_matches("", 7), owner_matches("7", 7), owner_matches("7", 8)
+    (True, True, False)
+    """
+
+    return not owner or owner == str(user_id)
+
+
+def _resource_field(resource: str) -> str:
+    return f"{RESOURCE_FIELD_PREFIX}{resource}"
+
+
+def claim_resources(session_id: str, resources: Iterable[str]) -> List[str]:
+    """Atomically mark `resources` served; return the ones not served before.
+
+    One round-trip: a MULTI pipeline of HSETNX per resource plus the session
+    TTL refresh. Concurrent callers can never both claim the same resource.
+    """
+
+    wanted = list(dict.fromkeys(r for r in resources if r))
+    if not wanted:
+        return []
+
+    key = session_key(session_id)
+    pipe = get_redis_client().pipeline(transaction=True)
+    for resource in wanted:
+        pipe.hsetnx(key, _resource_field(resource), int(time.time()))
+    pipe.expire(key, session_ttl())
+    results = pipe.execute()
+    return [resource for resource, created in zip(wanted, results) if created]
+
+
+def release_resources(session_id: str, resources: Iterable[str]) -> None:
+    """Undo a claim (e.g. presigning failed) so the client can retry."""
+
+    fields = [_resource_field(r) for r in resources if r]
+    if fields:
+        get_redis_client().hdel(session_key(session_id), *fields)
+
+
+def served_resources(session_id: str) -> List[str]:
+    """Every resource already served in this session, sorted."""
+
+    fields = get_redis_client().hkeys(session_key(session_id))
+    prefix = RESOURCE_FIELD_PREFIX.encode()
+    return sorted(f[len(prefix) :].decode() for f in fields if f.startswith(prefix))
+
+
+def have_resources_been_served(session_id: str, resources: Iterable[str]) -> Dict[str, bool]:
+    """Bulk `has_resource_been_served` in one HMGET."""
+
+    wanted = list(dict.fromkeys(resources))
+    if not wanted:
+        return {}
+    fields = [_resource_field(r) for r in wanted]
+    values = get_redis_client().hmget(session_key(session_id), fields)
+    return {resource: value is not None for resource, value in zip(wanted, values)}
 
 
 def has_resource_been_served(session_id: str, resource: str) -> bool:
     """Return True if the resource has already been served for this session."""
 
-    client = get_redis_client()
-    return bool(client.exists(_resource_key(session_id, resource)))
+    return have_resources_been_served(session_id, [resource])[resource]
 
 
 def mark_resource_served(session_id: str, resource: str) -> None:
-    """Mark a resource as served for this session.
+    """Mark a resource as served for this session (expires with the session)."""
+
+    claim_resources(session_id, [resource])
+
 
-    A TTL could be added here in the future to expire old sessions.
+# Key families under sim:*, most specific first. `expires` says whether keys
+# of that family are supposed to carry a TTL; ones that don't are "stale".
+KEY_FAMILIES = (
+    ("session_history", re.compile(r"^sim:session:[^:]+:history$"), True),
+    ("session", re.compile(r"^sim:session:[^:]+$"), True),
+    ("response_cache", re.compile(r"^sim:respcache:.+:"), True),
+    ("response_cache_stats", re.compile(r"^sim:respcache:stats$"), False),
+    ("case_versions", re.compile(r"^sim:cases:"), False),
+    ("prompt_version", re.compile(r"^sim:prompts:version$"), False),
+    ("llm_usage", re.compile(r"^sim:llm:usage$"), False),
+    ("turn_counter", re.compile(r"^sim:turns:"), True),
+    ("import_sources", re.compile(r"^sim:import:source:"), False),
+    # Pre-session-hash layout: one key per served resource, never expired.
+    ("legacy_resource", re.compile(r"^sim:[^:]+:resource:.+$"), True),
+)
+
+
+def _key_family(key: str) -> Tuple[str, bool]:
+    """
+    >>> _key_family("sim:session:abc"), _key_family("sim:abc:resource:ekg")
+    (('session', True), ('legacy_resource', True))
     """
 
-    client = get_redis_client()
-    client.set(_resource_key(session_id, resource), "1")
+    for name, pattern, expires in KEY_FAMILIES:
+        if pattern.match(key):
+            return name, expires
+    return "other", True
+
 
+def sweep_report(
+    expire_stale: Optional[int] = None, batch_size: int = 500
+) -> Dict[str, Dict[str, int]]:
+    """Scan `sim:*` and report key count / bytes per family.
 
+    `stale` counts keys of families that should expire but carry no TTL
+    (e.g. keys written before TTLs existed). With `expire_stale`, those keys
+    are given that TTL (seconds) as they are found. Uses SCAN plus pipelined
+    TTL / MEMORY USAGE, so it is safe to run against a live server.
+    """
+
+    client = get_redis_client()
+    report: Dict[str, Dict[str, int]] = {}
+
+    def flush(keys: List[bytes]) -> None:
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+            pipe.memory_usage(key)
+        results = pipe.execute(raise_on_error=False)
+
+        expire = client.pipeline(transaction=False)
+        for i, key in enumerate(keys):
+            ttl, size = results[2 * i], results[2 * i + 1]
+            size = size if isinstance(size, int) else 0
+            family, expires = _key_family(key.decode())
+            row = report.setdefault(
+                family, {"keys": 0, "bytes": 0, "stale_keys": 0, "stale_bytes": 0}
+            )
+            row["keys"] += 1
+            row["bytes"] += size
+            if expires and ttl == -1:
+                row["stale_keys"] += 1
+                row["stale_bytes"] += size
+                if expire_stale:
+                    expire.expire(key, expire_stale)
+        if expire_stale:
+            expire.execute()
+
+    batch: List[bytes] = []
+    for key in client.scan_iter(match="sim:*", count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return report
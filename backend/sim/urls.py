@@ -1,11 +1,30 @@
 from django.urls import path
 
-from sim import views
+from sim import async_views, views
 
 
 urlpatterns = [
+    path("cases/", views.case_list_view, name="sim-case-list"),
     path("respond/", views.sim_respond_view, name="sim-respond"),
+    # Served by the async view: under ASGI a sync generator would be buffered
+    # in full before the first event is sent.
+    path(
+        "respond/stream/",
+        async_views.async_sim_respond_stream_view,
+        name="sim-respond-stream",
+    ),
     path("trigger-resource/", views.trigger_resource_view, name="sim-trigger-resource"),
+    path("trigger-resources/", views.trigger_resources_view, name="sim-trigger-resources"),
+    path("served-resources/", views.served_resources_view, name="sim-served-resources"),
+    path("vitals/", views.vitals_view, name="sim-vitals"),
+    path("vitals/stream/", async_views.async_vitals_stream_view, name="sim-vitals-stream"),
+    path("async/respond/", async_views.async_sim_respond_view, name="sim-async-respond"),
+    # Alias of respond/stream/, kept for clients of the ASGI-native URLs.
+    path(
+        "async/respond/stream/",
+        async_views.async_sim_respond_stream_view,
+        name="sim-async-respond-stream",
+    ),
 ]
 
 
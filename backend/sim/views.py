@@ -1,9 +1,8 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
-import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 from django.conf import settings
 from rest_framework import status
@@ -13,13 +12,27 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 
 from sim.ai_bridge import get_sim_ai_response
+from sim.assets import presigned_get_url
+from sim.case_library import InvalidCursor, list_cases
 from sim.cases import build_case_primer
-from sim.resources import S3_RESOURCE_MAP, infer_resource_type
-from sim.state_store import has_resource_been_served, mark_resource_served
+from sim.deltas import merge_patch, next_client_state
+from sim.resources import case_resources, resolve_resource
+from sim.session_state import SessionState, load_monitor_state, load_session, record_turn
+from sim.state_store import (
+    claim_resources,
+    owner_matches,
+    release_resources,
+    served_resources,
+    session_identity,
+)
+from sim.vitals import case_trajectory, monitor_frame, sanitize_state_changes
 
 
 logger = logging.getLogger(__name__)
 
+SESSION_FORBIDDEN = "This session belongs to another user."
+SESSION_UNAVAILABLE = "Session state is temporarily unavailable; try again shortly."
+
 
 def _get_session_id_from_payload(data: Dict[str, Any]) -> str:
     from uuid import uuid4
@@ -30,6 +43,18 @@ def _get_session_id_from_payload(data: Dict[str, Any]) -> str:
     return session_id
 
 
+def _use_response_cache(data: Dict[str, Any]) -> bool:
+    """False when the client sent `"bypass_cache": true` for this turn."""
+
+    return str(data.get("bypass_cache") or "").strip().lower() not in ("1", "true", "yes")
+
+
+def _prompt_cohort(data: Dict[str, Any]) -> str:
+    """The learner cohort the client sent, for prompt selection (sim.prompts)."""
+
+    return str(data.get("cohort") or "").strip()[:64]
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def sim_respond_view(request: Request) -> Response:
@@ -39,7 +64,10 @@ def sim_respond_view(request: Request) -> Response:
       {
         "session_id": "uuid-or-token",
         "case_id": "case_12",
-        "utterance": "Clinician's spoken text"
+        "utterance": "Clinician's spoken text",
+        "bypass_cache": false,  // optional, skip the sim response cache
+        "ack": 3,               // optional, delta replies (see sim.deltas)
+        "cohort": "pgy1"        // optional, selects cohort-scoped SimPrompts
       }
     """
 
@@ -55,11 +83,17 @@ def sim_respond_view(request: Request) -> Response:
 
     session_id = _get_session_id_from_payload(payload)
 
-    case_primer = build_case_primer(case_id)
-    available_resources: List[str] = case_primer.get("available_resources", [])
+    session = load_session(session_id, case_id, request.user.pk)
+    if session.unavailable:
+        return Response(
+            {"detail": SESSION_UNAVAILABLE}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    if not session.owned_by(request.user.pk):
+        return Response({"detail": SESSION_FORBIDDEN}, status=status.HTTP_403_FORBIDDEN)
+    case_primer = session.apply_to_primer(build_case_primer(case_id))
+    available_resources: List[str] = list(case_primer.get("available_resources", []))
 
-    # TODO: optionally load/store a conversation_history for this session
-    conversation_history: List[Dict[str, str]] = []
+    conversation_history: List[Dict[str, str]] = session.conversation_history()
 
     try:
         sim_result = get_sim_ai_response(
@@ -67,6 +101,8 @@ def sim_respond_view(request: Request) -> Response:
             case_context=case_primer,
             available_resources=available_resources,
             conversation_history=conversation_history,
+            use_cache=_use_response_cache(payload),
+            cohort=_prompt_cohort(payload),
         )
     except Exception as exc:  # pragma: no cover - network dependent
         logger.exception("Simulation GPT call failed")
@@ -75,32 +111,75 @@ def sim_respond_view(request: Request) -> Response:
             status=status.HTTP_502_BAD_GATEWAY,
         )
 
+    sim_result = _checked_state_changes(case_id, case_primer, sim_result)
+    record_turn(session, case_id, utterance, sim_result, case_primer)
     return Response(
-        {
-            "session_id": session_id,
-            "case_id": case_id,
-            "speech_output": sim_result.get("speech_output", ""),
-            "action_triggers": sim_result.get("action_triggers", []),
+        _sim_response_payload(session_id, case_id, sim_result, session, _client_ack(payload))
+    )
+
+
+def _checked_state_changes(
+    case_id: str, case_primer: Dict[str, Any], sim_result: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Drop update_vitals / advance_patient_state the case cannot honour."""
+
+    return sanitize_state_changes(sim_result, case_trajectory(case_id, case_primer))
+
+
+def _client_ack(data: Dict[str, Any]) -> Optional[int]:
+    """The `ack` a delta-aware client sent (None: it wants full replies)."""
+
+    if "ack" not in data:
+        return None
+    try:
+        return int(data.get("ack") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _sim_response_payload(
+    session_id: str,
+    case_id: str,
+    sim_result: Dict[str, Any],
+    session: Optional[SessionState] = None,
+    ack: Optional[int] = None,
+) -> Dict[str, Any]:
+    payload = {
+        "session_id": session_id,
+        "case_id": case_id,
+        "speech_output": sim_result.get("speech_output", ""),
+        "action_triggers": sim_result.get("action_triggers", []),
+        "patient_voice": sim_result.get("patient_voice"),
+        "hint": sim_result.get("hint"),
+    }
+    if session is None or ack is None:
+        return {
+            **payload,
             "ui_updates": sim_result.get("ui_updates", {}),
             "advance_patient_state": sim_result.get("advance_patient_state"),
             "update_vitals": sim_result.get("update_vitals"),
-            "patient_voice": sim_result.get("patient_voice"),
-            "hint": sim_result.get("hint"),
         }
-    )
-
 
-def _get_s3_client():
-    return boto3.client("s3")
+    # Delta reply (sim.deltas): the client state as a merge patch against
+    # the version the client acknowledged, or in full if it is out of date.
+    state = next_client_state(session.client_state, sim_result)
+    payload["v"] = session.client_version + 1
+    if ack == session.client_version:
+        payload["base"] = ack
+        payload["patch"] = merge_patch(session.client_state, state)
+    else:
+        payload["state"] = state
+    return payload
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def trigger_resource_view(request: Request) -> Response:
-    """GET /api/trigger-resource/?session_id=...&resource=...
+    """GET /api/trigger-resource/?session_id=...&resource=...[&case_id=...]
 
     Returns a presigned S3 URL for the given resource if it has not already
-    been served for this session.
+    been served for this session. Resources come from the session's case;
+    `case_id`, if given, must match it.
     """
 
     session_id = str(request.query_params.get("session_id") or "").strip()
@@ -112,20 +191,21 @@ def trigger_resource_view(request: Request) -> Response:
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    if resource not in S3_RESOURCE_MAP:
+    session_case, owner = session_identity(session_id)
+    if not owner_matches(owner, request.user.pk):
+        return Response({"detail": SESSION_FORBIDDEN}, status=status.HTTP_403_FORBIDDEN)
+
+    case_id, error = _resource_case_id(request.query_params, session_case)
+    if error:
+        return Response({"detail": error}, status=status.HTTP_400_BAD_REQUEST)
+
+    resolved = resolve_resource(case_id, resource)
+    if resolved is None:
         return Response(
             {"detail": f"Unknown resource '{resource}'."},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    if has_resource_been_served(session_id, resource):
-        return Response(
-            {
-                "resource": resource,
-                "already_served": True,
-            }
-        )
-
     bucket_name = getattr(settings, "ERSIM_ASSETS_BUCKET", "") or ""
     if not bucket_name:
         return Response(
@@ -133,31 +213,238 @@ def trigger_resource_view(request: Request) -> Response:
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-    s3_key = S3_RESOURCE_MAP[resource]
-    s3 = _get_s3_client()
+    # Claim first (atomic HSETNX) so two concurrent requests can't both serve it.
+    if not claim_resources(session_id, [resource]):
+        return Response(
+            {
+                "resource": resource,
+                "already_served": True,
+            }
+        )
+
+    s3_key, resource_type = resolved
 
     try:
-        presigned_url = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket_name, "Key": s3_key},
-            ExpiresIn=600,
-        )
+        presigned_url = presigned_get_url(bucket_name, s3_key)
     except (ClientError, BotoCoreError) as exc:  # pragma: no cover - network dependent
         logger.exception("Failed to generate S3 presigned URL")
+        # Give the claim back, so we don't block a retry if S3 errors.
+        release_resources(session_id, [resource])
         return Response(
             {"detail": f"Error generating resource URL: {exc}"},
             status=status.HTTP_502_BAD_GATEWAY,
         )
 
-    # Only now mark as served, so we don't block a retry if S3 errors.
-    mark_resource_served(session_id, resource)
-
     return Response(
         {
             "resource": resource,
             "s3_url": presigned_url,
-            "resource_type": infer_resource_type(s3_key),
+            "resource_type": resource_type,
         }
     )
 
 
+def _resource_case_id(data: Any, session_case: str) -> Tuple[str, str]:
+    """The case to serve resources from, or an error message.
+
+    Always the session's own case; a `case_id` in the request may only
+    repeat it.
+
+    >>> _resource_case_id({}, "GAST0001"), _resource_case_id({"case_id": "RESP0002"}, "GAST0001")
+    (('GAST0001', ''), ('', "'case_id' does not match this session's case."))
+    """
+
+    if not session_case:
+        return "", "No sim turn has been recorded for this session yet."
+    requested = str(data.get("case_id") or "").strip()
+    if requested and requested != session_case:
+        return "", "'case_id' does not match this session's case."
+    return session_case, ""
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def trigger_resources_view(request: Request) -> Response:
+    """POST /api/sim/trigger-resources/
+
+    Batch form of trigger-resource for everything one sim turn unlocked.
+
+    Input JSON (either list works; `action_triggers` is the sim response's):
+      {
+        "session_id": "abc123",
+        "case_id": "GAST0001",   // optional, must match the session's case
+        "action_triggers": [{"type": "resource_request", "resource": "ekg"}, ...],
+        "resources": ["chest_xray"]   // a bare string counts as one resource
+      }
+
+    Returns one entry per distinct resource, in request order, each shaped
+    like a trigger-resource reply, or `{"resource", "error"}` for that
+    resource alone (unknown resource, signing failure).
+    """
+
+    payload = request.data
+    session_id = str(payload.get("session_id") or "").strip()
+
+    resources = payload.get("resources") or []
+    if isinstance(resources, str):
+        resources = [resources]
+    triggers = payload.get("action_triggers") or []
+    if not isinstance(resources, list) or not isinstance(triggers, list):
+        return Response(
+            {"detail": "'resources' and 'action_triggers' must be lists."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    requested: List[str] = [str(r).strip() for r in resources]
+    for trigger in triggers:
+        if isinstance(trigger, dict) and trigger.get("type") == "resource_request":
+            requested.append(str(trigger.get("resource") or "").strip())
+    requested = list(dict.fromkeys(r for r in requested if r))
+
+    if not session_id or not requested:
+        return Response(
+            {"detail": "'session_id' and at least one resource are required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    bucket_name = getattr(settings, "ERSIM_ASSETS_BUCKET", "") or ""
+    if not bucket_name:
+        return Response(
+            {"detail": "ERSIM_ASSETS_BUCKET is not configured on the server."},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    session_case, owner = session_identity(session_id)
+    if not owner_matches(owner, request.user.pk):
+        return Response({"detail": SESSION_FORBIDDEN}, status=status.HTTP_403_FORBIDDEN)
+
+    case_id, error = _resource_case_id(payload, session_case)
+    if error:
+        return Response({"detail": error}, status=status.HTTP_400_BAD_REQUEST)
+
+    index = case_resources(case_id)
+    claimed = set(claim_resources(session_id, [r for r in requested if r in index]))
+
+    results: List[Dict[str, Any]] = []
+    failed: List[str] = []
+    for resource in requested:
+        if resource not in index:
+            results.append({"resource": resource, "error": f"Unknown resource '{resource}'."})
+            continue
+        if resource not in claimed:
+            results.append({"resource": resource, "already_served": True})
+            continue
+
+        s3_key, resource_type = index[resource]
+        try:
+            presigned_url = presigned_get_url(bucket_name, s3_key)
+        except (ClientError, BotoCoreError) as exc:  # pragma: no cover - network dependent
+            logger.exception("Failed to generate S3 presigned URL")
+            failed.append(resource)
+            results.append(
+                {"resource": resource, "error": f"Error generating resource URL: {exc}"}
+            )
+            continue
+        results.append(
+            {
+                "resource": resource,
+                "s3_url": presigned_url,
+                "resource_type": resource_type,
+            }
+        )
+
+    if failed:
+        release_resources(session_id, failed)
+
+    return Response({"session_id": session_id, "resources": results})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def served_resources_view(request: Request) -> Response:
+    """GET /api/sim/served-resources/?session_id=...
+
+    Every resource already served in this session, so a reconnecting client
+    can restore its UI without replaying trigger-resource calls.
+    """
+
+    session_id = str(request.query_params.get("session_id") or "").strip()
+    if not session_id:
+        return Response(
+            {"detail": "'session_id' query param is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if not owner_matches(session_identity(session_id)[1], request.user.pk):
+        return Response({"detail": SESSION_FORBIDDEN}, status=status.HTTP_403_FORBIDDEN)
+
+    return Response({"session_id": session_id, "resources": served_resources(session_id)})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def case_list_view(request: Request) -> Response:
+    """GET /api/sim/cases/?q=&series=&difficulty=&cursor=&limit=
+
+    Case library listing: compact rows (no raw_row) ordered by case_id,
+    keyset-paginated via `next_cursor`. `series` and `difficulty` may be
+    repeated; `q` is a full-text search over titles, complaint and diagnosis.
+    """
+
+    params = request.query_params
+    try:
+        limit = int(params["limit"]) if params.get("limit") else None
+    except ValueError:
+        return Response(
+            {"detail": "'limit' must be an integer."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        page = list_cases(
+            search=str(params.get("q") or "").strip(),
+            series=[s for s in params.getlist("series") if s],
+            difficulty=[d for d in params.getlist("difficulty") if d],
+            cursor=params.get("cursor") or None,
+            limit=limit,
+        )
+    except InvalidCursor:
+        return Response(
+            {"detail": "Invalid 'cursor'."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    return Response({"results": page.results, "next_cursor": page.next_cursor})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def vitals_view(request: Request) -> Response:
+    """GET /api/sim/vitals/?session_id=...
+
+    The monitor values right now, interpolated server-side (see sim.vitals).
+    For continuous updates use /api/sim/vitals/stream/.
+    """
+
+    session_id = str(request.query_params.get("session_id") or "").strip()
+    if not session_id:
+        return Response(
+            {"detail": "'session_id' query param is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    session = load_monitor_state(session_id)
+    if session.unavailable:
+        return Response(
+            {"detail": SESSION_UNAVAILABLE}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    if not session.owned_by(request.user.pk):
+        return Response({"detail": SESSION_FORBIDDEN}, status=status.HTTP_403_FORBIDDEN)
+
+    frame = monitor_frame(session)
+    if frame is None:
+        return Response(
+            {"detail": "No vitals for this session yet."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return Response({"session_id": session_id, **frame})
@@ -0,0 +1,307 @@
+"""Server-side vitals engine: compiled trajectories and interpolated frames.
+
+A case's vitals roadmap (`Monitor_Vital_Signs_*` columns, see
+`sim.cases.build_state_roadmap`) is compiled once per case version into a
+`Trajectory`: one fixed-width float row per state, with the channels below.
+Values missing from a state are carried over from the previous one (or the
+next one, for leading gaps).
+
+The session only stores where the monitor was when the last state change
+happened (`vitals_from`, `vitals_changed_at` in `sim:session:{id}`, written
+by `sim.session_state.record_turn`). Every frame after that is computed on
+demand: the values ease from `vitals_from` to the current state over
+SIM_VITALS_TRANSITION_SECONDS. The monitor can therefore update several
+times a second (`/api/sim/vitals/stream/`) without a GPT turn or any Redis
+writes. A change in the middle of a transition starts from the values
+on screen, so the monitor never jumps.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+import time
+from array import array
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from sim.case_cache import VersionedLRUCache, case_versions
+from sim.cases import build_case_primer
+
+
+logger = logging.getLogger(__name__)
+
+# Channel order of every compiled row.
+CHANNELS = ("hr", "sbp", "dbp", "rr", "temp", "spo2")
+
+# Authored vitals key -> channel (BP is split into sbp/dbp).
+_AUTHORED_KEYS = {"HR": "hr", "RR": "rr", "Temp": "temp", "SpO2": "spo2"}
+
+# Decimal places per channel in frames.
+_PRECISION = {"hr": 0, "sbp": 0, "dbp": 0, "rr": 0, "temp": 1, "spo2": 0}
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_DURATION = re.compile(
+    r"^\s*(\d+(?:\.\d+)?)\s*(s|sec|secs|seconds?|m|min|mins|minutes?)?\s*$", re.IGNORECASE
+)
+
+NAN = float("nan")
+
+MAX_STAGE_LENGTH = 64
+
+
+class Trajectory(NamedTuple):
+    state_ids: Tuple[str, ...]
+    # One row of len(CHANNELS) floats per state, NaN where nothing is known.
+    rows: Tuple[array, ...]
+    # Seconds between monitor frames (authored update frequency or default).
+    frame_seconds: float
+
+    def row(self, state_id: str) -> Optional[array]:
+        try:
+            return self.rows[self.state_ids.index(state_id)]
+        except ValueError:
+            return None
+
+
+_trajectories: VersionedLRUCache[str, Trajectory] = VersionedLRUCache(
+    maxsize=getattr(settings, "SIM_PRIMER_CACHE_SIZE", 512),
+)
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, bool) or value is None:
+        return NAN
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    return float(match.group()) if match else NAN
+
+
+def parse_frame_seconds(value: Any) -> Optional[float]:
+    """Parse an authored update frequency ("5 seconds", "30s", "1 min").
+
+    >>> parse_frame_seconds("5 seconds"), parse_frame_seconds("30s"), parse_frame_seconds("1 min")
+    (5.0, 30.0, 60.0)
+    >>> parse_frame_seconds("when needed") is None
+    True
+    """
+
+    match = _DURATION.match(str(value or ""))
+    if not match:
+        return None
+    seconds = float(match.group(1))
+    if (match.group(2) or "s").lower().startswith("m"):
+        seconds *= 60
+    return seconds if seconds > 0 else None
+
+
+def _vitals_row(vitals: Mapping[str, Any]) -> array:
+    row = array("d", [NAN] * len(CHANNELS))
+    for key, channel in _AUTHORED_KEYS.items():
+        row[CHANNELS.index(channel)] = _number(vitals.get(key))
+    systolic, _, diastolic = str(vitals.get("BP") or "").partition("/")
+    row[CHANNELS.index("sbp")] = _number(systolic)
+    row[CHANNELS.index("dbp")] = _number(diastolic)
+    return row
+
+
+def compile_trajectory(roadmap: Mapping[str, Any]) -> Trajectory:
+    """Compile a `state_roadmap` (as in case primers) into numeric rows.
+
+    >>> t = compile_trajectory({"states": [
+    ...     {"id": "Initial_Vitals", "vitals": {"HR": 118, "BP": "92/58", "SpO2": 91}},
+    ...     {"id": "State1_Vitals", "vitals": {"HR": "100 bpm", "RR": 20}},
+    ... ], "vitals_update_frequency": "5 seconds"})
+    >>> t.state_ids, t.frame_seconds
+    (('Initial_Vitals', 'State1_Vitals'), 5.0)
+    >>> list(t.row("State1_Vitals"))
+    [100.0, 92.0, 58.0, 20.0, nan, 91.0]
+    >>> list(t.row("Initial_Vitals"))
+    [118.0, 92.0, 58.0, 20.0, nan, 91.0]
+    """
+
+    state_ids: List[str] = []
+    rows: List[array] = []
+    for state in roadmap.get("states") or ():
+        vitals = state.get("vitals")
+        if not state.get("id") or not isinstance(vitals, Mapping):
+            continue
+        state_ids.append(str(state["id"]))
+        rows.append(_vitals_row(vitals))
+
+    # Fill gaps: forward from the previous state, then backward for leading ones.
+    for i in range(1, len(rows)):
+        rows[i] = array("d", (p if math.isnan(v) else v for v, p in zip(rows[i], rows[i - 1])))
+    for i in range(len(rows) - 2, -1, -1):
+        rows[i] = array("d", (n if math.isnan(v) else v for v, n in zip(rows[i], rows[i + 1])))
+
+    default = float(getattr(settings, "SIM_VITALS_FRAME_SECONDS", 1.0))
+    frame_seconds = parse_frame_seconds(roadmap.get("vitals_update_frequency")) or default
+    return Trajectory(tuple(state_ids), tuple(rows), frame_seconds)
+
+
+def case_trajectory(case_id: str, case_primer: Mapping[str, Any]) -> Trajectory:
+    """The compiled trajectory of a case, cached per case version.
+
+    `case_primer` (from `build_case_primer`) is only read on a cache miss.
+    """
+
+    version = case_versions.version_for(case_id)
+    return _trajectories.get_or_load(
+        case_id, version, lambda: compile_trajectory(case_primer.get("state_roadmap") or {})
+    )
+
+
+def _smoothstep(t: float) -> float:
+    t = min(1.0, max(0.0, t))
+    return t * t * (3 - 2 * t)
+
+
+def interpolate(start: Sequence[float], target: Sequence[float], progress: float) -> array:
+    """Ease every channel from `start` to `target` (NaN starts snap to target).
+
+    >>> list(interpolate([100, NAN], [120, 95], 0.5))
+    [110.0, 95.0]
+    >>> list(interpolate([100, 90], [120, 95], 1.0))
+    [120.0, 95.0]
+    """
+
+    eased = _smoothstep(progress)
+    return array(
+        "d",
+        (g if math.isnan(s) else s + (g - s) * eased for s, g in zip(start, target)),
+    )
+
+
+def transition_seconds() -> float:
+    return max(0.001, float(getattr(settings, "SIM_VITALS_TRANSITION_SECONDS", 30.0)))
+
+
+def values_at(
+    trajectory: Trajectory,
+    state_id: str,
+    start: Optional[Sequence[float]],
+    changed_at: float,
+    now: float,
+) -> Optional[array]:
+    """Monitor values at `now` for a session heading to `state_id`."""
+
+    target = trajectory.row(state_id)
+    if target is None:
+        return None
+    if not start or len(start) != len(CHANNELS) or not changed_at:
+        return target
+    return interpolate(start, target, (now - changed_at) / transition_seconds())
+
+
+def _rounded(row: Sequence[float]) -> Dict[str, Optional[float]]:
+    out: Dict[str, Optional[float]] = {}
+    for channel, value in zip(CHANNELS, row):
+        # (+ 0.0 turns -0.0 into 0.0)
+        out[channel] = None if math.isnan(value) else round(value, _PRECISION[channel]) + 0.0
+    return out
+
+
+def build_frame(
+    trajectory: Trajectory,
+    state_id: str,
+    start: Optional[Sequence[float]],
+    changed_at: float,
+    now: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """One monitor frame: values, per-frame deltas and transition progress.
+
+    >>> t = compile_trajectory({"states": [
+    ...     {"id": "A", "vitals": {"HR": 100, "BP": "120/80"}},
+    ...     {"id": "B", "vitals": {"HR": 140, "BP": "90/60"}},
+    ... ]})
+    >>> frame = build_frame(t, "B", list(t.row("A")), changed_at=1000.0, now=1015.0)
+    >>> frame["vitals"]["hr"], frame["vitals"]["bp"], frame["progress"]
+    (120.0, '105/70', 0.5)
+    >>> frame["deltas"]["hr"] > 0
+    True
+    """
+
+    now = time.time() if now is None else now
+    current = values_at(trajectory, state_id, start, changed_at, now)
+    if current is None:
+        return None
+    previous = values_at(trajectory, state_id, start, changed_at, now - trajectory.frame_seconds)
+    vitals = _rounded(current)
+    deltas = _rounded(array("d", (c - p for c, p in zip(current, previous))))
+    sbp, dbp = vitals.pop("sbp"), vitals.pop("dbp")
+    vitals["bp"] = f"{sbp:.0f}/{dbp:.0f}" if sbp is not None and dbp is not None else None
+
+    progress = 1.0
+    if start and changed_at:
+        progress = min(1.0, max(0.0, (now - changed_at) / transition_seconds()))
+    return {
+        "state_id": state_id,
+        "vitals": vitals,
+        "deltas": deltas,
+        "progress": round(progress, 3),
+        "at": round(now, 3),
+        "frame_seconds": trajectory.frame_seconds,
+    }
+
+
+def session_trajectory(session: Any) -> Optional[Tuple[Trajectory, str]]:
+    """`(trajectory, current state_id)` of a `sim.session_state.SessionState`
+    (None before its first turn)."""
+
+    if not session.case_id:
+        return None
+    case_primer = session.apply_to_primer(build_case_primer(session.case_id))
+    state_id = session.state_id or str(
+        (case_primer.get("state_roadmap") or {}).get("current_state_id") or ""
+    )
+    return case_trajectory(session.case_id, case_primer), state_id
+
+
+def monitor_frame(session: Any) -> Optional[Dict[str, Any]]:
+    """The current frame of a session (None before its first turn)."""
+
+    found = session_trajectory(session)
+    if found is None:
+        return None
+    trajectory, state_id = found
+    return build_frame(trajectory, state_id, session.vitals_from, session.vitals_changed_at)
+
+
+def sanitize_state_changes(sim_result: Dict[str, Any], trajectory: Trajectory) -> Dict[str, Any]:
+    """Drop model-proposed state changes that the case cannot honour.
+
+    `update_vitals.next_state_id` must name one of the case's states and
+    `advance_patient_state` must be a short string; anything else becomes
+    None. Returns a copy when something changed (results may be cached).
+
+    >>> t = compile_trajectory({"states": [{"id": "A", "vitals": {"HR": 90}}]})
+    >>> sanitize_state_changes(
+    ...     {"update_vitals": {"next_state_id": "State9_Vitals"}, "advance_patient_state": 3}, t
+    ... )
+    {'update_vitals': None, 'advance_patient_state': None}
+    """
+
+    update_vitals = sim_result.get("update_vitals")
+    stage = sim_result.get("advance_patient_state")
+    clean_vitals = update_vitals
+    if update_vitals is not None and (
+        not isinstance(update_vitals, dict)
+        or str(update_vitals.get("next_state_id") or "") not in trajectory.state_ids
+    ):
+        logger.info("Ignoring update_vitals outside the case's roadmap: %r", update_vitals)
+        clean_vitals = None
+    clean_stage = stage
+    valid_stage = isinstance(stage, str) and 0 < len(stage.strip()) <= MAX_STAGE_LENGTH
+    if stage is not None and not valid_stage:
+        logger.info("Ignoring invalid advance_patient_state: %r", stage)
+        clean_stage = None
+    elif isinstance(stage, str):
+        clean_stage = stage.strip()
+
+    if clean_vitals is update_vitals and clean_stage == stage:
+        return sim_result
+    return {**sim_result, "update_vitals": clean_vitals, "advance_patient_state": clean_stage}
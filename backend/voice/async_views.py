@@ -0,0 +1,391 @@
+import asyncio
+import logging
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponseBase, JsonResponse, StreamingHttpResponse
+from rest_framework import status
+
+from ai.reasoning import abuild_reasoning_gpt, astream_reasoning_gpt
+from ai.streaming import SentenceSplitter, format_sse
+from ersim_backend.async_api import async_api_view
+from voice.audio_responses import (
+    AUDIO_MEDIA_TYPE,
+    MULTIPART_MEDIA_TYPE,
+    accepts,
+    aiter_multipart_audio,
+    multipart_content_type,
+    new_boundary,
+)
+from voice.views import (
+    _load_session_context,
+    _save_turn,
+    aopen_speech_stream_elevenlabs,
+    asynthesize_speech_elevenlabs,
+    atranscribe_audio_file,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _get_or_create_session_id(request: HttpRequest) -> str:
+    session_id = request.data.get("session_id") or request.GET.get("session_id")
+    if not session_id:
+        session_id = uuid.uuid4().hex[:32]
+    return session_id
+
+
+@async_api_view(["POST"])
+async def async_transcribe_view(request: HttpRequest) -> HttpResponseBase:
+    """POST /api/voice/async/transcribe
+
+    ASGI-native twin of /api/voice/transcribe.
+    """
+
+    uploaded = request.FILES.get("audio")
+    if not uploaded:
+        return JsonResponse(
+            {"detail": "Missing 'audio' file in request."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        result = await atranscribe_audio_file(uploaded)
+    except Exception as exc:  # pragma: no cover - network dependent
+        logger.exception("Whisper transcription failed")
+        return JsonResponse(
+            {"detail": f"Transcription error: {exc}"},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
+
+    return JsonResponse(
+        {
+            "transcript": result["transcript"],
+            "language": result.get("language"),
+            "duration_sec": result.get("duration_sec"),
+        }
+    )
+
+
+@async_api_view(["POST"])
+async def async_respond_view(request: HttpRequest) -> HttpResponseBase:
+    """POST /api/voice/async/respond
+
+    ASGI-native twin of /api/voice/respond.
+    """
+
+    transcript = request.data.get("transcript", "").strip()
+    if not transcript:
+        return JsonResponse(
+            {"detail": "Missing 'transcript' in request body."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    user = request.user
+    session_id = _get_or_create_session_id(request)
+    context = await sync_to_async(_load_session_context)(user, session_id)
+
+    try:
+        result = await abuild_reasoning_gpt(transcript, context)
+    except Exception as exc:  # pragma: no cover - network dependent
+        logger.exception("GPT reasoning failed")
+        return JsonResponse(
+            {"detail": f"Reasoning error: {exc}"},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
+
+    assistant_text = result["assistant_text"]
+    reasoning = result["reasoning"]
+
+    next_index = await sync_to_async(_save_turn)(user, session_id, transcript, reasoning)
+
+    return JsonResponse(
+        {
+            "reasoning": reasoning,
+            "assistant_text": assistant_text,
+            "session_id": session_id,
+            "turn_id": next_index,
+        }
+    )
+
+
+@async_api_view(["POST"])
+async def async_speak_view(request: HttpRequest) -> HttpResponseBase:
+    """POST /api/voice/speak (alias: /api/voice/async/speak)
+
+    Input JSON:
+      { "assistant_text": "..." }
+
+    Returns speech audio as base64 along with the text, or, with
+    `Accept: audio/mpeg`, the raw MP3 streamed straight from ElevenLabs.
+    """
+
+    assistant_text = request.data.get("assistant_text", "").strip()
+    if not assistant_text:
+        return JsonResponse(
+            {"detail": "Missing 'assistant_text' in request body."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if accepts(request.headers.get("Accept", ""), AUDIO_MEDIA_TYPE):
+        try:
+            audio_chunks = await aopen_speech_stream_elevenlabs(assistant_text)
+        except Exception as exc:  # pragma: no cover - network dependent
+            logger.exception("ElevenLabs synthesis failed")
+            return JsonResponse(
+                {"detail": f"TTS error: {exc}"},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
+        return StreamingHttpResponse(audio_chunks, content_type=AUDIO_MEDIA_TYPE)
+
+    try:
+        audio_base64 = await asynthesize_speech_elevenlabs(assistant_text)
+    except Exception as exc:  # pragma: no cover - network dependent
+        logger.exception("ElevenLabs synthesis failed")
+        return JsonResponse(
+            {"detail": f"TTS error: {exc}"},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
+
+    return JsonResponse(
+        {
+            "audio_base64": audio_base64,
+            "format": "mp3",
+            "assistant_text": assistant_text,
+        }
+    )
+
+
+@async_api_view(["POST"])
+async def async_full_pipeline_view(request: HttpRequest) -> HttpResponseBase:
+    """POST /api/voice/full (alias: /api/voice/async/full)
+
+    Pipeline: audio → Whisper → GPT → ElevenLabs → JSON payload.
+
+    With `Accept: multipart/mixed` the reply is a JSON metadata part (the
+    same fields minus audio_base64) followed by the raw MP3 part, relayed
+    from ElevenLabs as it arrives.
+    """
+
+    uploaded = request.FILES.get("audio")
+    if not uploaded:
+        return JsonResponse(
+            {"detail": "Missing 'audio' file in request."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        transcription = await atranscribe_audio_file(uploaded)
+    except Exception as exc:  # pragma: no cover - network dependent
+        logger.exception("Whisper transcription failed in full pipeline")
+        return JsonResponse(
+            {"detail": f"Transcription error: {exc}"},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
+
+    transcript = transcription["transcript"]
+    user = request.user
+    session_id = _get_or_create_session_id(request)
+    context = await sync_to_async(_load_session_context)(user, session_id)
+
+    try:
+        reasoning_result = await abuild_reasoning_gpt(transcript, context)
+    except Exception as exc:  # pragma: no cover - network dependent
+        logger.exception("GPT reasoning failed in full pipeline")
+        return JsonResponse(
+            {"detail": f"Reasoning error: {exc}"},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
+
+    assistant_text = reasoning_result["assistant_text"]
+    reasoning = reasoning_result["reasoning"]
+
+    if accepts(request.headers.get("Accept", ""), MULTIPART_MEDIA_TYPE):
+        # Saved first: once the upstream TTS response is open, nothing may
+        # fail before it is handed to the streaming response that closes it.
+        next_index = await sync_to_async(_save_turn)(user, session_id, transcript, reasoning)
+        try:
+            audio_chunks = await aopen_speech_stream_elevenlabs(assistant_text)
+        except Exception as exc:  # pragma: no cover - network dependent
+            logger.exception("ElevenLabs synthesis failed in full pipeline")
+            return JsonResponse(
+                {"detail": f"TTS error: {exc}"},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
+
+        boundary = new_boundary()
+        metadata = {
+            "transcript": transcript,
+            "reasoning": reasoning,
+            "assistant_text": assistant_text,
+            "format": "mp3",
+            "session_id": session_id,
+            "turn_id": next_index,
+        }
+        return StreamingHttpResponse(
+            aiter_multipart_audio(boundary, metadata, audio_chunks),
+            content_type=multipart_content_type(boundary),
+        )
+
+    try:
+        audio_base64 = await asynthesize_speech_elevenlabs(assistant_text)
+    except Exception as exc:  # pragma: no cover - network dependent
+        logger.exception("ElevenLabs synthesis failed in full pipeline")
+        return JsonResponse(
+            {"detail": f"TTS error: {exc}"},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
+
+    next_index = await sync_to_async(_save_turn)(user, session_id, transcript, reasoning)
+
+    return JsonResponse(
+        {
+            "transcript": transcript,
+            "reasoning": reasoning,
+            "assistant_text": assistant_text,
+            "audio_base64": audio_base64,
+            "session_id": session_id,
+            "turn_id": next_index,
+        }
+    )
+
+
+@async_api_view(["POST"])
+async def async_full_pipeline_stream_view(request: HttpRequest) -> HttpResponseBase:
+    """POST /api/voice/async/full/stream
+
+    Pipelined variant of /api/voice/full. The GPT reply is streamed, split
+    into sentences as it arrives, and each sentence is sent to ElevenLabs as
+    soon as it is complete, so TTS overlaps with generation. The reply is a
+    `text/event-stream`:
+
+      event: transcript  {"transcript", "session_id"}
+      event: text        {"delta": "next slice of assistant_text"}
+      event: audio       {"seq", "text", "audio_base64", "format": "mp3"}, in order
+      event: done        {"reasoning", "assistant_text", "session_id", "turn_id"}
+      event: error       {"detail": "..."}
+    """
+
+    uploaded = request.FILES.get("audio")
+    if not uploaded:
+        return JsonResponse(
+            {"detail": "Missing 'audio' file in request."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        transcription = await atranscribe_audio_file(uploaded)
+    except Exception as exc:  # pragma: no cover - network dependent
+        logger.exception("Whisper transcription failed in pipelined full pipeline")
+        return JsonResponse(
+            {"detail": f"Transcription error: {exc}"},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
+
+    transcript = transcription["transcript"]
+    user = request.user
+    session_id = _get_or_create_session_id(request)
+    context = await sync_to_async(_load_session_context)(user, session_id)
+
+    async def event_stream() -> AsyncIterator[str]:
+        yield format_sse("transcript", {"transcript": transcript, "session_id": session_id})
+
+        # Producer feeds ("text", delta), ("audio", (seq, sentence, task)) and
+        # finally ("done", result) / ("error", exc) into the queue.
+        queue: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+        pending_audio: Deque[Tuple[int, str, "asyncio.Task[str]"]] = deque()
+
+        async def produce() -> None:
+            splitter = SentenceSplitter()
+            seq = 0
+
+            async def start_tts(sentence: str) -> None:
+                nonlocal seq
+                task = asyncio.create_task(asynthesize_speech_elevenlabs(sentence))
+                await queue.put(("audio", (seq, sentence, task)))
+                seq += 1
+
+            try:
+                async for kind, value in astream_reasoning_gpt(transcript, context):
+                    if kind == "text":
+                        await queue.put(("text", value))
+                        for sentence in splitter.feed(value):
+                            await start_tts(sentence)
+                    else:
+                        for sentence in splitter.flush():
+                            await start_tts(sentence)
+                        await queue.put(("done", value))
+            except Exception as exc:  # pragma: no cover - network dependent
+                await queue.put(("error", exc))
+
+        producer = asyncio.create_task(produce())
+        next_item: "Optional[asyncio.Task[Tuple[str, Any]]]" = None
+        result: Optional[Dict[str, Any]] = None
+
+        try:
+            while True:
+                # Emit finished audio strictly in sentence order.
+                while pending_audio and pending_audio[0][2].done():
+                    seq, sentence, task = pending_audio.popleft()
+                    yield format_sse(
+                        "audio",
+                        {"seq": seq, "text": sentence, "audio_base64": task.result(), "format": "mp3"},
+                    )
+
+                if result is not None and not pending_audio:
+                    break
+
+                waiters = set()
+                if result is None:
+                    if next_item is None:
+                        next_item = asyncio.create_task(queue.get())
+                    waiters.add(next_item)
+                if pending_audio:
+                    waiters.add(pending_audio[0][2])
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+
+                if next_item is not None and next_item.done():
+                    kind, value = next_item.result()
+                    next_item = None
+                    if kind == "text":
+                        yield format_sse("text", {"delta": value})
+                    elif kind == "audio":
+                        pending_audio.append(value)
+                    elif kind == "done":
+                        result = value
+                    else:
+                        logger.error("GPT reasoning failed in pipelined full pipeline: %s", value)
+                        yield format_sse("error", {"detail": f"Reasoning error: {value}"})
+                        return
+
+            assistant_text = result["assistant_text"]
+            reasoning = result["reasoning"]
+            next_index = await sync_to_async(_save_turn)(user, session_id, transcript, reasoning)
+
+            yield format_sse(
+                "done",
+                {
+                    "reasoning": reasoning,
+                    "assistant_text": assistant_text,
+                    "session_id": session_id,
+                    "turn_id": next_index,
+                },
+            )
+        except Exception as exc:  # pragma: no cover - network dependent
+            logger.exception("ElevenLabs synthesis failed in pipelined full pipeline")
+            yield format_sse("error", {"detail": f"TTS error: {exc}"})
+        finally:
+            # Client went away or something failed: stop paying for upstream calls.
+            producer.cancel()
+            if next_item is not None:
+                next_item.cancel()
+            for _, _, task in pending_audio:
+                task.cancel()
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
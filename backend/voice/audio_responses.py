@@ -0,0 +1,88 @@
+"""Binary audio responses for the voice endpoints.
+
+Clients opt in through the Accept header; anything else keeps getting the
+original JSON with `audio_base64`:
+
+- `Accept: audio/mpeg` on /speak returns the MP3 bytes as the body.
+- `Accept: multipart/mixed` on /full returns a two-part body: a small JSON
+  part with the turn metadata, then the `audio/mpeg` part.
+
+In both cases the audio is relayed chunk-by-chunk from the ElevenLabs
+response, so it is never fully buffered, base64-encoded or JSON-serialized.
+The bodies are async iterators: under ASGI Django would collect a sync
+iterator in full before sending the first byte.
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional
+
+
+AUDIO_MEDIA_TYPE = "audio/mpeg"
+MULTIPART_MEDIA_TYPE = "multipart/mixed"
+AUDIO_CHUNK_SIZE = 16 * 1024
+
+
+def accepts(accept_header: Optional[str], media_type: str) -> bool:
+    """Return True if the Accept header explicitly lists `media_type`.
+
+    >>> accepts("audio/mpeg, application/json;q=0.5", "audio/mpeg")
+    True
+    >>> accepts("*/*", "audio/mpeg")
+    False
+    """
+
+    for item in (accept_header or "").split(","):
+        if item.split(";")[0].strip().lower() == media_type:
+            return True
+    return False
+
+
+def new_boundary() -> str:
+    return f"ersim-{uuid.uuid4().hex}"
+
+
+def multipart_content_type(boundary: str) -> str:
+    return f'{MULTIPART_MEDIA_TYPE}; boundary="{boundary}"'
+
+
+def _json_part(boundary: str, metadata: Dict[str, Any]) -> bytes:
+    body = json.dumps(metadata).encode("utf-8")
+    return (
+        f"--{boundary}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode("ascii") + body + b"\r\n"
+
+
+def _audio_part_header(boundary: str) -> bytes:
+    return f"--{boundary}\r\nContent-Type: {AUDIO_MEDIA_TYPE}\r\n\r\n".encode("ascii")
+
+
+def _closing(boundary: str) -> bytes:
+    return f"\r\n--{boundary}--\r\n".encode("ascii")
+
+
+async def aiter_multipart_audio(
+    boundary: str, metadata: Dict[str, Any], audio_chunks: AsyncIterator[bytes]
+) -> AsyncIterator[bytes]:
+    """Yield a multipart/mixed body: JSON metadata part, then the audio part.
+
+    >>> import asyncio
+    >>> async def body(chunks):
+    ...     return b"".join([part async for part in aiter_multipart_audio("B", {"turn_id": 1}, chunks)])
+    >>> async def audio():
+    ...     for chunk in (b"ID3", b"..."):
+    ...         yield chunk
+    >>> asyncio.run(body(audio()))
+    b'--B\\r\\nContent-Type: application/json\\r\\nContent-Length: 14\\r\\n\\r\\n{"turn_id": 1}\\r\\n--B\\r\\nContent-Type: audio/mpeg\\r\\n\\r\\nID3...\\r\\n--B--\\r\\n'
+    """
+
+    yield _json_part(boundary, metadata)
+    yield _audio_part_header(boundary)
+    async for chunk in audio_chunks:
+        if chunk:
+            yield chunk
+    yield _closing(boundary)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import requests
+from django.core.management.base import BaseCommand, CommandParser
+
+from ai.http_client import post
+from sim.cases import case_script_lines
+from sim.models import SimCase
+from voice.tts_cache import get_tts_cache
+from voice.views import _tts_request, speech_cache_key
+
+
+class Command(BaseCommand):
+    help = (
+        "Synthesize every scripted line of the given cases into the TTS cache "
+        "ahead of a class session, so the first learner does not wait on ElevenLabs."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "case_ids",
+            nargs="*",
+            help="Case IDs (Case_Organization_Case_ID) to pre-warm.",
+        )
+
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Pre-warm every imported case.",
+        )
+
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the lines and whether they are cached without calling ElevenLabs.",
+        )
+
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Number of ElevenLabs requests in flight (default: 4).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        case_ids: List[str] = options["case_ids"]
+        dry_run: bool = bool(options["dry_run"])
+
+        qs = SimCase.objects.all()
+        if not options["all"]:
+            if not case_ids:
+                self.stderr.write(self.style.ERROR("Pass one or more case IDs, or --all."))
+                return
+            qs = qs.filter(case_id__in=case_ids)
+            missing = set(case_ids) - set(qs.values_list("case_id", flat=True))
+            for case_id in sorted(missing):
+                self.stderr.write(self.style.WARNING(f"Case {case_id!r} not found; skipping."))
+
+        cache = get_tts_cache()
+        todo: List[Tuple[str, str]] = []
+        seen = set()
+        cached = 0
+
+        for case_id, raw_row in qs.values_list("case_id", "raw_row"):
+            lines = case_script_lines(raw_row or {})
+            self.stdout.write(f"{case_id}: {len(lines)} scripted line(s)")
+            for line in lines:
+                key = speech_cache_key(line)
+                if cache.lookup(key, record=False) is not None:
+                    cached += 1
+                    continue
+                if key in seen:
+                    continue
+                seen.add(key)
+                todo.append((key, line))
+                if dry_run:
+                    self.stdout.write(f"  [DRY-RUN] Would synthesize: {line[:80]}")
+
+        if dry_run:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Dry-run complete. {cached} already cached, {len(todo)} to synthesize."
+                )
+            )
+            return
+
+        def synthesize(item: Tuple[str, str]) -> Tuple[str, Exception | None]:
+            key, line = item
+            try:
+                cache.store(key, post(**_tts_request(line)).content)
+            except (requests.RequestException, RuntimeError) as exc:
+                return line, exc
+            return line, None
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options["concurrency"])) as pool:
+            for line, exc in pool.map(synthesize, todo):
+                if exc is None:
+                    self.stdout.write(self.style.SUCCESS(f"  Cached: {line[:80]}"))
+                else:
+                    failed += 1
+                    self.stderr.write(self.style.WARNING(f"  Failed: {line[:80]}: {exc}"))
+
+        # S3 uploads run in the background; don't exit before they land.
+        cache.flush()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Pre-warm complete. {cached} already cached, "
+                f"{len(todo) - failed} synthesized, {failed} failed."
+            )
+        )
@@ -0,0 +1,336 @@
+"""Content-addressed cache for synthesized speech.
+
+Audio is keyed by sha256(voice_id, model_id, text) and looked up in three
+tiers, fastest first:
+
+- memory: a per-process LRU bounded by TTS_CACHE_MEMORY_BYTES;
+- disk:   TTS_CACHE_DIR, shared by the workers on one box;
+- S3:     `<TTS_CACHE_S3_PREFIX><key>.mp3` in ERSIM_ASSETS_BUCKET, shared by all.
+
+A hit in a slower tier is copied into the faster ones. On a miss the caller
+synthesizes and `store`s the audio; the S3 upload and the Redis metrics run
+on a background thread so neither delays the response. A failing tier is
+logged and treated as a miss, never as an error.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import redis
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+
+from sim.assets import get_s3_client
+from sim.state_store import get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+# Cluster-wide counters (HINCRBY), summed over every worker.
+TTS_CACHE_STATS_KEY = "voice:tts_cache:stats"
+
+TIERS = ("memory", "disk", "s3")
+
+
+def tts_cache_key(text: str, voice_id: str, model_id: str) -> str:
+    """Return the content address for `text` spoken by `voice_id`/`model_id`.
+
+    >>> tts_cache_key("Hello", "v1", "m1") == tts_cache_key("Hello", "v1", "m1")
+    True
+    >>> tts_cache_key("Hello", "v1", "m1") == tts_cache_key("Hello", "v2", "m1")
+    False
+    """
+
+    payload = json.dumps([voice_id, model_id, text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _MemoryTier:
+    """Thread-safe LRU bounded by total bytes rather than entry count.
+
+    >>> tier = _MemoryTier(max_bytes=10)
+    >>> tier.put("a", b"12345"); tier.put("b", b"12345"); tier.put("c", b"1")
+    >>> tier.get("a") is None, tier.get("b"), tier.size
+    (True, b'12345', 6)
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+            return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = audio
+            self.size += len(audio)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _DiskTier:
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.mp3"
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, audio: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so other workers never read a partial file.
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(audio)
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+
+class _S3Tier:
+    def __init__(self, bucket: str, prefix: str) -> None:
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = get_s3_client()
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}.mp3"
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            obj = self._client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return obj["Body"].read()
+
+    def put(self, key: str, audio: bytes) -> None:
+        self._client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Body=audio,
+            ContentType="audio/mpeg",
+        )
+
+
+class TTSCache:
+    def __init__(
+        self,
+        memory_bytes: int,
+        directory: str = "",
+        bucket: str = "",
+        s3_prefix: str = "tts-cache/",
+    ) -> None:
+        self._memory = _MemoryTier(memory_bytes)
+        self._disk = _DiskTier(directory) if directory else None
+        self._s3 = _S3Tier(bucket, s3_prefix) if bucket else None
+
+        self._counters: Dict[str, int] = {}
+        self._counters_lock = threading.Lock()
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tts-cache")
+        self._pending: "set[Future]" = set()
+
+    # -- lookups -----------------------------------------------------------
+
+    def lookup(self, key: str, record: bool = True) -> Optional[bytes]:
+        """Return cached audio for `key`, or None; counts a hit or a miss."""
+
+        tier, audio = self._lookup_memory(key)
+        if audio is None:
+            tier, audio = self._lookup_shared(key)
+        if record:
+            self._record(tier, audio)
+        return audio
+
+    async def alookup(self, key: str) -> Optional[bytes]:
+        """Async `lookup`: memory is checked inline, disk/S3 off the loop."""
+
+        tier, audio = self._lookup_memory(key)
+        if audio is None:
+            tier, audio = await asyncio.to_thread(self._lookup_shared, key)
+        self._record(tier, audio)
+        return audio
+
+    def _lookup_memory(self, key: str):
+        return "memory", self._memory.get(key)
+
+    def _lookup_shared(self, key: str):
+        for tier in ("disk", "s3"):
+            backend = self._disk if tier == "disk" else self._s3
+            if backend is None:
+                continue
+            try:
+                audio = backend.get(key)
+            except (OSError, BotoCoreError, ClientError):
+                logger.warning("TTS cache %s read failed for %s", tier, key, exc_info=True)
+                continue
+            if audio is not None:
+                self._memory.put(key, audio)
+                if tier == "s3":
+                    self._write(self._disk, "disk", key, audio)
+                return tier, audio
+        return None, None
+
+    # -- writes ------------------------------------------------------------
+
+    def store(self, key: str, audio: bytes) -> None:
+        """Write freshly synthesized audio to every tier (S3 in the background)."""
+
+        if not audio:
+            return
+        self._memory.put(key, audio)
+        self._write(self._disk, "disk", key, audio)
+        if self._s3 is not None:
+            self._submit(self._write, self._s3, "s3", key, audio)
+
+    async def astore(self, key: str, audio: bytes) -> None:
+        if not audio:
+            return
+        self._memory.put(key, audio)
+        if self._disk is not None:
+            await asyncio.to_thread(self._write, self._disk, "disk", key, audio)
+        if self._s3 is not None:
+            self._submit(self._write, self._s3, "s3", key, audio)
+
+    @staticmethod
+    def _write(backend, tier: str, key: str, audio: bytes) -> None:
+        if backend is None:
+            return
+        try:
+            backend.put(key, audio)
+        except (OSError, BotoCoreError, ClientError):
+            logger.warning("TTS cache %s write failed for %s", tier, key, exc_info=True)
+
+    def get_or_synthesize(self, key: str, synthesize: Callable[[], bytes]) -> bytes:
+        audio = self.lookup(key)
+        if audio is None:
+            audio = synthesize()
+            self.store(key, audio)
+        return audio
+
+    async def aget_or_synthesize(
+        self, key: str, synthesize: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        audio = await self.alookup(key)
+        if audio is None:
+            audio = await synthesize()
+            await self.astore(key, audio)
+        return audio
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait for pending background S3 uploads and metric writes."""
+
+        wait(list(self._pending), timeout=timeout)
+
+    def _submit(self, fn, *args) -> None:
+        future = self._background.submit(fn, *args)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    # -- metrics -----------------------------------------------------------
+
+    def _record(self, tier: Optional[str], audio: Optional[bytes]) -> None:
+        if audio is None:
+            deltas = {"misses": 1}
+        else:
+            deltas = {f"{tier}_hits": 1, "bytes_saved": len(audio)}
+        with self._counters_lock:
+            for field, amount in deltas.items():
+                self._counters[field] = self._counters.get(field, 0) + amount
+        self._submit(self._record_cluster, deltas)
+
+    @staticmethod
+    def _record_cluster(deltas: Dict[str, int]) -> None:
+        try:
+            pipe = get_redis_client().pipeline(transaction=False)
+            for field, amount in deltas.items():
+                pipe.hincrby(TTS_CACHE_STATS_KEY, field, amount)
+            pipe.execute()
+        except redis.RedisError:
+            logger.debug("Could not record TTS cache stats in Redis", exc_info=True)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return this worker's counters and the cluster-wide totals."""
+
+        with self._counters_lock:
+            process = _with_totals(dict(self._counters))
+        process["memory_entries"] = len(self._memory)
+        process["memory_bytes"] = self._memory.size
+
+        try:
+            raw = get_redis_client().hgetall(TTS_CACHE_STATS_KEY)
+            cluster: Optional[Dict[str, int]] = _with_totals(
+                {k.decode(): int(v) for k, v in raw.items()}
+            )
+        except redis.RedisError:
+            logger.warning("Could not read TTS cache stats from Redis", exc_info=True)
+            cluster = None
+
+        return {"process": process, "cluster": cluster}
+
+
+def _with_totals(counters: Dict[str, int]) -> Dict[str, int]:
+    """Fill in every counter plus `hits` and `lookups`.
+
+    >>> _with_totals({"disk_hits": 3, "misses": 1})["hits"]
+    3
+    """
+
+    fields: List[str] = [f"{tier}_hits" for tier in TIERS] + ["misses", "bytes_saved"]
+    totals = {field: counters.get(field, 0) for field in fields}
+    totals["hits"] = sum(totals[f"{tier}_hits"] for tier in TIERS)
+    totals["lookups"] = totals["hits"] + totals["misses"]
+    return totals
+
+
+@lru_cache(maxsize=1)
+def get_tts_cache() -> TTSCache:
+    """Return the process-wide TTSCache configured from settings."""
+
+    bucket = ""
+    if getattr(settings, "TTS_CACHE_S3_ENABLED", True):
+        bucket = getattr(settings, "ERSIM_ASSETS_BUCKET", "") or ""
+
+    return TTSCache(
+        memory_bytes=getattr(settings, "TTS_CACHE_MEMORY_BYTES", 64 * 1024 * 1024),
+        directory=getattr(settings, "TTS_CACHE_DIR", ""),
+        bucket=bucket,
+        s3_prefix=getattr(settings, "TTS_CACHE_S3_PREFIX", "tts-cache/"),
+    )
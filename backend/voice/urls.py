@@ -1,11 +1,24 @@
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
 
 urlpatterns = [
     path("transcribe", views.transcribe_view, name="voice-transcribe"),
     path("respond", views.respond_view, name="voice-respond"),
-    path("speak", views.speak_view, name="voice-speak"),
-    path("full", views.full_pipeline_view, name="voice-full"),
+    # Served by the async views: their audio/mpeg and multipart/mixed bodies
+    # are relayed as they arrive, which a sync iterator under ASGI is not.
+    path("speak", async_views.async_speak_view, name="voice-speak"),
+    path("full", async_views.async_full_pipeline_view, name="voice-full"),
+    path("tts-cache/stats", views.tts_cache_stats_view, name="voice-tts-cache-stats"),
+    path("async/transcribe", async_views.async_transcribe_view, name="voice-async-transcribe"),
+    path("async/respond", async_views.async_respond_view, name="voice-async-respond"),
+    # Aliases of speak and full, kept for clients of the ASGI-native URLs.
+    path("async/speak", async_views.async_speak_view, name="voice-async-speak"),
+    path("async/full", async_views.async_full_pipeline_view, name="voice-async-full"),
+    path(
+        "async/full/stream",
+        async_views.async_full_pipeline_stream_view,
+        name="voice-async-full-stream",
+    ),
 ]
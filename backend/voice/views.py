@@ -2,22 +2,30 @@ import base64
 import logging
 import os
 import uuid
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
-import requests
+import httpx
 from django.conf import settings
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from ai.reasoning import build_reasoning_gpt
-from sessions.models import ConversationTurn
+from ai.http_client import apost, apost_stream, post
+from ai.reasoning import OPENAI_API_BASE, build_reasoning_gpt
+from sessions.context import load_session_context
+from sessions.turns import append_turn
+from voice.audio_responses import AUDIO_CHUNK_SIZE
+from voice.tts_cache import get_tts_cache, tts_cache_key
 
 
 logger = logging.getLogger(__name__)
 
+ELEVENLABS_API_BASE = os.environ.get(
+    "ELEVENLABS_API_BASE", "https://api.elevenlabs.io/v1"
+).rstrip("/")
+
 
 def _get_openai_api_key() -> str:
     key = os.environ.get("WHISPER_API_KEY") or os.environ.get("OPENAI_API_KEY")
@@ -32,29 +40,37 @@ def transcribe_audio_file(uploaded_file) -> Dict[str, Any]:
     Returns a dict: { 'transcript': str, 'language': str | None, 'duration_sec': float | None }
     """
 
+    resp = post(**_transcription_request(uploaded_file))
+    return _parse_transcription(resp.json())
+
+
+async def atranscribe_audio_file(uploaded_file) -> Dict[str, Any]:
+    """Async variant of `transcribe_audio_file` using the pooled async client."""
+
+    resp = await apost(**_transcription_request(uploaded_file))
+    return _parse_transcription(resp.json())
+
+
+def _transcription_request(uploaded_file) -> Dict[str, Any]:
     api_key = _get_openai_api_key()
-    url = "https://api.openai.com/v1/audio/transcriptions"
 
     file_name = getattr(uploaded_file, "name", "audio.m4a")
     content_type = getattr(uploaded_file, "content_type", "application/octet-stream")
 
-    files = {
-        "file": (file_name, uploaded_file.read(), content_type),
-    }
-    data = {
-        "model": "whisper-1",
-        "response_format": "json",
+    return {
+        "url": f"{OPENAI_API_BASE}/audio/transcriptions",
+        "headers": {"Authorization": f"Bearer {api_key}"},
+        "files": {
+            "file": (file_name, uploaded_file.read(), content_type),
+        },
+        "data": {
+            "model": "whisper-1",
+            "response_format": "json",
+        },
     }
 
-    resp = requests.post(
-        url,
-        headers={"Authorization": f"Bearer {api_key}"},
-        files=files,
-        data=data,
-        timeout=60,
-    )
-    resp.raise_for_status()
-    payload = resp.json()
+
+def _parse_transcription(payload: Dict[str, Any]) -> Dict[str, Any]:
     transcript = payload.get("text", "").strip()
 
     return {
@@ -71,31 +87,130 @@ def _get_elevenlabs_api_key() -> str:
     return key
 
 
+def _tts_voice() -> Tuple[str, str]:
+    # Default voice/ model can be overridden via env
+    voice_id = os.environ.get("ELEVENLABS_VOICE_ID", "EXAVITQu4vr4xnSDxMaL")
+    model_id = os.environ.get("ELEVENLABS_MODEL_ID", "eleven_multilingual_v2")
+    return voice_id, model_id
+
+
+def speech_cache_key(text: str) -> str:
+    """Return the TTS cache key for `text` in the configured voice/model."""
+
+    return tts_cache_key(text, *_tts_voice())
+
+
+def synthesize_speech_bytes(text: str) -> bytes:
+    """Return MP3 bytes for `text`, from the TTS cache or ElevenLabs."""
+
+    return get_tts_cache().get_or_synthesize(
+        speech_cache_key(text), lambda: post(**_tts_request(text)).content
+    )
+
+
+async def asynthesize_speech_bytes(text: str) -> bytes:
+    """Async variant of `synthesize_speech_bytes`."""
+
+    async def synthesize() -> bytes:
+        resp = await apost(**_tts_request(text))
+        return resp.content
+
+    return await get_tts_cache().aget_or_synthesize(speech_cache_key(text), synthesize)
+
+
 def synthesize_speech_elevenlabs(text: str) -> str:
-    """Call ElevenLabs TTS and return base64-encoded audio bytes."""
+    """Call ElevenLabs TTS (through the TTS cache) and return base64 audio."""
+
+    return base64.b64encode(synthesize_speech_bytes(text)).decode("utf-8")
+
+
+async def asynthesize_speech_elevenlabs(text: str) -> str:
+    """Async variant of `synthesize_speech_elevenlabs`."""
+
+    return base64.b64encode(await asynthesize_speech_bytes(text)).decode("utf-8")
+
+
+async def aopen_speech_stream_elevenlabs(text: str) -> AsyncIterator[bytes]:
+    """Return an async iterator over the MP3 chunks for `text`.
+
+    Cache hits are served from the TTS cache. Otherwise the ElevenLabs
+    request is started here, so upstream errors are raised before a response
+    is committed. The relayed audio is cached once it has been fully read.
+    """
 
+    key = speech_cache_key(text)
+    cached = await get_tts_cache().alookup(key)
+    if cached is not None:
+        return _aiter_chunks(cached)
+    return _arelay_audio(await apost_stream(**_tts_request(text)), key)
+
+
+def _iter_chunks(audio: bytes) -> Iterator[bytes]:
+    for start in range(0, len(audio), AUDIO_CHUNK_SIZE):
+        yield audio[start : start + AUDIO_CHUNK_SIZE]
+
+
+async def _aiter_chunks(audio: bytes) -> AsyncIterator[bytes]:
+    for chunk in _iter_chunks(audio):
+        yield chunk
+
+
+class _AudioBuffer:
+    """The relayed audio, kept for the TTS cache up to TTS_CACHE_MAX_ENTRY_BYTES.
+
+    Past the limit the chunks are dropped and the audio is not cached, so a
+    long reply costs no more memory than a short one.
+    """
+
+    def __init__(self) -> None:
+        self.max_bytes = int(getattr(settings, "TTS_CACHE_MAX_ENTRY_BYTES", 2 * 1024 * 1024))
+        self.chunks: Optional[List[bytes]] = []
+        self.size = 0
+
+    def add(self, chunk: bytes) -> None:
+        if self.chunks is None:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.chunks = None
+        else:
+            self.chunks.append(chunk)
+
+    def audio(self) -> Optional[bytes]:
+        return None if self.chunks is None else b"".join(self.chunks)
+
+
+async def _arelay_audio(upstream: httpx.Response, key: str) -> AsyncIterator[bytes]:
+    buffer = _AudioBuffer()
+    try:
+        async for chunk in upstream.aiter_bytes(AUDIO_CHUNK_SIZE):
+            buffer.add(chunk)
+            yield chunk
+    finally:
+        await upstream.aclose()
+    # Only reached when the whole body was relayed (not on disconnect/error).
+    audio = buffer.audio()
+    if audio is not None:
+        await get_tts_cache().astore(key, audio)
+
+
+def _tts_request(text: str) -> Dict[str, Any]:
     api_key = _get_elevenlabs_api_key()
-    # Default voice/ model can be overridden via env
-    voice_id = os.environ.get("ELEVENLABS_VOICE_ID", "EXAVITQu4vr4xnSDxMaL")
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+    voice_id, model_id = _tts_voice()
 
-    headers = {
-        "xi-api-key": api_key,
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "text": text,
-        "model_id": os.environ.get(
-            "ELEVENLABS_MODEL_ID", "eleven_multilingual_v2"
-        ),
+    return {
+        "url": f"{ELEVENLABS_API_BASE}/text-to-speech/{voice_id}",
+        "headers": {
+            "xi-api-key": api_key,
+            "Accept": "audio/mpeg",
+            "Content-Type": "application/json",
+        },
+        "json": {
+            "text": text,
+            "model_id": model_id,
+        },
     }
 
-    resp = requests.post(url, json=payload, headers=headers, timeout=60)
-    resp.raise_for_status()
-    audio_bytes = resp.content
-    return base64.b64encode(audio_bytes).decode("utf-8")
-
 
 def _get_or_create_session_id(request: Request) -> str:
     session_id = request.data.get("session_id") or request.query_params.get("session_id")
@@ -104,21 +219,19 @@ def _get_or_create_session_id(request: Request) -> str:
     return session_id
 
 
-def _load_session_context(user, session_id: str, max_turns: int = 10) -> List[Dict[str, str]]:
-    """Load recent conversation turns as chat-style context for GPT."""
+def _load_session_context(user, session_id: str) -> List[Dict[str, str]]:
+    """Load recent conversation turns as chat-style context for GPT.
 
-    qs = (
-        ConversationTurn.objects.filter(user=user, session_id=session_id)
-        .order_by("turn_index")
-    )
-    turns = list(qs)[-max_turns:]
-    context: List[Dict[str, str]] = []
-    for t in turns:
-        context.append({"role": "user", "content": t.transcript})
-        assistant_text = t.reasoning_json.get("assistant_text") or ""
-        if assistant_text:
-            context.append({"role": "assistant", "content": assistant_text})
-    return context
+    Selected by token budget, with older turns summarized (sessions.context).
+    """
+
+    return load_session_context(user, session_id)
+
+
+def _save_turn(user, session_id: str, transcript: str, reasoning: Dict[str, Any]) -> int:
+    """Append a ConversationTurn to the session and return its turn_index."""
+
+    return append_turn(user, session_id, transcript, reasoning)
 
 
 @api_view(["POST"])
@@ -188,20 +301,7 @@ def respond_view(request: Request) -> Response:
     assistant_text = result["assistant_text"]
     reasoning = result["reasoning"]
 
-    last_turn = (
-        ConversationTurn.objects.filter(user=user, session_id=session_id)
-        .order_by("-turn_index")
-        .first()
-    )
-    next_index = (last_turn.turn_index + 1) if last_turn else 0
-
-    ConversationTurn.objects.create(
-        user=user,
-        session_id=session_id,
-        turn_index=next_index,
-        transcript=transcript,
-        reasoning_json=reasoning,
-    )
+    next_index = _save_turn(user, session_id, transcript, reasoning)
 
     return Response(
         {
@@ -213,114 +313,13 @@ def respond_view(request: Request) -> Response:
     )
 
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def speak_view(request: Request) -> Response:
-    """POST /api/voice/speak
-
-    Input JSON:
-      { "assistant_text": "..." }
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def tts_cache_stats_view(request: Request) -> Response:
+    """GET /api/voice/tts-cache/stats
 
-    Returns speech audio as base64 along with the text.
+    Hit/miss/bytes-saved counters of the TTS cache, for this worker
+    (`process`) and summed over all workers via Redis (`cluster`).
     """
 
-    assistant_text = request.data.get("assistant_text", "").strip()
-    if not assistant_text:
-        return Response(
-            {"detail": "Missing 'assistant_text' in request body."},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
-
-    try:
-        audio_base64 = synthesize_speech_elevenlabs(assistant_text)
-    except Exception as exc:  # pragma: no cover - network dependent
-        logger.exception("ElevenLabs synthesis failed")
-        return Response(
-            {"detail": f"TTS error: {exc}"},
-            status=status.HTTP_502_BAD_GATEWAY,
-        )
-
-    return Response(
-        {
-            "audio_base64": audio_base64,
-            "format": "mp3",
-            "assistant_text": assistant_text,
-        }
-    )
-
-
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def full_pipeline_view(request: Request) -> Response:
-    """POST /api/voice/full
-
-    Pipeline: audio → Whisper → GPT → ElevenLabs → JSON payload.
-    """
-
-    uploaded = request.FILES.get("audio")
-    if not uploaded:
-        return Response(
-            {"detail": "Missing 'audio' file in request."},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
-
-    try:
-        transcription = transcribe_audio_file(uploaded)
-    except Exception as exc:  # pragma: no cover - network dependent
-        logger.exception("Whisper transcription failed in full pipeline")
-        return Response(
-            {"detail": f"Transcription error: {exc}"},
-            status=status.HTTP_502_BAD_GATEWAY,
-        )
-
-    transcript = transcription["transcript"]
-    user = request.user
-    session_id = _get_or_create_session_id(request)
-    context = _load_session_context(user, session_id)
-
-    try:
-        reasoning_result = build_reasoning_gpt(transcript, context)
-    except Exception as exc:  # pragma: no cover - network dependent
-        logger.exception("GPT reasoning failed in full pipeline")
-        return Response(
-            {"detail": f"Reasoning error: {exc}"},
-            status=status.HTTP_502_BAD_GATEWAY,
-        )
-
-    assistant_text = reasoning_result["assistant_text"]
-    reasoning = reasoning_result["reasoning"]
-
-    try:
-        audio_base64 = synthesize_speech_elevenlabs(assistant_text)
-    except Exception as exc:  # pragma: no cover - network dependent
-        logger.exception("ElevenLabs synthesis failed in full pipeline")
-        return Response(
-            {"detail": f"TTS error: {exc}"},
-            status=status.HTTP_502_BAD_GATEWAY,
-        )
-
-    last_turn = (
-        ConversationTurn.objects.filter(user=user, session_id=session_id)
-        .order_by("-turn_index")
-        .first()
-    )
-    next_index = (last_turn.turn_index + 1) if last_turn else 0
-
-    ConversationTurn.objects.create(
-        user=user,
-        session_id=session_id,
-        turn_index=next_index,
-        transcript=transcript,
-        reasoning_json=reasoning,
-    )
-
-    return Response(
-        {
-            "transcript": transcript,
-            "reasoning": reasoning,
-            "assistant_text": assistant_text,
-            "audio_base64": audio_base64,
-            "session_id": session_id,
-            "turn_id": next_index,
-        }
-    )
+    return Response(get_tts_cache().stats())